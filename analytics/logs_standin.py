@@ -0,0 +1,126 @@
+"""
+Local stand-in for the verification_logs table
+Writes synthetic verification traffic to SQLite with the columns of
+supabase/migrations/20251130000000_add_verification_logs.sql, and exports
+it to the CSV/Parquet layout of a Supabase table export
+"""
+
+import sys
+import uuid
+import random
+import sqlite3
+import argparse
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from rollups import LOG_COLUMNS, METHODS, RESULTS, format_timestamp, parse_timestamp, read_source
+
+# Configuration
+STANDIN_PATH = Path('verification_logs.sqlite')
+METHOD_WEIGHTS = [0.55, 0.2, 0.2, 0.05]
+RESULT_WEIGHTS = [0.9, 0.03, 0.04, 0.03]
+ANONYMOUS_SHARE = 0.6    # Verifications by visitors who are not signed in (verified_by NULL)
+INSERT_BATCH = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS verification_logs (
+    id TEXT PRIMARY KEY,
+    certificate_id TEXT NOT NULL,
+    verified_at TEXT NOT NULL,
+    verified_by TEXT,
+    verification_method TEXT NOT NULL CHECK (verification_method IN ('qr_scan', 'manual_search', 'direct_link', 'api')),
+    ip_address TEXT,
+    user_agent TEXT,
+    location_data TEXT,
+    verification_result TEXT NOT NULL CHECK (verification_result IN ('valid', 'revoked', 'expired', 'not_found')),
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_verification_logs_created_at ON verification_logs (created_at, id);
+"""
+
+def synthesize(path, num_rows, num_certificates=1000, num_users=200, days=60, seed=42):
+    """Append num_rows verifications made since the newest row (or over the last days)
+
+    The certificate and user ids come from seed, so repeated runs add
+    traffic for the same certificates. Popularity is skewed (a few
+    certificates get most scans), like real QR traffic. Timestamps use
+    Postgres' text form so watermark comparisons work on the stand-in as
+    they do on the real table.
+    """
+    universe = random.Random(seed)
+    certificates = [str(uuid.UUID(int=universe.getrandbits(128), version=4)) for _ in range(num_certificates)]
+    users = [str(uuid.UUID(int=universe.getrandbits(128), version=4)) for _ in range(num_users)]
+    rng = random.Random()
+    now = datetime.now(timezone.utc)
+
+    db = sqlite3.connect(path)
+    db.executescript(SCHEMA)
+    newest = db.execute('SELECT MAX(created_at) FROM verification_logs').fetchone()[0]
+    first = parse_timestamp(newest) if newest else now - timedelta(days=days)
+    span = (now - first).total_seconds()
+    times = sorted(first + timedelta(seconds=rng.random() * span) for _ in range(num_rows))
+
+    for start in range(0, num_rows, INSERT_BATCH):
+        rows = []
+        for verified_at in times[start:start + INSERT_BATCH]:
+            rows.append((
+                str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                certificates[min(int(rng.paretovariate(1.2)) - 1, num_certificates - 1)],
+                format_timestamp(verified_at),
+                None if rng.random() < ANONYMOUS_SHARE else rng.choice(users),
+                rng.choices(METHODS, METHOD_WEIGHTS)[0],
+                f'203.0.113.{rng.randint(1, 254)}',
+                'Mozilla/5.0',
+                None,
+                rng.choices(RESULTS, RESULT_WEIGHTS)[0],
+                # log_certificate_verification() inserts as the scan happens
+                format_timestamp(verified_at + timedelta(milliseconds=rng.random() * 50))
+            ))
+        with db:
+            db.executemany('INSERT INTO verification_logs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+    total = db.execute('SELECT COUNT(*) FROM verification_logs').fetchone()[0]
+    db.close()
+    print(f"✅ Added {num_rows} verifications; {total} rows in {path}")
+
+def export(path, output):
+    """Write the stand-in table as a .csv or .parquet export"""
+    tables = list(read_source(str(path), datetime.fromtimestamp(0, timezone.utc)))
+    if not tables:
+        raise ValueError(f"No rows in {path}")
+    table = pa.concat_tables(tables).select(LOG_COLUMNS)
+    if output.suffix == '.csv':
+        import pyarrow.csv as pcsv
+
+        pcsv.write_csv(table, output)
+    else:
+        pq.write_table(table, output, compression='zstd')
+    print(f"✅ Exported {table.num_rows} rows to {output}")
+
+def main():
+    """Stand-in command-line entry point"""
+    parser = argparse.ArgumentParser(description='Synthetic verification_logs for the rollup job')
+    parser.add_argument('--db', type=Path, default=STANDIN_PATH)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    synth_parser = subparsers.add_parser('synthesize', help='Append synthetic verifications')
+    synth_parser.add_argument('--rows', type=int, default=100000)
+    synth_parser.add_argument('--certificates', type=int, default=1000)
+    synth_parser.add_argument('--days', type=int, default=60, help='History to cover in an empty table')
+    synth_parser.add_argument('--seed', type=int, default=42, help='Seed of the certificate and user ids')
+    export_parser = subparsers.add_parser('export', help='Export to .csv or .parquet')
+    export_parser.add_argument('output', type=Path)
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'synthesize':
+            synthesize(args.db, args.rows, args.certificates, days=args.days, seed=args.seed)
+        else:
+            export(args.db, args.output)
+    except ValueError as e:
+        print(f"\n❌ Error: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,403 @@
+"""
+Incremental verification_logs rollups
+Consumes new rows by created_at watermark from Postgres, a SQLite stand-in or
+a CSV/Parquet export, and keeps per-certificate, per-method and per-hour
+aggregates in Parquet so dashboards never aggregate the raw log
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# Configuration
+ROLLUP_DIR = Path('rollups')
+DEFAULT_SOURCE = os.environ.get('VERIFICATION_LOGS_SOURCE', 'verification_logs.sqlite')
+FETCH_BATCH = 50000      # Rows per keyset page from a database source
+LATE_WINDOW = 300        # Seconds re-read behind the watermark for rows committed late
+RECENT_DAYS = 30         # UTC calendar days (today included) in verifications_last_30_days
+EPOCH = '1970-01-01 00:00:00+00'
+
+METHODS = ['qr_scan', 'manual_search', 'direct_link', 'api']
+RESULTS = ['valid', 'revoked', 'expired', 'not_found']
+# Only what the rollups need: ip_address, user_agent and location_data stay in the database
+LOG_COLUMNS = ['id', 'certificate_id', 'verified_at', 'verified_by', 'verification_method',
+               'verification_result', 'created_at']
+
+TIMESTAMP = pa.timestamp('us', tz='UTC')
+LOG_SCHEMA = pa.schema([
+    ('id', pa.string()),
+    ('certificate_id', pa.string()),
+    ('verified_at', TIMESTAMP),
+    ('verified_by', pa.string()),
+    ('verification_method', pa.string()),
+    ('verification_result', pa.string()),
+    ('created_at', TIMESTAMP),
+])
+
+# Rollup file -> (group keys, {column: merge aggregation})
+ROLLUPS = {
+    'certificates': (['certificate_id'], {
+        'verifications': 'sum', **{result: 'sum' for result in RESULTS},
+        'first_verified_at': 'min', 'last_verified_at': 'max'
+    }),
+    'certificate_days': (['certificate_id', 'day'], {'verifications': 'sum'}),
+    'certificate_verifiers': (['certificate_id', 'verified_by'], {}),
+    'methods': (['verification_method', 'verification_result'], {
+        'verifications': 'sum', 'first_verified_at': 'min', 'last_verified_at': 'max'
+    }),
+    'hours': (['hour', 'verification_method', 'verification_result'], {'verifications': 'sum'}),
+}
+
+SQL_QUERY = (
+    'SELECT id{cast}, certificate_id{cast}, verified_at, verified_by{cast}, verification_method, '
+    'verification_result, created_at FROM {table} WHERE {where} ORDER BY created_at, id LIMIT {limit}'
+)
+
+def format_timestamp(value):
+    """Postgres text form of a UTC datetime, which also orders correctly as a string"""
+    return value.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f+00')
+
+def parse_timestamp(value):
+    return datetime.fromisoformat(value).astimezone(timezone.utc)
+
+def to_log_table(columns):
+    """Typed log table from column lists or arrays (timestamps as text or datetimes)"""
+    arrays = []
+    for field in LOG_SCHEMA:
+        values = columns[field.name]
+        array = values if isinstance(values, (pa.Array, pa.ChunkedArray)) else pa.array(values)
+        if pa.types.is_timestamp(field.type) and not pa.types.is_timestamp(array.type):
+            array = pc.cast(array, pa.string())
+        arrays.append(pc.cast(array, field.type))
+    return pa.Table.from_arrays(arrays, schema=LOG_SCHEMA)
+
+def _sql_pages(connection, dialect, since, batch):
+    """Keyset pages of rows with created_at >= since, in (created_at, id) order"""
+    placeholder, cast, table = ('?', '', 'verification_logs') if dialect == 'sqlite' else \
+        ('%s::timestamptz', '::text', 'public.verification_logs')
+    where, params = f'created_at >= {placeholder}', [format_timestamp(since)]
+    while True:
+        query = SQL_QUERY.format(cast=cast, table=table, where=where, limit=batch)
+        cursor = connection.cursor()
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        yield to_log_table(dict(zip(LOG_COLUMNS, map(list, zip(*rows)))))
+        if len(rows) < batch:
+            return
+        last_created, last_id = rows[-1][-1], rows[-1][0]
+        last_created = last_created if isinstance(last_created, str) else format_timestamp(last_created)
+        if dialect == 'sqlite':
+            where = '(created_at, id) > (?, ?)'
+        else:
+            where = '(created_at, id) > (%s::timestamptz, %s::uuid)'
+        params = [last_created, last_id]
+
+def read_source(source, since, batch=FETCH_BATCH):
+    """Log tables with created_at >= since from a postgres:// URL or a .sqlite/.db, .csv or .parquet path"""
+    if source.startswith(('postgres://', 'postgresql://')):
+        try:
+            import psycopg
+        except ImportError:
+            raise ValueError("Reading Postgres needs psycopg: pip install 'psycopg[binary]'")
+        with psycopg.connect(source) as connection:
+            yield from _sql_pages(connection, 'postgres', since, batch)
+        return
+
+    path = Path(source)
+    if not path.exists():
+        raise ValueError(f"Source not found: {source}")
+    if path.suffix in ('.sqlite', '.db'):
+        connection = sqlite3.connect(path)
+        try:
+            yield from _sql_pages(connection, 'sqlite', since, batch)
+        finally:
+            connection.close()
+        return
+    if path.suffix == '.parquet':
+        table = pq.read_table(path, columns=LOG_COLUMNS)
+    elif path.suffix == '.csv':
+        import pyarrow.csv as pcsv
+
+        table = pcsv.read_csv(path, convert_options=pcsv.ConvertOptions(
+            include_columns=LOG_COLUMNS, strings_can_be_null=True
+        ))
+    else:
+        raise ValueError(f"Unsupported source {source}: use postgres://, .sqlite/.db, .csv or .parquet")
+
+    table = to_log_table({name: table.column(name) for name in LOG_COLUMNS})
+    table = table.filter(pc.greater_equal(table['created_at'], pa.scalar(since, TIMESTAMP)))
+    table = table.sort_by([('created_at', 'ascending'), ('id', 'ascending')])
+    for offset in range(0, table.num_rows, batch):
+        yield table.slice(offset, batch)
+
+def partial_rollups(logs):
+    """Aggregates of one batch of log rows, in the rollup file layouts"""
+    verified_at = logs['verified_at']
+    logs = logs.append_column('hour', pc.floor_temporal(verified_at, unit='hour'))
+    logs = logs.append_column('day', pc.cast(pc.floor_temporal(verified_at, unit='day'), pa.date32()))
+    for result in RESULTS:
+        logs = logs.append_column(result, pc.cast(pc.equal(logs['verification_result'], result), pa.int64()))
+
+    renames = {'id_count': 'verifications', 'verified_at_min': 'first_verified_at',
+               'verified_at_max': 'last_verified_at', **{f'{result}_sum': result for result in RESULTS}}
+
+    def count(keys, extra=()):
+        table = logs.group_by(keys).aggregate([('id', 'count'), *extra])
+        return table.rename_columns([renames.get(name, name) for name in table.column_names])
+
+    first_last = [('verified_at', 'min'), ('verified_at', 'max')]
+    verifiers = logs.filter(pc.is_valid(logs['verified_by']))
+    return {
+        'certificates': count(['certificate_id'], [*((r, 'sum') for r in RESULTS), *first_last]),
+        'certificate_days': count(['certificate_id', 'day']),
+        'certificate_verifiers': verifiers.group_by(['certificate_id', 'verified_by']).aggregate([]),
+        'methods': count(['verification_method', 'verification_result'], first_last),
+        'hours': count(['hour', 'verification_method', 'verification_result']),
+    }
+
+def merge_rollup(name, tables):
+    """Re-aggregate stored and partial tables of one rollup into a single sorted table"""
+    keys, aggregations = ROLLUPS[name]
+    columns = keys + list(aggregations)
+    tables = [table.select(columns) for table in tables if table is not None and table.num_rows]
+    if not tables:
+        return None
+    merged = pa.concat_tables(tables, promote_options='default').combine_chunks()
+    merged = merged.group_by(keys).aggregate([(column, how) for column, how in aggregations.items()])
+    merged = merged.rename_columns([name.rsplit('_', 1)[0] if name not in keys else name
+                                    for name in merged.column_names])
+    return merged.select(columns).sort_by([(key, 'ascending') for key in keys])
+
+class RollupStore:
+    """Rollup Parquet files plus the watermark they were built up to
+
+    Every file is stamped with the state generation it belongs to, so a run
+    interrupted between file replacements is detected instead of silently
+    double counting on the next run.
+    """
+
+    def __init__(self, directory=ROLLUP_DIR):
+        self.directory = Path(directory)
+        self.state_path = self.directory / 'state.json'
+
+    def path(self, name):
+        return self.directory / f'{name}.parquet'
+
+    def state(self):
+        if not self.state_path.exists():
+            return {'generation': 0, 'watermark': EPOCH, 'recent': {}, 'rows': 0}
+        with open(self.state_path) as f:
+            return json.load(f)
+
+    def read(self, name, columns=None, filters=None):
+        """Rollup table (only the requested columns/rows), or None before the first run"""
+        path = self.path(name)
+        return pq.read_table(path, columns=columns, filters=filters) if path.exists() else None
+
+    def check(self, state):
+        for name in ROLLUPS:
+            path = self.path(name)
+            if not path.exists():
+                continue
+            generation = (pq.read_schema(path).metadata or {}).get(b'generation', b'0').decode()
+            if int(generation) != state['generation']:
+                raise ValueError(f"{path} is from another run than {self.state_path}; rebuild with --full")
+
+    def write(self, tables, state):
+        """Replace rollup files with tables, then commit the new state"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        metadata = {'generation': str(state['generation'])}
+        for name, table in tables.items():
+            if table is None:
+                continue
+            tmp_path = self.path(name).with_suffix('.parquet.tmp')
+            pq.write_table(table.replace_schema_metadata(metadata), tmp_path, compression='zstd')
+            os.replace(tmp_path, self.path(name))
+        tmp_path = self.state_path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def clear(self):
+        for name in ROLLUPS:
+            self.path(name).unlink(missing_ok=True)
+        self.state_path.unlink(missing_ok=True)
+
+def update(source, directory=ROLLUP_DIR, full=False, batch=FETCH_BATCH):
+    """Fold log rows created since the watermark into the rollups; returns rows consumed
+
+    Rows are re-read LATE_WINDOW seconds behind the watermark, because a
+    transaction can commit after a newer created_at is already visible;
+    ids seen in that window are remembered so nothing is counted twice.
+    """
+    store = RollupStore(directory)
+    if full:
+        store.clear()
+    state = store.state()
+    store.check(state)
+
+    watermark = parse_timestamp(state['watermark'])
+    window = LATE_WINDOW * 1_000_000
+    previous = pa.array(list(state['recent']), pa.string())
+    recent = dict(state['recent'])  # id -> created_at in epoch microseconds
+    newest = int(watermark.timestamp() * 1_000_000)
+    partials = {name: [] for name in ROLLUPS}
+    consumed = 0
+    start = time.perf_counter()
+
+    for logs in read_source(source, watermark - timedelta(seconds=LATE_WINDOW), batch):
+        logs = logs.filter(pc.invert(pc.is_in(logs['id'], previous)))
+        if not logs.num_rows:
+            continue
+        for name, table in partial_rollups(logs).items():
+            partials[name].append(table)
+        consumed += logs.num_rows
+
+        created = pc.cast(logs['created_at'], pa.int64())
+        newest = max(newest, pc.max(created).as_py())
+        tail = logs.filter(pc.greater_equal(created, newest - window))
+        recent.update(zip(tail['id'].to_pylist(), pc.cast(tail['created_at'], pa.int64()).to_pylist()))
+        recent = {i: t for i, t in recent.items() if t >= newest - window}
+
+    if not consumed:
+        print(f"✅ No new rows since {state['watermark']}")
+        return 0
+
+    tables = {name: merge_rollup(name, [store.read(name)] + partials[name]) for name in ROLLUPS}
+    state = {
+        'generation': state['generation'] + 1,
+        'watermark': format_timestamp(datetime.fromtimestamp(newest / 1_000_000, timezone.utc)),
+        'recent': recent,
+        'rows': state['rows'] + consumed
+    }
+    store.write(tables, state)
+    print(f"✅ Rolled up {consumed} rows in {time.perf_counter() - start:.2f}s; "
+          f"watermark {state['watermark']}, {state['rows']} rows total")
+    return consumed
+
+def certificate_stats(store, certificate_ids, now=None):
+    """certificate_stats view columns for certificate UUIDs, from the rollups
+
+    verifications_last_30_days comes from daily buckets, so it covers whole
+    UTC days rather than the view's rolling 30 x 24 hours.
+    """
+    now = now or datetime.now(timezone.utc)
+    ids = pa.array(certificate_ids, pa.string())
+    certificates = store.read('certificates', filters=pc.field('certificate_id').isin(ids))
+    if certificates is None:
+        raise ValueError(f"No rollups in {store.directory}. Run: python rollups.py update")
+    since = (now - timedelta(days=RECENT_DAYS - 1)).date()
+    recent = store.read('certificate_days', filters=pc.field('certificate_id').isin(ids) & (pc.field('day') >= since))
+    verifiers = store.read('certificate_verifiers', columns=['certificate_id'],
+                           filters=pc.field('certificate_id').isin(ids))
+
+    recent_counts = dict(zip(*recent.group_by('certificate_id').aggregate([('verifications', 'sum')])
+                             .select(['certificate_id', 'verifications_sum']).to_pydict().values()))
+    unique_counts = dict(zip(*verifiers.group_by('certificate_id').aggregate([('certificate_id', 'count')])
+                             .select(['certificate_id', 'certificate_id_count']).to_pydict().values()))
+    stats = {}
+    for row in certificates.to_pylist():
+        stats[row['certificate_id']] = {
+            'total_verifications': row['verifications'],
+            'unique_verifiers': unique_counts.get(row['certificate_id'], 0),
+            'last_verified_at': row['last_verified_at'],
+            'verifications_last_30_days': recent_counts.get(row['certificate_id'], 0),
+            **{result: row[result] for result in RESULTS}
+        }
+    return stats
+
+def top_certificates(store, limit=10):
+    """[(certificate_id, verifications)] of the most verified certificates"""
+    table = store.read('certificates', columns=['certificate_id', 'verifications'])
+    if table is None:
+        raise ValueError(f"No rollups in {store.directory}. Run: python rollups.py update")
+    top = pc.select_k_unstable(table, limit, [('verifications', 'descending')])
+    return list(zip(table['certificate_id'].take(top).to_pylist(), table['verifications'].take(top).to_pylist()))
+
+def hourly(store, hours=24, now=None):
+    """[(hour, verifications)] for the last hours, all methods and results"""
+    now = now or datetime.now(timezone.utc)
+    since = pa.scalar(now - timedelta(hours=hours), TIMESTAMP)
+    table = store.read('hours', columns=['hour', 'verifications'], filters=pc.field('hour') >= since)
+    if table is None:
+        raise ValueError(f"No rollups in {store.directory}. Run: python rollups.py update")
+    table = table.group_by('hour').aggregate([('verifications', 'sum')]).sort_by('hour')
+    return list(zip(table['hour'].to_pylist(), table['verifications_sum'].to_pylist()))
+
+def methods(store):
+    """{method: {result: verifications}}"""
+    table = store.read('methods', columns=['verification_method', 'verification_result', 'verifications'])
+    if table is None:
+        raise ValueError(f"No rollups in {store.directory}. Run: python rollups.py update")
+    summary = {}
+    for row in table.to_pylist():
+        summary.setdefault(row['verification_method'], {})[row['verification_result']] = row['verifications']
+    return summary
+
+def query(store, command, args):
+    """Run one dashboard query and print it with its latency"""
+    start = time.perf_counter()
+    if command == 'stats':
+        result = certificate_stats(store, args.certificate_ids)
+    elif command == 'top':
+        result = top_certificates(store, args.limit)
+    elif command == 'hourly':
+        result = hourly(store, args.hours)
+    else:
+        result = methods(store)
+    elapsed = (time.perf_counter() - start) * 1000
+
+    print(f"\n📊 {command} ({elapsed:.1f} ms, watermark {store.state()['watermark']})")
+    if command == 'stats':
+        for certificate_id in args.certificate_ids:
+            print(f"   {certificate_id}: {result.get(certificate_id, 'no verifications')}")
+    elif command in ('top', 'hourly'):
+        for key, verifications in result:
+            print(f"   {key}: {verifications}")
+    else:
+        for method in METHODS:
+            counts = result.get(method, {})
+            print(f"   {method:<14} " + '  '.join(f"{r}={counts.get(r, 0)}" for r in RESULTS))
+    return result
+
+def main():
+    """Rollup command-line entry point"""
+    parser = argparse.ArgumentParser(description='Incremental verification_logs rollups for dashboards')
+    parser.add_argument('--dir', type=Path, default=ROLLUP_DIR, help='Rollup directory')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    update_parser = subparsers.add_parser('update', help='Consume rows past the watermark')
+    update_parser.add_argument('--source', default=DEFAULT_SOURCE,
+                               help='postgres:// URL, .sqlite/.db stand-in or .csv/.parquet export '
+                                    '(default: $VERIFICATION_LOGS_SOURCE)')
+    update_parser.add_argument('--full', action='store_true', help='Drop the rollups and rebuild from scratch')
+    stats_parser = subparsers.add_parser('stats', help='certificate_stats for certificate UUIDs')
+    stats_parser.add_argument('certificate_ids', nargs='+')
+    top_parser = subparsers.add_parser('top', help='Most verified certificates')
+    top_parser.add_argument('--limit', type=int, default=10)
+    hourly_parser = subparsers.add_parser('hourly', help='Verifications per hour')
+    hourly_parser.add_argument('--hours', type=int, default=24)
+    subparsers.add_parser('methods', help='Verifications per method and result')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'update':
+            update(args.source, args.dir, args.full)
+        else:
+            query(RollupStore(args.dir), args.command, args)
+    except ValueError as e:
+        print(f"\n❌ Error: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,328 @@
+"""
+Merkle-batched certificate anchoring
+Queues certificate hashes and anchors each batch as a single
+CERTICHAIN:ROOT:<root> remark, keeping a compact inclusion proof per
+certificate in SQLite: one transaction per batch, O(log N) proof bytes each
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import argparse
+from pathlib import Path
+
+import merkle
+from substrate import REMARK_PREFIX, RpcClient, RpcError, make_extrinsic, remark_call
+from remark_index import DEFAULT_RPC_URL, INDEX_PATH, ROOT_PREFIX, RemarkIndex, normalize_hash
+
+# Configuration
+ANCHOR_DB_PATH = Path('anchors.sqlite')
+MAX_BATCH = 1 << 16       # Certificates per root (proofs stay within 16 hashes)
+SEED_ENV = 'ANCHOR_SEED'  # Secret URI / mnemonic of the anchoring account on a real node
+HASH_PATTERN = re.compile(r'0x[0-9a-f]{64}')  # 32-byte certificate hash, as normalize_hash() returns it
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pending (
+    hash TEXT PRIMARY KEY,
+    queued_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS batches (
+    id INTEGER PRIMARY KEY,
+    root TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    sealed_at REAL NOT NULL,
+    extrinsic_hash TEXT,
+    block_hash TEXT
+);
+CREATE TABLE IF NOT EXISTS proofs (
+    hash TEXT PRIMARY KEY,
+    batch_id INTEGER NOT NULL REFERENCES batches (id),
+    leaf_index INTEGER NOT NULL,
+    proof BLOB NOT NULL
+) WITHOUT ROWID;
+"""
+
+class AnchorStore:
+    """Pending queue, sealed batches and per-certificate proofs"""
+
+    def __init__(self, path=ANCHOR_DB_PATH):
+        self.db = sqlite3.connect(path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def queue(self, hashes):
+        """Queue hashes not already queued or batched; returns how many were added
+
+        Raises ValueError, queuing nothing, if any hash is not 32-byte 0x-hex:
+        a malformed pending row would fail every later seal().
+        """
+        hashes = [normalize_hash(h) for h in hashes]
+        invalid = [h for h in hashes if not HASH_PATTERN.fullmatch(h)]
+        if invalid:
+            raise ValueError(f"{len(invalid)} hashes are not 32-byte 0x-hex, e.g. {invalid[0]!r}")
+        wanted = json.dumps(hashes)
+        with self.db:
+            cursor = self.db.execute(
+                'INSERT OR IGNORE INTO pending SELECT DISTINCT value, ? FROM json_each(?) '
+                'WHERE value NOT IN (SELECT hash FROM proofs)', (time.time(), wanted)
+            )
+        return cursor.rowcount
+
+    def pending_count(self):
+        return self.db.execute('SELECT COUNT(*) FROM pending').fetchone()[0]
+
+    def seal(self, limit=MAX_BATCH):
+        """Build the tree over the oldest pending hashes and store the batch with its proofs
+
+        (batch id, root, size), or None when nothing is pending. Sealing and
+        dequeuing happen in one transaction, before anything is submitted,
+        so an interrupted submission leaves an unanchored batch to retry
+        rather than lost hashes.
+        """
+        hashes = [row[0] for row in self.db.execute(
+            'SELECT hash FROM pending ORDER BY queued_at, hash LIMIT ?', (limit,)
+        )]
+        if not hashes:
+            return None
+        levels = merkle.build_levels([merkle.leaf_hash(h) for h in hashes])
+        root = merkle.root(levels)
+        proofs = merkle.batch_proofs(levels)
+
+        with self.db:
+            batch_id = self.db.execute(
+                'INSERT INTO batches (root, size, sealed_at) VALUES (?, ?, ?)', (root, len(hashes), time.time())
+            ).lastrowid
+            self.db.executemany(
+                'INSERT INTO proofs VALUES (?, ?, ?, ?)',
+                ((h, batch_id, i, proof) for i, (h, proof) in enumerate(zip(hashes, proofs)))
+            )
+            self.db.execute('DELETE FROM pending WHERE hash IN (SELECT value FROM json_each(?))', (json.dumps(hashes),))
+        return batch_id, root, len(hashes)
+
+    def unanchored(self):
+        """[(batch id, root, size)] of sealed batches without a confirmed transaction"""
+        return self.db.execute(
+            'SELECT id, root, size FROM batches WHERE block_hash IS NULL ORDER BY id'
+        ).fetchall()
+
+    def mark_anchored(self, batch_id, extrinsic_hash, block_hash):
+        with self.db:
+            self.db.execute(
+                'UPDATE batches SET extrinsic_hash = ?, block_hash = ? WHERE id = ?',
+                (extrinsic_hash, block_hash, batch_id)
+            )
+
+    def proofs(self, hashes):
+        """{hash: {'root', 'size', 'leaf_index', 'proof', 'block_hash'}} in one query"""
+        wanted = json.dumps([normalize_hash(h) for h in hashes])
+        rows = self.db.execute(
+            'SELECT p.hash, b.root, b.size, p.leaf_index, p.proof, b.block_hash '
+            'FROM proofs p JOIN batches b ON b.id = p.batch_id '
+            'WHERE p.hash IN (SELECT value FROM json_each(?))', (wanted,)
+        )
+        return {
+            h: {'root': root, 'size': size, 'leaf_index': index, 'proof': proof, 'block_hash': block_hash}
+            for h, root, size, index, proof, block_hash in rows
+        }
+
+def standin_submitter(url):
+    """Submit remarks with a placeholder signature; only a stand-in node accepts them
+
+    The stand-in seals each submission into a new finalized block, so the
+    finalized head right after submitting is the inclusion block.
+    """
+    client = RpcClient(url)
+
+    def submit(text):
+        extrinsic_hash = client.call('author_submitExtrinsic', make_extrinsic(remark_call(text)))
+        return extrinsic_hash, client.call('chain_getFinalizedHead')
+
+    return submit
+
+def signed_submitter(url, seed):
+    """Submit signed system.remark calls and wait for finalization (needs substrate-interface)"""
+    try:
+        from substrateinterface import Keypair, SubstrateInterface
+    except ImportError:
+        raise ValueError("Signing needs substrate-interface: pip install substrate-interface (or use --standin)")
+
+    substrate = SubstrateInterface(url=url)
+    keypair = Keypair.create_from_uri(seed)
+
+    def submit(text):
+        call = substrate.compose_call('System', 'remark', {'remark': REMARK_PREFIX.decode() + text})
+        extrinsic = substrate.create_signed_extrinsic(call=call, keypair=keypair)
+        receipt = substrate.submit_extrinsic(extrinsic, wait_for_finalization=True)
+        if not receipt.is_success:
+            raise RpcError(f"Remark extrinsic failed: {receipt.error_message}")
+        return receipt.extrinsic_hash, receipt.block_hash
+
+    return submit
+
+def anchor(store, submit, max_batch=MAX_BATCH):
+    """Anchor every pending hash, retrying unanchored batches first; returns batches anchored"""
+    anchored = 0
+    batches = store.unanchored()
+    while True:
+        if not batches:
+            sealed = store.seal(max_batch)
+            if sealed is None:
+                return anchored
+            batches = [sealed]
+        batch_id, root, size = batches.pop(0)
+
+        start = time.perf_counter()
+        extrinsic_hash, block_hash = submit(ROOT_PREFIX + root)
+        store.mark_anchored(batch_id, extrinsic_hash, block_hash)
+        anchored += 1
+        depth = max(size - 1, 0).bit_length()
+        print(f"⛓️ Batch {batch_id}: {size} certificates -> root {root[:18]}... "
+              f"in block {block_hash[:18]}... ({time.perf_counter() - start:.2f}s)")
+        print(f"   1 transaction instead of {size}; proofs of at most {depth * merkle.HASH_SIZE} bytes")
+
+def proof_json(certificate_hash, entry):
+    """Portable proof for one certificate, verifiable with merkle.verify_proof()"""
+    return {
+        'certificateHash': certificate_hash,
+        'root': entry['root'],
+        'remark': REMARK_PREFIX.decode() + ROOT_PREFIX + entry['root'],
+        'leafIndex': entry['leaf_index'],
+        'treeSize': entry['size'],
+        'proof': '0x' + entry['proof'].hex(),
+        'blockHash': entry['block_hash']
+    }
+
+def verify(store, hashes, index_path=INDEX_PATH):
+    """Check each certificate's proof, and its root against the remark index if there is one"""
+    hashes = [normalize_hash(h) for h in hashes]
+    start = time.perf_counter()
+    entries = store.proofs(hashes)
+    found = [h for h in hashes if h in entries]
+    results = dict(zip(found, merkle.verify_batch([
+        (h, entries[h]['leaf_index'], entries[h]['size'], entries[h]['proof'], entries[h]['root'])
+        for h in found
+    ])))
+    elapsed = time.perf_counter() - start
+
+    locations, indexed = {}, Path(index_path).exists()
+    if indexed:
+        index = RemarkIndex(index_path)
+        try:
+            locations = index.lookup_many({ROOT_PREFIX + entries[h]['root'] for h in found})
+        finally:
+            index.close()
+    else:
+        print(f"⚠️ No remark index at {index_path}; roots are not checked on-chain")
+
+    print(f"\n🔎 {len(found)}/{len(hashes)} certificates batched, proofs checked in {elapsed * 1000:.1f} ms")
+    verified = 0
+    for h in hashes:
+        if h not in entries:
+            print(f"❌ {h}: not in any batch")
+        elif not results[h]:
+            print(f"❌ {h}: proof does not match root {entries[h]['root'][:18]}...")
+        else:
+            location = locations.get(ROOT_PREFIX + entries[h]['root'])
+            if indexed and location is None:
+                print(f"⚠️ {h}: proof valid, root not indexed yet")
+                continue
+            verified += 1
+            where = f" in block #{location['block_number']}, extrinsic {location['extrinsic_index']}" if location else ''
+            print(f"✅ {h}: proof valid for root {entries[h]['root'][:18]}...{where}")
+    return verified
+
+def bench(size):
+    """Time tree building, proof generation and batch verification for size random hashes"""
+    hashes = ['0x' + os.urandom(32).hex() for _ in range(size)]
+    print(f"\n📊 Merkle batch of {size} certificates")
+
+    start = time.perf_counter()
+    levels = merkle.build_levels([merkle.leaf_hash(h) for h in hashes])
+    built = time.perf_counter()
+    proofs = merkle.batch_proofs(levels)
+    proved = time.perf_counter()
+    root = merkle.root(levels)
+    ok = merkle.verify_batch([(h, i, size, proof, root) for i, (h, proof) in enumerate(zip(hashes, proofs))])
+    verified = time.perf_counter()
+
+    print(f"   Tree:         {(built - start) * 1000:.1f} ms")
+    print(f"   Proofs:       {(proved - built) * 1000:.1f} ms ({max(map(len, proofs))} bytes max)")
+    print(f"   Verification: {(verified - proved) * 1000:.1f} ms ({(verified - proved) / size * 1e6:.1f} µs/proof)")
+    if not all(ok):
+        raise ValueError("Batch verification rejected a valid proof")
+    print("✅ All proofs verified")
+
+def read_hashes(args):
+    hashes = list(args.hashes)
+    if args.file:
+        hashes += [line.strip() for line in args.file.read_text().splitlines() if line.strip()]
+    if not hashes:
+        raise ValueError("No certificate hashes given")
+    return hashes
+
+def main():
+    """Anchoring command-line entry point"""
+    parser = argparse.ArgumentParser(description='Anchor certificate hashes in Merkle batches, one remark per batch')
+    parser.add_argument('--db', type=Path, default=ANCHOR_DB_PATH)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for name, help_text in (('add', 'Queue certificate hashes'), ('proof', 'Print inclusion proofs as JSON'),
+                            ('verify', 'Verify certificates against their anchored roots')):
+        hash_parser = subparsers.add_parser(name, help=help_text)
+        hash_parser.add_argument('hashes', nargs='*')
+        hash_parser.add_argument('--file', type=Path, help='File with one hash per line')
+        if name == 'verify':
+            hash_parser.add_argument('--index', type=Path, default=INDEX_PATH, help='Remark index to locate roots')
+    anchor_parser = subparsers.add_parser('anchor', help='Seal pending hashes and submit one remark per batch')
+    anchor_parser.add_argument('--url', default=DEFAULT_RPC_URL, help='Node endpoint (default: $POLKADOT_RPC_URL)')
+    anchor_parser.add_argument('--standin', action='store_true', help='Unsigned remarks for node_standin.py')
+    anchor_parser.add_argument('--max-batch', type=int, default=MAX_BATCH)
+    bench_parser = subparsers.add_parser('bench', help='Time proof generation and verification')
+    bench_parser.add_argument('--size', type=int, default=100000)
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'bench':
+            bench(args.size)
+            return
+
+        store = AnchorStore(args.db)
+        try:
+            if args.command == 'add':
+                added = store.queue(read_hashes(args))
+                print(f"✅ Queued {added} new hashes; {store.pending_count()} pending")
+            elif args.command == 'anchor':
+                if args.standin:
+                    submit = standin_submitter(args.url)
+                elif os.environ.get(SEED_ENV):
+                    submit = signed_submitter(args.url, os.environ[SEED_ENV])
+                else:
+                    raise ValueError(f"Set {SEED_ENV} to the anchoring account's secret URI, or pass --standin")
+                anchored = anchor(store, submit, args.max_batch)
+                print(f"✅ Anchored {anchored} batches" if anchored else "✅ Nothing pending")
+            elif args.command == 'proof':
+                hashes = [normalize_hash(h) for h in read_hashes(args)]
+                entries = store.proofs(hashes)
+                missing = [h for h in hashes if h not in entries]
+                print(json.dumps([proof_json(h, entries[h]) for h in hashes if h in entries], indent=2))
+                if missing:
+                    raise ValueError(f"{len(missing)} hashes are not in any batch, e.g. {missing[0]}")
+            else:
+                hashes = read_hashes(args)
+                if verify(store, hashes, args.index) < len(hashes):
+                    sys.exit(1)
+        finally:
+            store.close()
+    except (ValueError, RpcError) as e:
+        print(f"\n❌ Error: {e}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
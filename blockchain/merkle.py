@@ -0,0 +1,101 @@
+"""
+Blake2 Merkle trees for batched certificate anchoring
+Leaves and inner nodes are domain-separated blake2b-256 hashes and an odd
+node at the end of a level is promoted unchanged (as in RFC 6962), so a
+proof is at most ceil(log2 N) sibling hashes plus the leaf index and N
+"""
+
+import hashlib
+
+# Configuration
+HASH_SIZE = 32
+LEAF_TAG = b'\x00'
+NODE_TAG = b'\x01'
+
+def _blake2(data):
+    return hashlib.blake2b(data, digest_size=HASH_SIZE).digest()
+
+def _hex_bytes(value):
+    return bytes.fromhex(value[2:] if value.startswith('0x') else value)
+
+def leaf_hash(certificate_hash):
+    """Leaf for a 0x-hex certificate hash from generateCertificateHash()"""
+    return _blake2(LEAF_TAG + _hex_bytes(certificate_hash))
+
+def node_hash(left, right):
+    return _blake2(NODE_TAG + left + right)
+
+def build_levels(leaves):
+    """Every level of the tree as a list of node hashes, leaves first"""
+    if not leaves:
+        raise ValueError("Cannot build a Merkle tree without leaves")
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parents = [_blake2(NODE_TAG + level[i] + level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parents.append(level[-1])  # Promote the odd node
+        levels.append(parents)
+    return levels
+
+def root(levels):
+    return '0x' + levels[-1][0].hex()
+
+def proof(levels, index):
+    """Sibling hashes from leaf to root, concatenated; promoted levels are skipped"""
+    siblings = []
+    for level in levels[:-1]:
+        if index ^ 1 < len(level):
+            siblings.append(level[index ^ 1])
+        index >>= 1
+    return b''.join(siblings)
+
+def batch_proofs(levels):
+    """Proof for every leaf of the tree"""
+    return [proof(levels, i) for i in range(len(levels[0]))]
+
+def verify_proof(certificate_hash, index, size, proof_bytes, expected_root):
+    """True if proof_bytes links certificate_hash at index of a size-leaf tree to expected_root"""
+    return verify_batch([(certificate_hash, index, size, proof_bytes, expected_root)])[0]
+
+def verify_batch(items):
+    """Verify many (certificate_hash, index, size, proof, root) tuples
+
+    Proofs under one root share their upper paths. Every node a proof has
+    been checked through is remembered with the proof tail above it, so a
+    later proof stops hashing where it joins a verified path and only has
+    to match that tail byte for byte: about 2N hashes instead of N log N.
+    """
+    verified = {}  # (root, size, level, index) -> (node, proof tail above it)
+    roots = {}
+    results = []
+    for certificate_hash, index, size, proof_bytes, expected_root in items:
+        if expected_root not in roots:
+            roots[expected_root] = _hex_bytes(expected_root)
+        root_bytes = roots[expected_root]
+        node, offset, level, width = leaf_hash(certificate_hash), 0, 0, size
+        path, valid = [], index < size
+        while valid:
+            key = (root_bytes, size, level, index)
+            known = verified.get(key)
+            if known is not None:
+                valid = known == (node, proof_bytes[offset:])
+                break
+            path.append((key, node, offset))
+            if width == 1:
+                valid = node == root_bytes and offset == len(proof_bytes)
+                break
+            if index % 2 == 1 or index + 1 < width:  # Not a promoted last node
+                sibling = proof_bytes[offset:offset + HASH_SIZE]
+                if len(sibling) != HASH_SIZE:
+                    valid = False
+                    break
+                offset += HASH_SIZE
+                node = node_hash(sibling, node) if index % 2 else node_hash(node, sibling)
+            index, width, level = index // 2, (width + 1) // 2, level + 1
+
+        if valid:
+            for key, path_node, path_offset in path:
+                verified[key] = (path_node, proof_bytes[path_offset:])
+        results.append(valid)
+    return results
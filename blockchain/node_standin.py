@@ -0,0 +1,210 @@
+"""
+Local stand-in for a Substrate node's JSON-RPC
+Replays recorded fixture blocks over HTTP (single and batched requests) for
+remark_index.py; `record` captures fixtures from a real endpoint and
+`synthesize` builds a fake chain with CERTICHAIN remarks
+"""
+
+import json
+import random
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from substrate import RpcClient, blake2_256, encode_compact, make_extrinsic, remark_call
+
+# Configuration
+DEFAULT_PORT = 9944
+RECORD_BATCH = 50
+
+class Chain:
+    """Fixture blocks plus any produced by submitted extrinsics"""
+
+    def __init__(self, blocks, first_block=0, finalized=None):
+        self.blocks = blocks  # [{'hash', 'block': chain_getBlock result}] from first_block on
+        self.first_block = first_block
+        self.by_hash = {b['hash']: b for b in blocks}
+        self.finalized = self.head() if finalized is None else finalized
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            fixture = json.load(f)
+        return cls(fixture['blocks'], fixture.get('first_block', 0))
+
+    def head(self):
+        return self.first_block + len(self.blocks) - 1
+
+    def at(self, number):
+        """Block dict at a height, or None outside the fixture"""
+        i = number - self.first_block
+        return self.blocks[i] if 0 <= i < len(self.blocks) else None
+
+    def append_block(self, extrinsics):
+        """Seal extrinsics into a new, immediately finalized block"""
+        with self.lock:
+            number = self.head() + 1
+            parent = self.blocks[-1]['hash'] if self.blocks else '0x' + '00' * 32
+            block = make_block(number, parent, extrinsics)
+            self.blocks.append(block)
+            self.by_hash[block['hash']] = block
+            self.finalized = number
+            return block
+
+    def handle(self, method, params):
+        """JSON-RPC result for one call; raises KeyError for unknown methods"""
+        if method == 'chain_getFinalizedHead':
+            return self.at(self.finalized)['hash']
+        if method == 'chain_getBlockHash':
+            number = params[0] if params else self.head()
+            block = self.at(int(number, 16) if isinstance(number, str) else number)
+            return block['hash'] if block else None
+        if method in ('chain_getBlock', 'chain_getHeader'):
+            block = self.by_hash.get(params[0]) if params else self.blocks[-1]
+            if block is None:
+                return None
+            return block['block'] if method == 'chain_getBlock' else block['block']['block']['header']
+        if method == 'author_submitExtrinsic':
+            self.append_block([params[0]])
+            return blake2_256(bytes.fromhex(params[0][2:]))
+        if method == 'system_chain':
+            return 'CertiChain stand-in'
+        raise KeyError(method)
+
+def make_block(number, parent_hash, extrinsics):
+    """chain_getBlock-shaped block with a hash over its contents"""
+    header = {
+        'parentHash': parent_hash,
+        'number': hex(number),
+        'stateRoot': '0x' + '00' * 32,
+        'extrinsicsRoot': blake2_256(''.join(extrinsics).encode()),
+        'digest': {'logs': []}
+    }
+    block_hash = blake2_256(json.dumps(header, sort_keys=True).encode())
+    return {'hash': block_hash, 'block': {'block': {'header': header, 'extrinsics': extrinsics}, 'justifications': None}}
+
+def make_handler(chain):
+    """Request handler answering JSON-RPC calls from chain"""
+
+    class RpcHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _respond(self, request):
+            try:
+                return {'jsonrpc': '2.0', 'id': request.get('id'),
+                        'result': chain.handle(request['method'], request.get('params', []))}
+            except KeyError:
+                return {'jsonrpc': '2.0', 'id': request.get('id'),
+                        'error': {'code': -32601, 'message': 'Method not found'}}
+            except (IndexError, ValueError, TypeError) as e:
+                return {'jsonrpc': '2.0', 'id': request.get('id'),
+                        'error': {'code': -32602, 'message': f'Invalid params: {e}'}}
+
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'null')
+            if isinstance(payload, list):
+                response = [self._respond(request) for request in payload]
+            else:
+                response = self._respond(payload)
+            body = json.dumps(response).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return RpcHandler
+
+class StandinServer(ThreadingHTTPServer):
+    """Threaded server that ignores clients closing pooled connections"""
+
+    def handle_error(self, request, client_address):
+        pass
+
+def serve(chain, port=DEFAULT_PORT):
+    """Server for chain on 127.0.0.1:port (call serve_forever() or run it in a thread)"""
+    return StandinServer(('127.0.0.1', port), make_handler(chain))
+
+def record(url, first, last, output):
+    """Save blocks first..last from a real endpoint as a replayable fixture"""
+    client = RpcClient(url)
+    blocks = []
+    for start in range(first, last + 1, RECORD_BATCH):
+        numbers = list(range(start, min(start + RECORD_BATCH, last + 1)))
+        hashes = client.batch([('chain_getBlockHash', [n]) for n in numbers])
+        bodies = client.batch([('chain_getBlock', [h]) for h in hashes])
+        blocks += [{'hash': h, 'block': body} for h, body in zip(hashes, bodies)]
+        print(f"   #{numbers[-1]}")
+
+    with open(output, 'w') as f:
+        json.dump({'source': url, 'first_block': first, 'blocks': blocks}, f)
+    print(f"✅ {len(blocks)} blocks saved to {output}")
+
+def synthesize(output, num_blocks, num_remarks, seed=42):
+    """Fake chain: filler extrinsics everywhere, CERTICHAIN remarks in random blocks"""
+    rng = random.Random(seed)
+    remark_blocks = sorted(rng.choices(range(1, num_blocks), k=num_remarks))
+    hashes = []
+
+    blocks, parent = [], '0x' + '00' * 32
+    for number in range(num_blocks):
+        # timestamp.set-like inherent, then a few unrelated signed transfers
+        extrinsics = ['0x' + (encode_compact(11) + bytes([0x04, 0x03, 0x00, 0x0b]) + rng.randbytes(7)).hex()]
+        extrinsics += [make_extrinsic(bytes([5, 0]) + rng.randbytes(40), signer=rng.randbytes(32))
+                       for _ in range(rng.randint(0, 3))]
+        while remark_blocks and remark_blocks[0] == number:
+            remark_blocks.pop(0)
+            certificate_hash = '0x' + hashlib.blake2b(rng.randbytes(32), digest_size=32).hexdigest()
+            hashes.append(certificate_hash)
+            extrinsics.insert(rng.randint(1, len(extrinsics)), make_extrinsic(remark_call(certificate_hash)))
+        block = make_block(number, parent, extrinsics)
+        blocks.append(block)
+        parent = block['hash']
+
+    with open(output, 'w') as f:
+        json.dump({'source': 'synthetic', 'blocks': blocks, 'certificate_hashes': hashes}, f)
+    print(f"✅ {num_blocks} blocks with {len(hashes)} CERTICHAIN remarks saved to {output}")
+
+def main():
+    """Stand-in node command-line entry point"""
+    parser = argparse.ArgumentParser(description='Local Substrate JSON-RPC stand-in replaying fixture blocks')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    serve_parser = subparsers.add_parser('serve', help='Serve a fixture over JSON-RPC')
+    serve_parser.add_argument('fixture', type=Path)
+    serve_parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    serve_parser.add_argument('--finalized', type=int, help='Report this block number as the finalized head')
+    record_parser = subparsers.add_parser('record', help='Capture a block range from a real node')
+    record_parser.add_argument('output', type=Path)
+    record_parser.add_argument('--url', required=True)
+    record_parser.add_argument('--from', dest='first', type=int, required=True)
+    record_parser.add_argument('--to', dest='last', type=int, required=True)
+    synth_parser = subparsers.add_parser('synthesize', help='Generate a fake chain fixture')
+    synth_parser.add_argument('output', type=Path)
+    synth_parser.add_argument('--blocks', type=int, default=1000)
+    synth_parser.add_argument('--remarks', type=int, default=200)
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record(args.url, args.first, args.last, args.output)
+    elif args.command == 'synthesize':
+        synthesize(args.output, args.blocks, args.remarks)
+    else:
+        chain = Chain.load(args.fixture)
+        if args.finalized is not None:
+            chain.finalized = args.finalized
+        server = serve(chain, args.port)
+        print(f"⛓️ Serving blocks #{chain.first_block}-#{chain.head()} (finalized #{chain.finalized}) on http://127.0.0.1:{args.port}")
+        print(f"   Try: python remark_index.py sync --url http://127.0.0.1:{args.port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+"""
+CERTICHAIN remark indexer
+Follows finalized blocks over Substrate JSON-RPC and records every
+CERTICHAIN system.remark as certificate hash (or ROOT:<hash> for a Merkle
+batch) -> (block, extrinsic index) in SQLite, so verification is one key
+lookup instead of a block scan
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+from pathlib import Path
+
+from substrate import RpcClient, RpcError, extract_remark
+
+# Configuration
+INDEX_PATH = Path('remark_index.sqlite')
+DEFAULT_RPC_URL = os.environ.get('POLKADOT_RPC_URL', 'http://127.0.0.1:9944')
+BLOCK_BATCH = 100        # Blocks fetched per pair of batched RPC round trips
+PROGRESS_EVERY = 10      # Batches between progress lines
+FOLLOW_INTERVAL = 6      # Seconds between catch-ups with --follow (one relay-chain slot)
+ROOT_PREFIX = 'ROOT:'    # Remark payload of a Merkle batch root (see anchoring.py)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS remarks (
+    hash TEXT PRIMARY KEY,
+    block_number INTEGER NOT NULL,
+    block_hash TEXT NOT NULL,
+    extrinsic_index INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sync_state (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    block_number INTEGER NOT NULL,
+    block_hash TEXT NOT NULL
+);
+"""
+
+def normalize_hash(value):
+    """Lower-case 0x-hex, as generateCertificateHash() returns it"""
+    value = value.strip().lower()
+    return value if value.startswith('0x') else '0x' + value
+
+def remark_key(payload):
+    """Index key for a remark payload: a certificate hash, or ROOT:<hash> for a batch root"""
+    payload = payload.strip()
+    if payload.upper().startswith(ROOT_PREFIX):
+        return ROOT_PREFIX + normalize_hash(payload[len(ROOT_PREFIX):])
+    return normalize_hash(payload)
+
+class RemarkIndex:
+    """Persistent remark store; the first anchoring of a hash wins"""
+
+    def __init__(self, path=INDEX_PATH):
+        self.db = sqlite3.connect(path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def last_indexed(self):
+        """(block number, block hash) of the last indexed block, or None"""
+        return self.db.execute('SELECT block_number, block_hash FROM sync_state WHERE id = 0').fetchone()
+
+    def add_blocks(self, rows, last_number, last_hash):
+        """Insert remark rows and advance the watermark in one transaction"""
+        with self.db:
+            self.db.executemany('INSERT OR IGNORE INTO remarks VALUES (?, ?, ?, ?)', rows)
+            self.db.execute(
+                'INSERT OR REPLACE INTO sync_state VALUES (0, ?, ?)', (last_number, last_hash)
+            )
+
+    def lookup(self, certificate_hash):
+        """{'block_number', 'block_hash', 'extrinsic_index'} or None"""
+        return self.lookup_many([certificate_hash]).get(remark_key(certificate_hash))
+
+    def lookup_many(self, certificate_hashes):
+        """Locations of every anchored hash in one query (missing ones are absent)"""
+        wanted = json.dumps([remark_key(h) for h in certificate_hashes])
+        rows = self.db.execute(
+            'SELECT hash, block_number, block_hash, extrinsic_index FROM remarks '
+            'WHERE hash IN (SELECT value FROM json_each(?))', (wanted,)
+        )
+        return {
+            h: {'block_number': number, 'block_hash': block_hash, 'extrinsic_index': index}
+            for h, number, block_hash, index in rows
+        }
+
+    def count(self):
+        return self.db.execute('SELECT COUNT(*) FROM remarks').fetchone()[0]
+
+def catch_up(index, client, start_block=0, batch=BLOCK_BATCH):
+    """Index every finalized block after the watermark; returns blocks indexed
+
+    Only finalized blocks are indexed, so stored locations never need
+    rolling back. The stored watermark hash is checked against the node to
+    catch an index pointed at a different chain.
+    """
+    head, _ = client.finalized_head()
+    last = index.last_indexed()
+    if last is not None:
+        number, block_hash = last
+        if client.call('chain_getBlockHash', number) != block_hash:
+            raise RpcError(f"Block {number} on the node does not match the index; wrong chain or index file?")
+        first = number + 1
+    else:
+        first = start_block
+
+    start = time.perf_counter()
+    found = 0
+    for batch_start in range(first, head + 1, batch):
+        blocks = client.blocks(list(range(batch_start, min(batch_start + batch, head + 1))))
+        rows = []
+        for number, block_hash, extrinsics in blocks:
+            for i, extrinsic in enumerate(extrinsics):
+                payload = extract_remark(extrinsic)
+                if payload is not None:
+                    rows.append((remark_key(payload), number, block_hash, i))
+        index.add_blocks(rows, blocks[-1][0], blocks[-1][1])
+        found += len(rows)
+
+        if (batch_start - first) // batch % PROGRESS_EVERY == PROGRESS_EVERY - 1 or blocks[-1][0] == head:
+            done = blocks[-1][0] - first + 1
+            elapsed = max(time.perf_counter() - start, 1e-9)
+            print(f"   #{blocks[-1][0]} / #{head}: {done / elapsed:.0f} blocks/s, {found} remarks", flush=True)
+
+    return max(0, head + 1 - first)
+
+def sync(url, path=INDEX_PATH, start_block=0, follow=False):
+    """Catch the index up with the node, optionally following new finalized blocks"""
+    index = RemarkIndex(path)
+    client = RpcClient(url)
+    try:
+        while True:
+            indexed = catch_up(index, client, start_block)
+            if indexed:
+                print(f"✅ Indexed {indexed} blocks; {index.count()} remarks in {path}")
+            if not follow:
+                return
+            time.sleep(FOLLOW_INTERVAL)
+    finally:
+        index.close()
+
+def lookup(hashes, path=INDEX_PATH):
+    """Print the on-chain location of each certificate hash"""
+    if not Path(path).exists():
+        raise ValueError(f"No index at {path}. Run: python remark_index.py sync")
+    index = RemarkIndex(path)
+    try:
+        found = index.lookup_many(hashes)
+        watermark = index.last_indexed()
+    finally:
+        index.close()
+
+    print(f"\n🔎 Indexed through block #{watermark[0] if watermark else '-'}")
+    for h in hashes:
+        location = found.get(remark_key(h))
+        if location:
+            print(f"✅ {remark_key(h)}: block #{location['block_number']} "
+                  f"({location['block_hash'][:18]}...), extrinsic {location['extrinsic_index']}")
+        else:
+            print(f"❌ {remark_key(h)}: not anchored")
+    return found
+
+def main():
+    """Indexer command-line entry point"""
+    parser = argparse.ArgumentParser(description='Index CERTICHAIN remarks for single-lookup verification')
+    parser.add_argument('--index', type=Path, default=INDEX_PATH)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    sync_parser = subparsers.add_parser('sync', help='Catch up with the finalized chain')
+    sync_parser.add_argument('--url', default=DEFAULT_RPC_URL, help='JSON-RPC endpoint (default: $POLKADOT_RPC_URL)')
+    sync_parser.add_argument('--from', dest='start_block', type=int, default=0,
+                             help='First block for an empty index')
+    sync_parser.add_argument('--follow', action='store_true', help='Keep polling for new finalized blocks')
+    lookup_parser = subparsers.add_parser('lookup', help='Locate certificate hashes (one query for all)')
+    lookup_parser.add_argument('hashes', nargs='+')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'sync':
+            sync(args.url, args.index, args.start_block, args.follow)
+        else:
+            lookup(args.hashes, args.index)
+    except (ValueError, RpcError) as e:
+        print(f"\n❌ Error: {e}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
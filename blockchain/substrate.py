@@ -0,0 +1,162 @@
+"""
+Minimal Substrate JSON-RPC client and extrinsic helpers
+Just enough SCALE to find the CERTICHAIN system.remark calls written by
+storeCertificateOnChain() in src/lib/polkadot.ts, without runtime metadata
+"""
+
+import json
+import time
+import hashlib
+import http.client
+from urllib.parse import urlsplit
+
+# Configuration
+REMARK_PREFIX = b'CERTICHAIN:'
+# (pallet, call) indices of system.remark and system.remark_with_event on Polkadot/Westend
+REMARK_CALLS = {bytes([0, 0]), bytes([0, 7])}
+RPC_TIMEOUT = 30
+RPC_RETRIES = 3
+
+class RpcError(Exception):
+    """JSON-RPC error response or unreachable node"""
+
+def encode_compact(value):
+    """SCALE compact encoding of a non-negative integer"""
+    if value < 1 << 6:
+        return bytes([value << 2])
+    if value < 1 << 14:
+        return ((value << 2) | 1).to_bytes(2, 'little')
+    if value < 1 << 30:
+        return ((value << 2) | 2).to_bytes(4, 'little')
+    length = (value.bit_length() + 7) // 8
+    return bytes([((length - 4) << 2) | 3]) + value.to_bytes(length, 'little')
+
+def decode_compact(data, offset=0):
+    """(value, offset after it) for a SCALE compact integer at offset"""
+    mode = data[offset] & 3
+    if mode == 0:
+        return data[offset] >> 2, offset + 1
+    if mode == 1:
+        return int.from_bytes(data[offset:offset + 2], 'little') >> 2, offset + 2
+    if mode == 2:
+        return int.from_bytes(data[offset:offset + 4], 'little') >> 2, offset + 4
+    length = (data[offset] >> 2) + 4
+    return int.from_bytes(data[offset + 1:offset + 1 + length], 'little'), offset + 1 + length
+
+def blake2_256(data):
+    """Substrate's default 32-byte hash, as 0x-hex"""
+    return '0x' + hashlib.blake2b(data, digest_size=32).hexdigest()
+
+def extract_remark(extrinsic_hex):
+    """Text after 'CERTICHAIN:' if the extrinsic is a CERTICHAIN remark, else None
+
+    The remark bytes are the call's only argument, so they run to the end of
+    the extrinsic: a match needs the call index and the compact length
+    directly before the prefix, which skips over signatures and signed
+    extensions without decoding them.
+    """
+    data = bytes.fromhex(extrinsic_hex[2:] if extrinsic_hex.startswith('0x') else extrinsic_hex)
+    length, offset = decode_compact(data)
+    body = data[offset:offset + length]
+
+    pos = body.find(REMARK_PREFIX)
+    if pos < 0:
+        return None
+    encoded_length = encode_compact(len(body) - pos)
+    start = pos - len(encoded_length)
+    if start < 2 or body[start:pos] != encoded_length or body[start - 2:start] not in REMARK_CALLS:
+        return None
+    return body[pos + len(REMARK_PREFIX):].decode('utf-8', errors='replace')
+
+def remark_call(text):
+    """Encoded system.remark call carrying CERTICHAIN:<text>"""
+    data = REMARK_PREFIX + text.encode()
+    return bytes([0, 0]) + encode_compact(len(data)) + data
+
+def make_extrinsic(call, signer=bytes(32), signature=bytes(64), nonce=0):
+    """Signed v4 extrinsic around an encoded call (immortal era, no tip)
+
+    Only for stand-in nodes and fixtures: a real node needs a genuine
+    signature over the payload and the runtime's signed extensions.
+    """
+    body = (
+        bytes([0x84])                  # Signed, version 4
+        + b'\x00' + signer             # MultiAddress::Id
+        + b'\x01' + signature          # MultiSignature::Sr25519
+        + b'\x00'                      # Immortal era
+        + encode_compact(nonce)
+        + encode_compact(0)            # Tip
+        + call
+    )
+    return '0x' + (encode_compact(len(body)) + body).hex()
+
+class RpcClient:
+    """JSON-RPC over one persistent HTTP connection, with request batching"""
+
+    def __init__(self, url, timeout=RPC_TIMEOUT):
+        parts = urlsplit(url.replace('wss://', 'https://').replace('ws://', 'http://'))
+        self.https = parts.scheme == 'https'
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.https else 80)
+        self.path = parts.path or '/'
+        self.timeout = timeout
+        self.connection = None
+        self.next_id = 0
+
+    def _post(self, payload):
+        """Decoded JSON response, reconnecting on dropped connections"""
+        body = json.dumps(payload).encode()
+        for attempt in range(RPC_RETRIES + 1):
+            try:
+                if self.connection is None:
+                    connection_class = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+                    self.connection = connection_class(self.host, self.port, timeout=self.timeout)
+                self.connection.request('POST', self.path, body, {'Content-Type': 'application/json'})
+                response = self.connection.getresponse()
+                data = response.read()
+                if response.status != 200:
+                    raise RpcError(f"HTTP {response.status}: {data[:200].decode(errors='replace')}")
+                return json.loads(data)
+            except (OSError, http.client.HTTPException) as e:
+                self.connection = None
+                if attempt == RPC_RETRIES:
+                    raise RpcError(f"Cannot reach {self.host}:{self.port}: {e}") from e
+                time.sleep(0.5 * 2 ** attempt)
+
+    def _request(self, method, params):
+        self.next_id += 1
+        return {'jsonrpc': '2.0', 'id': self.next_id, 'method': method, 'params': list(params)}
+
+    @staticmethod
+    def _result(response):
+        if 'error' in response:
+            raise RpcError(f"{response['error'].get('code')}: {response['error'].get('message')}")
+        return response['result']
+
+    def call(self, method, *params):
+        return self._result(self._post(self._request(method, params)))
+
+    def batch(self, calls):
+        """Results of several (method, params) calls sent as one JSON-RPC batch"""
+        if not calls:
+            return []
+        requests = [self._request(method, params) for method, params in calls]
+        by_id = {response['id']: response for response in self._post(requests)}
+        return [self._result(by_id[request['id']]) for request in requests]
+
+    def finalized_head(self):
+        """(number, hash) of the latest finalized block"""
+        head_hash = self.call('chain_getFinalizedHead')
+        return int(self.call('chain_getHeader', head_hash)['number'], 16), head_hash
+
+    def blocks(self, numbers):
+        """[(number, hash, extrinsics)] for block numbers, two batched round trips"""
+        hashes = self.batch([('chain_getBlockHash', [n]) for n in numbers])
+        missing = [n for n, h in zip(numbers, hashes) if h is None]
+        if missing:
+            raise RpcError(f"Node has no block #{missing[0]} (pruned, or past the fixture?)")
+        bodies = self.batch([('chain_getBlock', [h]) for h in hashes])
+        return [
+            (n, h, body['block']['extrinsics'])
+            for n, h, body in zip(numbers, hashes, bodies)
+        ]
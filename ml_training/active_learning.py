@@ -0,0 +1,333 @@
+"""
+Active learning for certificate labeling
+Scores an unlabeled pool with the exported model and queues the most
+informative images (uncertainty, margin or embedding-cluster diversity) for
+labeling; `simulate` replays the loop on the cached dataset against random
+sampling to report accuracy per labeled image and per training hour
+"""
+
+import sys
+import csv
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import numpy as np
+from pathlib import Path
+
+from autotune import apply_profile, tuned_batch_size
+from train_certificate_model import (
+    CLASS_NAMES, BATCH_SIZE, LEARNING_RATE, KERAS_MODEL_PATH,
+    SPLIT_TRAIN, SPLIT_TEST, load_dataset_cache, compile_options, is_multitask,
+    load_image, require_resize_model
+)
+
+# Configuration
+UNLABELED_DIR = Path('unlabeled')
+NEW_DATA_DIR = Path('new_data')          # Consumed by incremental_train.py
+QUEUE_PATH = Path('labeling_queue.csv')
+REPORT_PATH = Path('exported') / 'active_learning_report.json'
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+STRATEGIES = ('uncertainty', 'margin', 'diversity', 'random')
+DEFAULT_BUDGET = 100     # Images sent for labeling per round
+CANDIDATE_FACTOR = 5     # Diversity clusters the budget * factor most uncertain images
+KMEANS_ITERATIONS = 20
+SCORE_BATCH = tuned_batch_size('inference', 64)
+SIM_ROUNDS = 5
+SIM_EPOCHS = 3           # Epochs over the labeled subset per simulated round
+
+def embedding_model(model):
+    """Model returning (class probabilities, input of the class layer)"""
+    from tensorflow import keras
+
+    head = model.get_layer('class') if is_multitask(model) else model.layers[-1]
+    return keras.Model(model.inputs, [head.output, head.input])
+
+def score_images(scorer, images):
+    """Probabilities and embeddings for an in-memory array, SCORE_BATCH at a time"""
+    outputs = [scorer(images[i:i + SCORE_BATCH], training=False) for i in range(0, len(images), SCORE_BATCH)]
+    return (
+        np.concatenate([np.asarray(probs) for probs, _ in outputs]),
+        np.concatenate([np.asarray(embeddings) for _, embeddings in outputs])
+    )
+
+def score_pool(scorer, paths):
+    """Probabilities and embeddings for image files, decoded one batch at a time"""
+    probs, embeddings, scored = [], [], []
+    for i in range(0, len(paths), SCORE_BATCH):
+        batch, batch_paths = [], []
+        for path in paths[i:i + SCORE_BATCH]:
+            try:
+                batch.append(load_image(path))
+                batch_paths.append(path)
+            except Exception as e:
+                print(f"  ⚠️ Error loading {path}: {e}")
+        if batch:
+            p, e = scorer(np.stack(batch), training=False)
+            probs.append(np.asarray(p))
+            embeddings.append(np.asarray(e))
+            scored += batch_paths
+    if not scored:
+        raise ValueError("No readable images in the unlabeled pool")
+    return scored, np.concatenate(probs), np.concatenate(embeddings)
+
+def uncertainty_scores(probs):
+    """Predictive entropy (higher is more informative)"""
+    return -np.sum(probs * np.log(np.clip(probs, 1e-12, 1.0)), axis=1)
+
+def margin_scores(probs):
+    """One minus the gap between the two most likely classes"""
+    top2 = np.sort(probs, axis=1)[:, -2:]
+    return 1.0 - (top2[:, 1] - top2[:, 0])
+
+def kmeans(points, k, rng, iterations=KMEANS_ITERATIONS):
+    """Cluster index per point from k-means++ seeding and Lloyd iterations"""
+    centers = [points[rng.integers(len(points))]]
+    distance = np.sum((points - centers[0]) ** 2, axis=1)
+    for _ in range(1, k):
+        total = distance.sum()
+        centers.append(points[rng.choice(len(points), p=distance / total if total > 0 else None)])
+        distance = np.minimum(distance, np.sum((points - centers[-1]) ** 2, axis=1))
+    centers = np.array(centers)
+
+    assignment = None
+    for _ in range(iterations):
+        distances = (
+            np.sum(points ** 2, axis=1)[:, None] - 2 * points @ centers.T + np.sum(centers ** 2, axis=1)[None]
+        )
+        new_assignment = distances.argmin(axis=1)
+        if assignment is not None and np.array_equal(new_assignment, assignment):
+            break
+        assignment = new_assignment
+        for j in range(k):
+            members = points[assignment == j]
+            if len(members):
+                centers[j] = members.mean(axis=0)
+    return assignment
+
+def select(probs, embeddings, budget, strategy, rng):
+    """Indices of the budget most informative samples under strategy
+
+    diversity takes the budget * CANDIDATE_FACTOR lowest-margin samples,
+    clusters their L2-normalized embeddings into budget clusters and keeps
+    the lowest-margin sample of each, so a batch does not spend its labels
+    on near-identical certificates.
+    """
+    budget = min(budget, len(probs))
+    if strategy == 'random':
+        return rng.choice(len(probs), size=budget, replace=False)
+    if strategy == 'uncertainty':
+        return np.argsort(-uncertainty_scores(probs))[:budget]
+
+    scores = margin_scores(probs)
+    ranked = np.argsort(-scores)
+    if strategy == 'margin':
+        return ranked[:budget]
+    if strategy != 'diversity':
+        raise ValueError(f"Unknown strategy '{strategy}'. Choose from: {', '.join(STRATEGIES)}")
+
+    candidates = ranked[:budget * CANDIDATE_FACTOR]
+    if len(candidates) <= budget:
+        return candidates
+    points = embeddings[candidates]
+    points = points / np.maximum(np.linalg.norm(points, axis=1, keepdims=True), 1e-12)
+    clusters = kmeans(points, budget, rng)
+
+    chosen = [
+        candidates[members[np.argmax(scores[candidates[members]])]]
+        for members in (np.flatnonzero(clusters == j) for j in range(budget)) if len(members)
+    ]
+    # Empty clusters: top up with the next most uncertain candidates
+    taken = set(chosen)
+    rest = [i for i in candidates if i not in taken]
+    return np.array(chosen + rest[:budget - len(chosen)])
+
+def list_pool(pool_dir):
+    """Image files anywhere under the unlabeled pool directory"""
+    return sorted(p for p in Path(pool_dir).rglob('*') if p.is_file() and p.suffix.lower() in IMAGE_EXTENSIONS)
+
+def select_for_labeling(pool_dir, budget, strategy, queue_path=QUEUE_PATH):
+    """Score the unlabeled pool with the exported model and write a labeling queue"""
+    require_resize_model('active-learning scoring of resized images')
+    if not KERAS_MODEL_PATH.exists():
+        raise ValueError(f"No exported model at {KERAS_MODEL_PATH}. Run train_certificate_model.py first")
+    paths = list_pool(pool_dir)
+    if not paths:
+        raise ValueError(f"No images in {pool_dir}/")
+
+    from tensorflow import keras
+
+    print(f"\n🔎 Scoring {len(paths)} unlabeled images...")
+    start = time.perf_counter()
+    scorer = embedding_model(keras.models.load_model(KERAS_MODEL_PATH))
+    paths, probs, embeddings = score_pool(scorer, paths)
+    print(f"   {len(paths) / (time.perf_counter() - start):.1f} images/s")
+
+    chosen = select(probs, embeddings, budget, strategy, np.random.default_rng(42))
+    with open(queue_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['path', 'predicted', 'confidence', 'margin', 'class'])
+        for i in chosen:
+            writer.writerow([
+                paths[i], CLASS_NAMES[int(np.argmax(probs[i]))], f'{probs[i].max():.4f}',
+                f'{1.0 - margin_scores(probs[i:i + 1])[0]:.4f}', ''
+            ])
+
+    print(f"✅ {len(chosen)} images queued by {strategy} in {queue_path}")
+    print(f"   Fill in the class column, then: python active_learning.py import {queue_path}")
+
+def import_labels(queue_path=QUEUE_PATH):
+    """Move labeled queue entries into new_data/<class>/ for incremental_train.py
+
+    Files are renamed {sha256[:16]}_{name}, as ingest_storage.save_original()
+    does, so same-named images from different pool folders never collide.
+    """
+    moved = skipped = 0
+    with open(queue_path, newline='') as f:
+        for row in csv.DictReader(f):
+            label = row['class'].strip().lower()
+            if label not in CLASS_NAMES or not Path(row['path']).exists():
+                skipped += 1
+                continue
+            source = Path(row['path'])
+            sha256 = hashlib.sha256(source.read_bytes()).hexdigest()
+            target_dir = NEW_DATA_DIR / label
+            target_dir.mkdir(parents=True, exist_ok=True)
+            shutil.move(str(source), str(target_dir / f'{sha256[:16]}_{source.name}'))
+            moved += 1
+
+    print(f"✅ Moved {moved} labeled images to {NEW_DATA_DIR}/ ({skipped} unlabeled or missing)")
+    print("   Retrain on them with: python incremental_train.py")
+
+def simulate(strategies, rounds, budget):
+    """Replay labeling rounds on the cached train split, labels revealed on selection
+
+    Every strategy starts from the same random seed set and initial weights,
+    trains SIM_EPOCHS over its labeled subset per round and is scored on the
+    test split. Returns the per-round history for each strategy.
+    """
+    from train_certificate_model import create_model
+
+    require_resize_model('the active-learning simulation')
+    images, labels, splits = load_dataset_cache()
+    pool_idx = np.flatnonzero(splits == SPLIT_TRAIN)
+    X_test, y_test = images[splits == SPLIT_TEST], labels[splits == SPLIT_TEST]
+    if len(pool_idx) < budget * (rounds + 1):
+        raise ValueError(f"Train split has {len(pool_idx)} samples; need {budget * (rounds + 1)} "
+                         f"for {rounds} rounds of {budget}")
+
+    model = create_model(use_transfer_learning=True)
+    model.compile(**compile_options(model, LEARNING_RATE))
+    initial_weights = model.get_weights()
+    seed_set = np.random.default_rng(0).choice(pool_idx, size=budget, replace=False)
+
+    results = {}
+    for strategy in strategies:
+        print(f"\n🧪 Strategy: {strategy}")
+        rng = np.random.default_rng(42)
+        model.set_weights(initial_weights)
+        model.compile(**compile_options(model, LEARNING_RATE))  # Fresh optimizer state
+        scorer = embedding_model(model)
+        labeled = set(seed_set.tolist())
+        train_seconds = 0.0
+        history = []
+
+        for round_num in range(rounds + 1):
+            idx = np.array(sorted(labeled))
+            start = time.perf_counter()
+            model.fit(
+                images[idx], labels[idx],
+                epochs=SIM_EPOCHS, batch_size=BATCH_SIZE, verbose=0
+            )
+            train_seconds += time.perf_counter() - start
+
+            test_probs, _ = score_images(scorer, X_test)
+            accuracy = float(np.mean(np.argmax(test_probs, axis=1) == np.argmax(y_test, axis=1)))
+            history.append({'labeled': len(idx), 'accuracy': accuracy, 'train_seconds': train_seconds})
+            print(f"   Round {round_num}: {len(idx):>6} labeled, accuracy {accuracy:.2%}, "
+                  f"{train_seconds:.0f}s training")
+
+            if round_num == rounds:
+                break
+            remaining = np.array(sorted(set(pool_idx.tolist()) - labeled))
+            probs, embeddings = score_images(scorer, images[remaining])
+            labeled.update(remaining[select(probs, embeddings, budget, strategy, rng)].tolist())
+
+        results[strategy] = history
+    return results
+
+def labels_to_reach(history, target):
+    """(labeled images, training seconds) when accuracy first reached target, or None"""
+    for entry in history:
+        if entry['accuracy'] >= target:
+            return entry['labeled'], entry['train_seconds']
+    return None
+
+def report(results, report_path=REPORT_PATH):
+    """Accuracy gain per labeled image and per training hour versus random sampling"""
+    target = results['random'][-1]['accuracy'] if 'random' in results else None
+
+    print("\n📊 Active learning report")
+    header = f"   {'strategy':<12}{'labeled':>9}{'accuracy':>10}{'Δacc/100 img':>14}{'Δacc/train h':>14}"
+    if target is not None:
+        header += f"{'labels to random':>18}"
+    print(header)
+
+    summary = {}
+    for strategy, history in results.items():
+        first, last = history[0], history[-1]
+        gain = last['accuracy'] - first['accuracy']
+        new_labels = last['labeled'] - first['labeled']
+        hours = last['train_seconds'] / 3600
+        summary[strategy] = {
+            'final_accuracy': last['accuracy'],
+            'accuracy_gain_per_100_labels': 100 * gain / max(new_labels, 1),
+            'accuracy_gain_per_train_hour': gain / max(hours, 1e-9),
+            'history': history
+        }
+        line = (f"   {strategy:<12}{last['labeled']:>9}{last['accuracy']:>10.2%}"
+                f"{summary[strategy]['accuracy_gain_per_100_labels']:>+14.2%}"
+                f"{summary[strategy]['accuracy_gain_per_train_hour']:>+14.2%}")
+        if target is not None:
+            reached = labels_to_reach(history, target)
+            summary[strategy]['labels_to_random_final'] = reached[0] if reached else None
+            line += f"{reached[0] if reached else '-':>18}"
+        print(line)
+
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(report_path, 'w') as f:
+        json.dump({'random_final_accuracy': target, 'strategies': summary}, f, indent=2)
+    print(f"\n✅ Report saved to {report_path}")
+
+def main():
+    """Active-learning command-line entry point"""
+    parser = argparse.ArgumentParser(description='Pick the most informative certificates to label next')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    select_parser = subparsers.add_parser('select', help='Score the unlabeled pool and write a labeling queue')
+    select_parser.add_argument('--pool', type=Path, default=UNLABELED_DIR)
+    select_parser.add_argument('--budget', type=int, default=DEFAULT_BUDGET)
+    select_parser.add_argument('--strategy', choices=STRATEGIES, default='diversity')
+    import_parser = subparsers.add_parser('import', help='Move labeled queue entries into new_data/<class>/')
+    import_parser.add_argument('queue', type=Path, nargs='?', default=QUEUE_PATH)
+    simulate_parser = subparsers.add_parser('simulate', help='Compare strategies with random sampling on the cache')
+    simulate_parser.add_argument('--strategies', nargs='+', choices=STRATEGIES, default=list(STRATEGIES))
+    simulate_parser.add_argument('--rounds', type=int, default=SIM_ROUNDS)
+    simulate_parser.add_argument('--budget', type=int, default=DEFAULT_BUDGET)
+    args = parser.parse_args()
+    if args.command != 'import':
+        apply_profile('training' if args.command == 'simulate' else 'inference')
+
+    try:
+        if args.command == 'select':
+            select_for_labeling(args.pool, args.budget, args.strategy)
+        elif args.command == 'import':
+            import_labels(args.queue)
+        else:
+            report(simulate(args.strategies, args.rounds, args.budget))
+    except ValueError as e:
+        print(f"\n❌ Error: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,337 @@
+"""
+CPU topology-aware runtime autotuning
+Benchmarks short training steps and inference batches of a model variant
+across intra/inter-op thread counts, batch sizes and NUMA pinning, each in a
+fresh process, and saves the fastest settings to a per-host profile that the
+training, batch-scoring and serving entry points apply at startup
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import subprocess
+from pathlib import Path
+
+# Configuration
+PROFILE_PATH = Path('exported') / 'cpu_profile.json'
+VARIANTS = ('mobilenet', 'scratch', 'multitask', 'small')  # create_model() flavours
+INFERENCE_BATCHES = (8, 16, 32, 64, 128)
+INTER_OP_CANDIDATES = (1, 2)
+WARMUP_STEPS = 2
+TRAIN_STEPS = 8
+INFERENCE_REPEATS = 5
+BENCH_IMG_SIZE = 224
+NUMA_NODE_ENV = 'CERT_NUMA_NODE'  # Overrides which node a pinned profile uses
+SYSFS_NODES = Path('/sys/devices/system/node')
+SYSFS_CPUS = Path('/sys/devices/system/cpu')
+
+def parse_cpulist(text):
+    """CPU ids from a kernel cpulist such as '0-7,16-23'"""
+    cpus = []
+    for part in text.strip().split(','):
+        if '-' in part:
+            first, last = part.split('-')
+            cpus += range(int(first), int(last) + 1)
+        elif part:
+            cpus.append(int(part))
+    return cpus
+
+def format_cpulist(cpus):
+    """Inverse of parse_cpulist()"""
+    ranges, cpus = [], sorted(cpus)
+    start = prev = cpus[0]
+    for cpu in cpus[1:] + [None]:
+        if cpu is not None and cpu == prev + 1:
+            prev = cpu
+            continue
+        ranges.append(str(start) if start == prev else f'{start}-{prev}')
+        if cpu is not None:
+            start = prev = cpu
+    return ','.join(ranges)
+
+def cpu_topology():
+    """Usable CPUs grouped by NUMA node, plus the physical core of each CPU"""
+    allowed = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count() or 1))
+
+    nodes = []
+    node_dirs = sorted(SYSFS_NODES.glob('node[0-9]*'), key=lambda p: int(p.name[4:]))
+    for node_dir in node_dirs:
+        cpus = [cpu for cpu in parse_cpulist((node_dir / 'cpulist').read_text()) if cpu in allowed]
+        if cpus:
+            nodes.append(cpus)
+    if not nodes:
+        nodes = [allowed]
+
+    # Hyperthread siblings share (package, core id)
+    cores = {}
+    for cpu in allowed:
+        topology = SYSFS_CPUS / f'cpu{cpu}' / 'topology'
+        try:
+            cores[cpu] = (topology / 'physical_package_id').read_text().strip(), (topology / 'core_id').read_text().strip()
+        except OSError:
+            cores[cpu] = cpu
+    return {'cpus': allowed, 'nodes': nodes, 'cores': cores}
+
+def physical_cores(cpus, topology):
+    return len({topology['cores'][cpu] for cpu in cpus})
+
+def candidate_settings(topology, jobs=1):
+    """Thread/pinning combinations to benchmark for jobs processes sharing the host
+
+    Unpinned runs use every usable CPU; pinned runs use one NUMA node, and
+    several jobs are spread over the nodes. Thread counts cover one thread
+    per physical core, per logical CPU and half the cores.
+    """
+    nodes = topology['nodes']
+    scopes = [(None, topology['cpus'], jobs)]
+    if len(nodes) > 1:
+        scopes.append((0, nodes[0], -(-jobs // len(nodes))))
+
+    settings = []
+    for numa_node, cpus, jobs_in_scope in scopes:
+        cores = max(1, physical_cores(cpus, topology) // jobs_in_scope)
+        logical = max(1, len(cpus) // jobs_in_scope)
+        for intra in sorted({cores, logical, max(1, cores // 2)}):
+            for inter in INTER_OP_CANDIDATES:
+                settings.append({'numa_node': numa_node, 'intra_op_threads': intra, 'inter_op_threads': inter})
+    return settings
+
+def apply_settings(settings, override=True):
+    """Set thread, oneDNN/OpenMP and affinity settings; must run before TensorFlow loads
+
+    With override=False variables already set in the environment win, so
+    an operator can still adjust a single job by hand.
+    """
+    intra, inter = str(settings['intra_op_threads']), str(settings['inter_op_threads'])
+    env = {
+        'TF_NUM_INTRAOP_THREADS': intra,
+        'TF_NUM_INTEROP_THREADS': inter,
+        'OMP_NUM_THREADS': intra,
+        'TF_ENABLE_ONEDNN_OPTS': '1',
+        'KMP_BLOCKTIME': '1',  # Idle OpenMP threads yield quickly instead of spinning
+    }
+    cpus = settings.get('cpus')
+    if cpus:
+        env['KMP_AFFINITY'] = 'granularity=fine,compact,1,0'
+    for key, value in env.items():
+        if override:
+            os.environ[key] = value
+        else:
+            os.environ.setdefault(key, value)
+
+    if cpus and hasattr(os, 'sched_setaffinity'):
+        # Memory follows first touch, so pinned threads allocate on their own node
+        os.sched_setaffinity(0, parse_cpulist(cpus))
+
+def load_profile(path=PROFILE_PATH, quiet=False):
+    """Saved profile for this host, or None (missing or tuned on another machine)"""
+    if not path.exists():
+        return None
+    with open(path) as f:
+        profile = json.load(f)
+    if profile.get('host') != socket.gethostname() or profile.get('cpu_count') != os.cpu_count():
+        if not quiet:
+            print(f"⚠️ {path} was tuned on {profile.get('host')}; using default CPU settings")
+        return None
+    return profile
+
+def apply_profile(role, path=PROFILE_PATH):
+    """Apply the saved 'training' or 'inference' settings at an entry point
+
+    Returns the settings (including the tuned batch size) or None when
+    there is no profile for this host.
+    """
+    profile = load_profile(path)
+    if profile is None:
+        return None
+    if 'tensorflow' in sys.modules:
+        print("⚠️ TensorFlow already loaded; thread settings from the CPU profile may not apply")
+
+    settings = dict(profile[role])
+    if settings['numa_node'] is not None:
+        nodes = profile['topology']['nodes']
+        node = int(os.environ.get(NUMA_NODE_ENV, os.getpid() % len(nodes)))
+        settings['cpus'] = format_cpulist(nodes[node % len(nodes)])
+    apply_settings(settings, override=False)
+    pinning = f"pinned to CPUs {settings['cpus']}" if settings.get('cpus') else 'unpinned'
+    print(f"⚙️ CPU profile ({role}): {settings['intra_op_threads']} intra / "
+          f"{settings['inter_op_threads']} inter-op threads, {pinning}, batch {settings['batch_size']}")
+    return settings
+
+def tuned_batch_size(role, default):
+    """Batch size from the host profile, or default (cheap enough for module constants)"""
+    try:
+        profile = load_profile(quiet=True)
+    except (OSError, ValueError, KeyError):
+        return default
+    return profile[role]['batch_size'] if profile else default
+
+def variant_batch_size(variant):
+    """Training batch size of the script that trains variant ('small' is train_model.py's CNN)"""
+    if variant == 'small':
+        from train_model import BATCH_SIZE
+    else:
+        from train_certificate_model import BATCH_SIZE
+    return BATCH_SIZE
+
+def build_variant(variant):
+    """Compiled model and fit() targets builder for a create_model() flavour"""
+    import numpy as np
+    from train_certificate_model import (
+        LEARNING_RATE, NUM_CLASSES, create_model, create_multitask_model, compile_options, model_targets
+    )
+    from features import NUM_TARGETS
+
+    if variant == 'small':
+        from train_model import create_model as create_small_model
+        model = create_small_model()
+    else:
+        model = create_multitask_model() if variant == 'multitask' else create_model(variant == 'mobilenet')
+        model.compile(**compile_options(model, LEARNING_RATE))
+
+    def targets(n, rng):
+        y = np.eye(NUM_CLASSES, dtype=np.float32)[rng.integers(NUM_CLASSES, size=n)]
+        return model_targets(model, y, rng.random((n, NUM_TARGETS), dtype=np.float32))
+    return model, targets
+
+def bench(variant, train_batch, batches):
+    """Training and inference throughput in this (already configured) process"""
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    model, targets = build_variant(variant)
+
+    X = rng.random((train_batch, BENCH_IMG_SIZE, BENCH_IMG_SIZE, 3), dtype=np.float32)
+    y = targets(train_batch, rng)
+    for _ in range(WARMUP_STEPS):
+        model.train_on_batch(X, y)
+    start = time.perf_counter()
+    for _ in range(TRAIN_STEPS):
+        model.train_on_batch(X, y)
+    train_rate = TRAIN_STEPS * train_batch / (time.perf_counter() - start)
+
+    inference = {}
+    for batch in batches:
+        X = rng.random((batch, BENCH_IMG_SIZE, BENCH_IMG_SIZE, 3), dtype=np.float32)
+        model(X, training=False)
+        start = time.perf_counter()
+        for _ in range(INFERENCE_REPEATS):
+            model(X, training=False)
+        inference[batch] = INFERENCE_REPEATS * batch / (time.perf_counter() - start)
+
+    print(json.dumps({'train_samples_per_second': train_rate, 'inference_images_per_second': inference}))
+
+def run_bench(settings, variant, train_batch, batches):
+    """Run `bench` in a fresh interpreter so thread pools and affinity start clean"""
+    command = [
+        sys.executable, __file__, 'bench', '--variant', variant,
+        '--intra', str(settings['intra_op_threads']), '--inter', str(settings['inter_op_threads']),
+        '--train-batch', str(train_batch), '--batches', *map(str, batches)
+    ]
+    if settings.get('cpus'):
+        command += ['--cpus', settings['cpus']]
+    result = subprocess.run(command, cwd=Path(__file__).resolve().parent, capture_output=True, text=True)
+    if result.returncode != 0:
+        message = (result.stderr.strip() or result.stdout.strip() or 'failed').splitlines()[-1]
+        print(f"   ⚠️ {message}")
+        return None
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def autotune(variant, jobs=1, batches=INFERENCE_BATCHES, path=PROFILE_PATH):
+    """Benchmark every candidate setting and save the fastest per role"""
+    train_batch = variant_batch_size(variant)
+
+    topology = cpu_topology()
+    print(f"\n🖥️ {len(topology['cpus'])} usable CPUs, "
+          f"{physical_cores(topology['cpus'], topology)} physical cores, {len(topology['nodes'])} NUMA node(s)")
+
+    candidates = candidate_settings(topology, jobs)
+    print(f"\n⏱️ Benchmarking {variant} (training batch {train_batch}) with {len(candidates)} settings "
+          f"({jobs} job(s) per host)...")
+    print(f"   {'pinning':<10}{'intra':>6}{'inter':>6}{'train img/s':>13}{'best infer img/s':>18}")
+
+    results = []
+    for settings in candidates:
+        if settings['numa_node'] is not None:
+            settings = dict(settings, cpus=format_cpulist(topology['nodes'][settings['numa_node']]))
+        stats = run_bench(settings, variant, train_batch, batches)
+        if stats is None:
+            continue
+        inference = {int(batch): rate for batch, rate in stats['inference_images_per_second'].items()}
+        results.append({**settings, 'train': stats['train_samples_per_second'], 'inference': inference})
+        pinning = f"node {settings['numa_node']}" if settings['numa_node'] is not None else 'all'
+        print(f"   {pinning:<10}{settings['intra_op_threads']:>6}{settings['inter_op_threads']:>6}"
+              f"{stats['train_samples_per_second']:>13.1f}{max(inference.values()):>18.1f}")
+    if not results:
+        raise ValueError("Every benchmark run failed")
+
+    def role_settings(result, batch_size, rate):
+        return {
+            'intra_op_threads': result['intra_op_threads'], 'inter_op_threads': result['inter_op_threads'],
+            'numa_node': result['numa_node'], 'batch_size': batch_size, 'throughput': rate
+        }
+
+    # Training keeps the configured batch size (it changes the optimization, not just speed)
+    best_train = max(results, key=lambda r: r['train'])
+    best_infer, infer_batch = max(
+        ((r, batch) for r in results for batch in r['inference']), key=lambda pair: pair[0]['inference'][pair[1]]
+    )
+    profile = {
+        'host': socket.gethostname(),
+        'cpu_count': os.cpu_count(),
+        'variant': variant,
+        'jobs': jobs,
+        'topology': {'cpus': format_cpulist(topology['cpus']), 'nodes': topology['nodes']},
+        'training': role_settings(best_train, train_batch, best_train['train']),
+        'inference': role_settings(best_infer, infer_batch, best_infer['inference'][infer_batch]),
+        'results': results,
+        'tuned_date': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(profile, f, indent=2)
+
+    for role in ('training', 'inference'):
+        s = profile[role]
+        pinning = f"node {s['numa_node']}" if s['numa_node'] is not None else 'unpinned'
+        print(f"\n✅ {role.capitalize()}: {s['intra_op_threads']} intra / {s['inter_op_threads']} inter-op threads, "
+              f"{pinning}, batch {s['batch_size']} ({s['throughput']:.1f} img/s)")
+    print(f"✅ Profile saved to {path}")
+
+def main():
+    """Autotune command-line entry point"""
+    parser = argparse.ArgumentParser(description='Tune CPU threads, batch size and NUMA pinning for this host')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    tune_parser = subparsers.add_parser('tune', help='Benchmark settings and save the host profile')
+    tune_parser.add_argument('--variant', choices=VARIANTS, default='mobilenet')
+    tune_parser.add_argument('--jobs', type=int, default=1, help='Concurrent jobs expected on this host')
+    bench_parser = subparsers.add_parser('bench', help='Measure one setting (used by tune)')
+    bench_parser.add_argument('--variant', choices=VARIANTS, required=True)
+    bench_parser.add_argument('--intra', type=int, required=True)
+    bench_parser.add_argument('--inter', type=int, required=True)
+    bench_parser.add_argument('--cpus', help='cpulist to pin to, e.g. 0-15')
+    bench_parser.add_argument('--train-batch', type=int, required=True)
+    bench_parser.add_argument('--batches', type=int, nargs='+', required=True)
+    subparsers.add_parser('show', help='Print the saved profile')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'tune':
+            autotune(args.variant, args.jobs)
+        elif args.command == 'bench':
+            apply_settings({'intra_op_threads': args.intra, 'inter_op_threads': args.inter, 'cpus': args.cpus})
+            bench(args.variant, args.train_batch, args.batches)
+        else:
+            profile = load_profile()
+            if profile is None:
+                raise ValueError(f"No profile for this host at {PROFILE_PATH}. Run: python autotune.py tune")
+            print(json.dumps({key: profile[key] for key in ('variant', 'jobs', 'training', 'inference')}, indent=2))
+    except ValueError as e:
+        print(f"\n❌ Error: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Startup-time benchmark for the ML command-line tools
+Times `--help` and bare module imports in fresh interpreters so heavy
+top-level imports (TensorFlow, matplotlib, PIL) show up immediately
+"""
+
+import sys
+import argparse
+import subprocess
+import statistics
+import time
+from pathlib import Path
+
+# Configuration
+REPEATS = 5
+STARTUP_BUDGET = 1.0  # Seconds; light commands should stay well under this
+HEAVY_MODULES = ['tensorflow', 'keras', 'matplotlib', 'sklearn', 'PIL']
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+
+COMMANDS = [
+    'generate_sample_data.py',
+    'train_model.py',
+    'train_certificate_model.py',
+    'incremental_train.py',
+    'tiling.py',
+    'cascade.py',
+    'tta.py',
+    'runtimes.py',
+    'ingest_storage.py',
+    'storage_standin.py',
+    'manifest.py',
+    'active_learning.py',
+    'autotune.py',
+]
+
+MODULES = ['dedupe', 'streaming_eval', 'train_model', 'train_certificate_model']
+
+def time_command(args):
+    """(median wall time, error) of a command in a fresh interpreter
+
+    error is None on success, else the exit code and last stderr line of
+    the first failing run; a failed run is not timed again.
+    """
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = subprocess.run(args, cwd=SCRIPT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        timings.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            lines = result.stderr.strip().splitlines()
+            return timings[-1], f"exit {result.returncode}: {lines[-1] if lines else 'no output'}"
+    return statistics.median(timings), None
+
+def report(label, elapsed, error):
+    """Print a result row; returns 1 if the command failed or was over budget"""
+    failed = error is not None or elapsed >= STARTUP_BUDGET
+    print(f"{'❌' if failed else '✅'} {label:<38}{elapsed:>9.3f}s", end='')
+    return int(failed)
+
+def heavy_modules_loaded(module):
+    """Heavy packages present in sys.modules after importing module"""
+    probe = (
+        f"import sys; import {module}; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, '-c', probe], cwd=SCRIPT_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return 'import failed'
+    return result.stdout.strip() or '-'
+
+def main():
+    """Run the startup benchmark"""
+    parser = argparse.ArgumentParser(description='Measure startup time of the ML command-line tools')
+    parser.parse_args()
+
+    print("=" * 60)
+    print("ML Tooling Startup Benchmark")
+    print("=" * 60)
+
+    baseline, _ = time_command([sys.executable, '-c', 'pass'])
+    print(f"\nInterpreter baseline: {baseline:.3f}s (median of {REPEATS})")
+
+    failures = 0
+
+    print(f"\n{'command':<40}{'median':>10}")
+    for script in COMMANDS:
+        elapsed, error = time_command([sys.executable, script, '--help'])
+        failures += report(script + ' --help', elapsed, error)
+        print(f"  {error}" if error else '')
+
+    print(f"\n{'import':<40}{'median':>10}  heavy modules loaded")
+    for module in MODULES:
+        elapsed, error = time_command([sys.executable, '-c', f'import {module}'])
+        failures += report(module, elapsed, error)
+        print(f"  {error or heavy_modules_loaded(module)}")
+
+    print()
+    if failures:
+        print(f"❌ {failures} command(s) failed or over the {STARTUP_BUDGET:.1f}s startup budget")
+        sys.exit(1)
+    print(f"✅ All commands start within {STARTUP_BUDGET:.1f}s")
+
+if __name__ == '__main__':
+    main()
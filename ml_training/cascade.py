@@ -0,0 +1,250 @@
+"""
+Cascaded early-exit certificate verification
+Stage 1 runs the cheap heuristics from aiVerification.ts (content variance,
+basic ELA) and the small custom CNN from train_model.py; only images that
+fail a heuristic or fall below a confidence threshold calibrated on the
+validation split go on to the MobileNetV2 model from train_certificate_model.py
+"""
+
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from pathlib import Path
+
+from autotune import apply_profile, tuned_batch_size
+from streaming_eval import split_outputs
+from train_certificate_model import (
+    CLASS_NAMES, NUM_CLASSES, KERAS_MODEL_PATH, SPLIT_VAL, SPLIT_TEST, load_dataset_cache,
+    load_image, require_resize_model
+)
+
+# Configuration
+SMALL_MODEL_PATH = Path('checkpoints') / 'best_model.h5'  # Written by train_model.py
+CASCADE_CONFIG = Path('exported') / 'cascade.json'
+MIN_CONTENT_VARIANCE = 100.0   # Same threshold as checkImageIntegrity()
+MAX_ELA_VARIANCE = 5000.0      # Same threshold as performBasicELA()
+ELA_STEP = 14                  # performBasicELA() samples every 50px at ~800px; scaled to 224
+MAX_ACCURACY_DROP = 0.005      # Allowed validation accuracy loss versus the full model
+BATCH_SIZE = tuned_batch_size('inference', 64)
+
+def heuristic_features(images):
+    """Content variance and basic-ELA variance of (N, H, W, 3) images in [0, 1]"""
+    gray = np.asarray(images, dtype=np.float32).mean(axis=3) * 255.0
+    content_variance = gray.reshape(len(gray), -1).var(axis=1)
+
+    # 3x3 neighbourhood variance at sampled points, then variance across points
+    h, w = gray.shape[1:]
+    ys = np.arange(ELA_STEP, h - ELA_STEP, ELA_STEP)
+    xs = np.arange(ELA_STEP, w - ELA_STEP, ELA_STEP)
+    neighbourhood = np.stack([
+        gray[:, ys + dy][:, :, xs + dx] for dy in (-1, 0, 1) for dx in (-1, 0, 1)
+    ], axis=-1)
+    local_variance = neighbourhood.var(axis=-1).reshape(len(gray), -1)
+    ela_variance = local_variance.var(axis=1)
+
+    return content_variance, ela_variance
+
+def heuristics_pass(images):
+    """True where the cheap checks find nothing suspicious"""
+    content_variance, ela_variance = heuristic_features(images)
+    return (content_variance > MIN_CONTENT_VARIANCE) & (ela_variance < MAX_ELA_VARIANCE)
+
+def predict_batched(model, images):
+    """Model probabilities over images in BATCH_SIZE chunks"""
+    if len(images) == 0:
+        return np.zeros((0, NUM_CLASSES), dtype=np.float32)
+    return np.concatenate([
+        split_outputs(model(images[i:i + BATCH_SIZE], training=False))[0]
+        for i in range(0, len(images), BATCH_SIZE)
+    ])
+
+class StageStats:
+    """Images seen, early exits and wall time for one cascade stage"""
+
+    def __init__(self, name):
+        self.name = name
+        self.seen = 0
+        self.exits = 0
+        self.seconds = 0.0
+
+    def report(self):
+        exit_rate = self.exits / self.seen if self.seen else 0.0
+        latency = 1000 * self.seconds / self.seen if self.seen else 0.0
+        return f"   {self.name:<12} in: {self.seen:>6}  exits: {self.exits:>6} ({exit_rate:.1%})  {latency:.2f} ms/image"
+
+class Cascade:
+    """Two-stage verifier with a calibrated early-exit threshold"""
+
+    def __init__(self, small_model, full_model, threshold):
+        self.small_model = small_model
+        self.full_model = full_model
+        self.threshold = threshold
+        self.stages = [StageStats('cheap'), StageStats('full')]
+        self.flagged = 0
+
+    def predict(self, images):
+        """Probabilities and exit stage (0 = cheap, 1 = full) per image"""
+        cheap, full = self.stages
+
+        start = time.perf_counter()
+        passed = heuristics_pass(images)
+        probs = predict_batched(self.small_model, images)
+        exit_early = passed & (probs.max(axis=1) >= self.threshold)
+        cheap.seconds += time.perf_counter() - start
+        cheap.seen += len(images)
+        cheap.exits += int(exit_early.sum())
+        self.flagged += int((~passed).sum())
+
+        escalated = np.flatnonzero(~exit_early)
+        if len(escalated):
+            start = time.perf_counter()
+            probs[escalated] = predict_batched(self.full_model, images[escalated])
+            full.seconds += time.perf_counter() - start
+            full.seen += len(escalated)
+            full.exits += len(escalated)
+
+        return probs, np.where(exit_early, 0, 1)
+
+    def report(self):
+        print("\n⏱️ Cascade stages:")
+        for stage in self.stages:
+            print(stage.report())
+        print(f"   Heuristics flagged: {self.flagged} (always escalated)")
+
+def calibrate_threshold(small_probs, full_probs, passed, y_true):
+    """Lowest confidence threshold keeping cascade accuracy within MAX_ACCURACY_DROP"""
+    true_classes = np.argmax(y_true, axis=1)
+    small_correct = np.argmax(small_probs, axis=1) == true_classes
+    full_correct = np.argmax(full_probs, axis=1) == true_classes
+    full_acc = full_correct.mean()
+
+    confidence = small_probs.max(axis=1)
+    candidates = np.unique(np.quantile(confidence, np.linspace(0, 1, 201)))
+    for threshold in candidates:
+        exit_early = passed & (confidence >= threshold)
+        accuracy = np.where(exit_early, small_correct, full_correct).mean()
+        if accuracy >= full_acc - MAX_ACCURACY_DROP:
+            return float(threshold), float(accuracy), float(exit_early.mean()), float(full_acc)
+
+    # Nothing qualifies: never exit early
+    return float(np.nextafter(1.0, 2.0)), float(full_acc), 0.0, float(full_acc)
+
+def load_models():
+    """Load the small and full Keras models"""
+    require_resize_model('the cascade')
+    for path in (SMALL_MODEL_PATH, KERAS_MODEL_PATH):
+        if not path.exists():
+            raise ValueError(f"Model not found at {path}. Train both models first")
+
+    from tensorflow import keras
+
+    return keras.models.load_model(SMALL_MODEL_PATH), keras.models.load_model(KERAS_MODEL_PATH)
+
+def load_cascade():
+    """Models plus the calibrated threshold from CASCADE_CONFIG"""
+    require_resize_model('the cascade')
+    if not CASCADE_CONFIG.exists():
+        raise ValueError(f"No calibration at {CASCADE_CONFIG}. Run: python cascade.py calibrate")
+    with open(CASCADE_CONFIG) as f:
+        config = json.load(f)
+    small_model, full_model = load_models()
+    return Cascade(small_model, full_model, config['threshold'])
+
+def calibrate():
+    """Tune the early-exit threshold on the validation split"""
+    print("\n🎯 Calibrating cascade on validation split...")
+    require_resize_model('the cascade')
+    images, labels, splits = load_dataset_cache()
+    X_val, y_val = images[splits == SPLIT_VAL], labels[splits == SPLIT_VAL]
+
+    small_model, full_model = load_models()
+    threshold, accuracy, exit_rate, full_acc = calibrate_threshold(
+        predict_batched(small_model, X_val),
+        predict_batched(full_model, X_val),
+        heuristics_pass(X_val),
+        y_val
+    )
+
+    config = {
+        'threshold': threshold,
+        'validation_samples': int(len(X_val)),
+        'validation_exit_rate': exit_rate,
+        'validation_accuracy': accuracy,
+        'full_model_validation_accuracy': full_acc,
+        'max_accuracy_drop': MAX_ACCURACY_DROP,
+        'calibrated_date': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+    CASCADE_CONFIG.parent.mkdir(parents=True, exist_ok=True)
+    with open(CASCADE_CONFIG, 'w') as f:
+        json.dump(config, f, indent=2)
+
+    print(f"✅ Threshold: {threshold:.4f}")
+    print(f"   Early-exit rate: {exit_rate:.1%}")
+    print(f"   Accuracy: {accuracy:.2%} (full model: {full_acc:.2%})")
+    print(f"✅ Calibration saved to {CASCADE_CONFIG}")
+
+def evaluate():
+    """Compare the cascade with the full model on the test split"""
+    print("\n📈 Evaluating cascade on test split...")
+    require_resize_model('the cascade')
+    images, labels, splits = load_dataset_cache()
+    X_test, y_test = images[splits == SPLIT_TEST], labels[splits == SPLIT_TEST]
+
+    cascade = load_cascade()
+    probs, _ = cascade.predict(X_test)
+
+    start = time.perf_counter()
+    full_probs = predict_batched(cascade.full_model, X_test)
+    full_latency = 1000 * (time.perf_counter() - start) / max(len(X_test), 1)
+
+    true_classes = np.argmax(y_test, axis=1)
+    cascade_ms = 1000 * sum(stage.seconds for stage in cascade.stages) / max(len(X_test), 1)
+    print(f"\n📊 Accuracy: cascade {np.mean(np.argmax(probs, axis=1) == true_classes):.2%}, "
+          f"full model {np.mean(np.argmax(full_probs, axis=1) == true_classes):.2%}")
+    print(f"   Latency: cascade {cascade_ms:.2f} ms/image, full model {full_latency:.2f} ms/image")
+    cascade.report()
+
+def verify(image_paths):
+    """Run the cascade on individual certificate images, preprocessed as in training"""
+    cascade = load_cascade()
+    loaded = []
+    for path in image_paths:
+        try:
+            loaded.append((path, load_image(path)))
+        except Exception as e:
+            print(f"⚠️ Error loading {path}: {e}")
+    if not loaded:
+        return
+
+    probs, stages = cascade.predict(np.stack([img for _, img in loaded]).astype(np.float32))
+    for (path, _), p, stage in zip(loaded, probs, stages):
+        verdict = CLASS_NAMES[int(np.argmax(p))]
+        print(f"🖼️ {path.name}: {verdict} ({p.max():.2%}) via {cascade.stages[stage].name} stage")
+    cascade.report()
+
+def main():
+    """Cascade command-line entry point"""
+    parser = argparse.ArgumentParser(description='Cascaded early-exit certificate verification')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('calibrate', help='Tune the early-exit threshold on the validation split')
+    subparsers.add_parser('evaluate', help='Exit rates, latency and accuracy on the test split')
+    verify_parser = subparsers.add_parser('verify', help='Verify certificate images')
+    verify_parser.add_argument('images', nargs='+', type=Path)
+    args = parser.parse_args()
+    apply_profile('inference')
+
+    try:
+        if args.command == 'calibrate':
+            calibrate()
+        elif args.command == 'evaluate':
+            evaluate()
+        else:
+            verify(args.images)
+    except ValueError as e:
+        print(f"\n❌ Error: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+"""
+Dataset deduplication and near-duplicate grouping
+Computes 64-bit perceptual hashes (pHash) of loaded images, indexes them in a
+BK-tree for fast Hamming-distance lookups, drops exact duplicates and keeps
+near-duplicates together in the same train/validation/test split
+"""
+
+import hashlib
+import numpy as np
+
+# Configuration
+HASH_SIZE = 8                # 8x8 low-frequency DCT block -> 64-bit hash
+HASH_RESOLUTION = 32         # Images are reduced to 32x32 grayscale before the DCT
+HASH_CHUNK = 256             # Images hashed per chunk to bound temporary memory
+NEAR_DUPLICATE_DISTANCE = 6  # <= this many differing bits links two samples into one group
+
+# Split codes (train/val/test match SPLIT_TRAIN/SPLIT_VAL/SPLIT_TEST in the trainers)
+SPLIT_CODES = (0, 1, 2)
+UNASSIGNED = -1
+DUPLICATE = -2
+
+def _dct_matrix(n):
+    """Orthonormal DCT-II basis"""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+def phash_batch(images):
+    """Perceptual hashes for a batch of (N, H, W, 3) images in [0, 1]"""
+    if len(images) > HASH_CHUNK:
+        return np.concatenate([
+            phash_batch(images[i:i + HASH_CHUNK]) for i in range(0, len(images), HASH_CHUNK)
+        ])
+
+    images = np.asarray(images, dtype=np.float32)
+    gray = images @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+    # Area-downsample to HASH_RESOLUTION (crop so the size divides evenly)
+    n, h, w = gray.shape
+    fy, fx = h // HASH_RESOLUTION, w // HASH_RESOLUTION
+    gray = gray[:, :fy * HASH_RESOLUTION, :fx * HASH_RESOLUTION]
+    small = gray.reshape(n, HASH_RESOLUTION, fy, HASH_RESOLUTION, fx).mean(axis=(2, 4))
+
+    dct = _dct_matrix(HASH_RESOLUTION)
+    coeffs = dct @ small @ dct.T
+    low = coeffs[:, :HASH_SIZE, :HASH_SIZE].reshape(n, -1)
+    bits = low > np.median(low[:, 1:], axis=1, keepdims=True)
+
+    weights = np.left_shift(np.uint64(1), np.arange(HASH_SIZE * HASH_SIZE, dtype=np.uint64))
+    return np.bitwise_or.reduce(np.where(bits, weights, np.uint64(0)), axis=1)
+
+def hamming(a, b):
+    """Number of differing bits between two hashes"""
+    return bin(int(a) ^ int(b)).count('1')
+
+class BKTree:
+    """Burkhard-Keller tree over Hamming distance"""
+
+    def __init__(self):
+        self.root = None
+
+    def add(self, value, item):
+        node = self.root
+        if node is None:
+            self.root = (value, item, {})
+            return
+
+        while True:
+            distance = hamming(value, node[0])
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = (value, item, {})
+                return
+            node = child
+
+    def search(self, value, radius):
+        """Items whose hash is within radius of value"""
+        if self.root is None:
+            return []
+
+        results = []
+        stack = [self.root]
+        while stack:
+            node_value, item, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= radius:
+                results.append(item)
+            for child_distance, child in children.items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return results
+
+def content_digests(images):
+    """SHA-256 of each image's pixels, for exact-duplicate detection"""
+    return [hashlib.sha256(np.ascontiguousarray(image).tobytes()).hexdigest() for image in images]
+
+def find_duplicates(digests, labels):
+    """Mask of samples to keep: later same-class copies of identical content are dropped
+
+    Only exact copies are dropped; perceptually close samples are distinct
+    training data and are kept together by group_near_duplicates() instead.
+    """
+    seen = set()
+    keep = np.ones(len(digests), dtype=bool)
+    for i, key in enumerate(zip(digests, labels)):
+        if key in seen:
+            keep[i] = False
+        else:
+            seen.add(key)
+    return keep
+
+def group_near_duplicates(hashes):
+    """Group ids joining every pair within NEAR_DUPLICATE_DISTANCE (union-find)
+
+    Groups are the connected clusters, whatever their size: every render
+    of one template lands in one group and so in one split.
+    """
+    parent = np.arange(len(hashes))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    tree = BKTree()
+    for i, value in enumerate(hashes):
+        for j in tree.search(value, NEAR_DUPLICATE_DISTANCE):
+            parent[find(i)] = find(j)
+        tree.add(value, i)
+
+    return np.array([find(i) for i in range(len(hashes))])
+
+def split_by_group(labels, groups, val_test_size=0.3, seed=42, require_holdout=True):
+    """Train/val/test index arrays for one-hot labels, never separating a group
+
+    Groups are assigned to their majority class and shuffled; each class
+    fills half of val_test_size with whole groups for validation and half
+    for test, always at least one group each, and keeps at least one for
+    training. A class with only two groups gets no validation group (with
+    a warning); a single group raises ValueError, as it cannot be both
+    trained on and tested honestly. With require_holdout False (a small
+    incremental batch whose classes are already held out), classes with
+    fewer than three groups go wholly to training.
+    """
+    classes = np.argmax(labels, axis=1)
+    rng = np.random.default_rng(seed)
+    group_ids, inverse = np.unique(groups, return_inverse=True)
+    group_sizes = np.bincount(inverse)
+    class_counts = np.zeros((len(group_ids), labels.shape[1]), dtype=np.int64)
+    np.add.at(class_counts, (inverse, classes), 1)
+    majority = class_counts.argmax(axis=1)
+
+    group_codes = np.zeros(len(group_ids), dtype=np.int8)
+    for c in np.unique(classes):
+        class_groups = list(rng.permutation(np.flatnonzero(majority == c)))
+        holdout_codes = SPLIT_CODES[2:0:-1]  # Test, then validation
+        if len(class_groups) < 3:
+            if not require_holdout:
+                continue
+            if len(class_groups) < 2:
+                raise ValueError(
+                    f"Class {c} has {len(class_groups)} independent image group(s): its images are all "
+                    f"near-duplicates (e.g. renders of one template), so none can be held out without "
+                    f"leaking into the test split. Add images of at least one more distinct certificate"
+                )
+            print(f"⚠️ Class {c} has only 2 independent image groups: one is held out for test, none for validation")
+            holdout_codes = holdout_codes[:1]
+        target = val_test_size / 2 * np.sum(classes == c)
+        for k, code in enumerate(holdout_codes):
+            taken = 0
+            # Leave a group for each split still to be filled (later holdouts and training)
+            while len(class_groups) > len(holdout_codes) - k and (taken == 0 or taken < target):
+                g = class_groups.pop()
+                group_codes[g] = code
+                taken += group_sizes[g]
+
+    codes = group_codes[inverse]
+    return tuple(np.flatnonzero(codes == code) for code in SPLIT_CODES)
+
+def assign_new_splits(hashes, digests, labels, splits, val_test_size=0.3, seed=42, sources=None,
+                      require_holdout=True):
+    """Extend a saved split to new samples without moving existing ones
+
+    splits holds 0/1/2 for assigned samples, DUPLICATE for dropped ones and
+    UNASSIGNED for new ones; digests are content hashes (file SHA-256 or
+    content_digests()). New exact copies of kept samples become DUPLICATE,
+    new near-duplicates inherit their group's split, and wholly new groups
+    are split by split_by_group(). With sources (e.g. the source image of
+    each tile), new samples sharing a source move as one unit: it inherits
+    the split of any of its samples' groups, or is split whole. Raises
+    ValueError if a class ends up without test samples, unless
+    require_holdout is False (splits is only part of the dataset and the
+    caller checks the whole). Returns the updated split codes.
+    """
+    splits = np.array(splits, dtype=np.int8)
+    classes = np.argmax(labels, axis=1)
+    new = np.flatnonzero(splits == UNASSIGNED)
+    if len(new) == 0:
+        return splits
+
+    # Drop new samples that are exact copies of a kept sample of the same class
+    order = np.concatenate([np.flatnonzero(splits >= 0), new])
+    keep = find_duplicates(np.asarray(digests, dtype=object)[order], classes[order])
+    dropped = order[~keep]
+    splits[dropped[splits[dropped] == UNASSIGNED]] = DUPLICATE  # Assigned samples never move
+
+    kept = np.flatnonzero(splits != DUPLICATE)
+    groups = group_near_duplicates(hashes[kept])
+    units = groups if sources is None else np.asarray(sources)[kept]
+    group_split_code = {}
+    for g, code in zip(groups, splits[kept]):
+        if code >= 0:
+            group_split_code.setdefault(g, code)
+    unit_split_code = {}
+    for g, unit, code in zip(groups, units, splits[kept]):
+        if code == UNASSIGNED and g in group_split_code:
+            unit_split_code.setdefault(unit, group_split_code[g])
+
+    fresh = []
+    for pos, (unit, code) in enumerate(zip(units, splits[kept])):
+        if code == UNASSIGNED:
+            if unit in unit_split_code:
+                splits[kept[pos]] = unit_split_code[unit]
+            else:
+                fresh.append(pos)
+
+    if fresh:
+        fresh = np.array(fresh)
+        fresh_splits = split_by_group(labels[kept[fresh]], units[fresh], val_test_size, seed, require_holdout=False)
+        for code, idx in zip(SPLIT_CODES, fresh_splits):
+            splits[kept[fresh[idx]]] = code
+
+    for c in np.unique(classes[kept]) if require_holdout else ():
+        in_class = splits[kept][classes[kept] == c]
+        if not np.any(in_class == SPLIT_CODES[2]):
+            raise ValueError(
+                f"Class {c} has no test samples; at least 2 independent image groups are needed. "
+                f"Add more distinct images of this class"
+            )
+    return splits
@@ -0,0 +1,57 @@
+"""
+Certificate feature scores
+numpy ports of extractFeatures() in src/lib/mlModel.ts, as regression targets
+for the multi-task model so one forward pass can replace them. layoutScore
+and the compressionArtifacts scale depend only on the image dimensions, so
+the browser derives those from the image instead of the model
+"""
+
+import numpy as np
+
+TARGET_NAMES = ['edgeStrength', 'textQuality', 'artifactRate']  # Feature-head outputs, all in [0, 1]
+NUM_TARGETS = len(TARGET_NAMES)
+
+EDGE_THRESHOLD = 50
+EDGE_MAX = 4 * np.sqrt(2)   # Largest edgeConsistency: Sobel magnitude of a 0/255 step (1020 * sqrt(2)) over 255
+ARTIFACT_BLOCK = 8
+ARTIFACT_SATURATION = 1000  # compressionArtifacts = min(1, jumps / ARTIFACT_SATURATION)
+
+def edge_consistency(red):
+    """Mean Sobel magnitude of strong edges on the red channel over 255 (0 to EDGE_MAX)"""
+    red = red.astype(np.float32)
+    tl, tc, tr = red[:-2, :-2], red[:-2, 1:-1], red[:-2, 2:]
+    ml, mr = red[1:-1, :-2], red[1:-1, 2:]
+    bl, bc, br = red[2:, :-2], red[2:, 1:-1], red[2:, 2:]
+    gx = -tl + tr - 2 * ml + 2 * mr - bl + br
+    gy = -tl - 2 * tc - tr + bl + 2 * bc + br
+    strength = np.sqrt(gx * gx + gy * gy)
+    edges = strength[strength > EDGE_THRESHOLD]
+    return float(edges.mean() / 255) if len(edges) else 0.0
+
+def text_quality(rgb):
+    """Share of high-contrast pixels (gray < 50 or > 200)"""
+    gray = rgb.astype(np.float32).mean(axis=2)
+    return float(np.mean((gray < 50) | (gray > 200)))
+
+def artifact_rate(red):
+    """Share of sampled red-channel pixel pairs ARTIFACT_BLOCK apart that jump by more than 20
+
+    compressionArtifacts is this rate times the number of sampled pairs
+    ((width * height - 1) // ARTIFACT_BLOCK) over ARTIFACT_SATURATION,
+    capped at 1; the rate itself does not saturate on large images.
+    """
+    flat = red.reshape(-1).astype(np.int16)
+    a = flat[::ARTIFACT_BLOCK]
+    b = flat[ARTIFACT_BLOCK::ARTIFACT_BLOCK]
+    if len(b) == 0:
+        return 0.0
+    return float(np.mean(np.abs(a[:len(b)] - b) > 20))
+
+def extract_targets(rgb):
+    """Feature-head targets (TARGET_NAMES) for a full-resolution (H, W, 3) uint8 image"""
+    red = rgb[:, :, 0]
+    return np.array([
+        edge_consistency(red) / EDGE_MAX,
+        text_quality(rgb),
+        artifact_rate(red)
+    ], dtype=np.float32)
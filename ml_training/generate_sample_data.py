@@ -4,8 +4,8 @@ Creates synthetic certificate images for each category
 """
 
 import os
+import argparse
 from pathlib import Path
-from PIL import Image, ImageDraw, ImageFont
 import random
 
 # Configuration
@@ -24,6 +24,8 @@ def create_directories():
 
 def generate_certificate_image(text, quality='high', add_noise=False, add_artifacts=False):
     """Generate a synthetic certificate image"""
+    from PIL import Image, ImageDraw, ImageFont
+    
     # Create image
     img = Image.new('RGB', IMG_SIZE, color='white')
     draw = ImageDraw.Draw(img)
@@ -198,8 +200,17 @@ Date: January 15, 2024
     
     print(f"✅ Generated {count} screenshot certificates")
 
+def parse_args():
+    """Command-line options"""
+    parser = argparse.ArgumentParser(
+        description='Generate synthetic certificates for each class in training_data/'
+    )
+    return parser.parse_args()
+
 def main():
     """Generate all sample data"""
+    parse_args()
+    
     print("=" * 60)
     print("Generating Sample Training Data")
     print("=" * 60)
@@ -0,0 +1,197 @@
+"""
+Certificate Forgery Detection - Incremental Retraining
+Warm-start the last exported model on newly labeled certificates plus a
+replay buffer from the cached dataset, gated by evaluate_model() before export
+"""
+
+import shutil
+import hashlib
+import argparse
+import numpy as np
+from pathlib import Path
+
+from autotune import apply_profile
+from dedupe import UNASSIGNED, DUPLICATE, phash_batch, content_digests, assign_new_splits
+from train_certificate_model import (
+    BATCH_SIZE, LEARNING_RATE, CLASS_NAMES, TRAIN_DIR, KERAS_MODEL_PATH,
+    SPLIT_TRAIN, SPLIT_TEST, setup_directories, load_dataset, load_dataset_cache,
+    save_dataset_cache, evaluate_model, save_model_for_tfjs, compile_options, is_multitask,
+    current_input_mode
+)
+
+# Configuration
+NEW_DATA_DIR = Path('new_data')
+REPLAY_RATIO = 3          # Replay samples drawn per new sample
+MAX_STEPS = 200           # Upper bound on optimizer steps per update
+NEW_TEST_FRACTION = 0.15  # Share of new samples held out for the gate (as many again for validation)
+MAX_ACCURACY_DROP = 0.01  # Reject updates that lose more test accuracy than this
+INCREMENTAL_LR = LEARNING_RATE / 10
+
+def load_base_model():
+    """Load the last exported Keras model and recompile for warm-starting"""
+    from tensorflow import keras
+
+    if not KERAS_MODEL_PATH.exists():
+        raise ValueError(f"No exported model at {KERAS_MODEL_PATH}. Run train_certificate_model.py first")
+
+    print(f"\n📦 Loading base model from {KERAS_MODEL_PATH}...")
+    model = keras.models.load_model(KERAS_MODEL_PATH)
+    model.compile(**compile_options(model, INCREMENTAL_LR))
+    return model
+
+def split_new_samples(images, labels, splits, new_images, new_labels, image_ids=None):
+    """Split codes for new samples, grouped with the cached dataset (see dedupe.assign_new_splits)
+
+    New near-duplicates of cached samples inherit their split, exact copies
+    become DUPLICATE, and the rest are split by group. image_ids (tiled
+    mode) keep every tile of a source image in one split.
+    """
+    num_old = len(images)
+    all_splits = np.concatenate([splits.astype(np.int8), np.full(len(new_images), UNASSIGNED, dtype=np.int8)])
+    sources = None
+    if image_ids is not None:
+        sources = np.concatenate([np.full(num_old, -1), image_ids])
+    all_splits = assign_new_splits(
+        np.concatenate([phash_batch(images), phash_batch(new_images)]),
+        content_digests(images) + content_digests(new_images),
+        np.concatenate([labels, new_labels]),
+        all_splits,
+        val_test_size=2 * NEW_TEST_FRACTION,
+        sources=sources
+    )
+    new_splits = all_splits[num_old:]
+    print(f"\n🔍 New samples: {int(np.sum(new_splits == SPLIT_TRAIN))} train, "
+          f"{int(np.sum(new_splits == SPLIT_TEST))} gate test, {int(np.sum(new_splits == DUPLICATE))} duplicates")
+    return new_splits
+
+def build_replay_dataset(X_new, y_new, X_hist, y_hist, rng, f_new=None, f_hist=None):
+    """Mix new samples with a replay buffer sampled from historical train data
+
+    f_new/f_hist are feature-score targets, given for multi-task models.
+    """
+    import tensorflow as tf
+
+    replay_size = min(len(X_hist), REPLAY_RATIO * len(X_new))
+    replay_idx = rng.choice(len(X_hist), size=replay_size, replace=False)
+
+    X = np.concatenate([X_new, X_hist[replay_idx]])
+    y = np.concatenate([y_new, y_hist[replay_idx]])
+    if f_new is not None:
+        y = (y, np.concatenate([f_new, f_hist[replay_idx]]))
+
+    print(f"   New samples: {len(X_new)}")
+    print(f"   Replay samples: {replay_size}")
+
+    dataset = tf.data.Dataset.from_tensor_slices((X, y))
+    dataset = dataset.shuffle(len(X), seed=42).repeat().batch(BATCH_SIZE)
+    return dataset.prefetch(tf.data.AUTOTUNE), len(X)
+
+def archive_new_samples():
+    """Move accepted samples into training_data/ so full retrains include them
+
+    Files are named {sha256[:16]}_{name}, as ingest_storage.save_original()
+    does, so a new sample never replaces a same-named training image (names
+    that already carry their hash, e.g. from active_learning.py, are kept).
+    """
+    for class_name in CLASS_NAMES:
+        for img_path in (NEW_DATA_DIR / class_name).glob('*'):
+            if img_path.is_file():
+                prefix = hashlib.sha256(img_path.read_bytes()).hexdigest()[:16] + '_'
+                name = img_path.name if img_path.name.startswith(prefix) else prefix + img_path.name
+                shutil.move(str(img_path), str(TRAIN_DIR / class_name / name))
+    print(f"✅ New samples moved to {TRAIN_DIR}")
+
+def parse_args():
+    """Command-line options"""
+    parser = argparse.ArgumentParser(
+        description=f'Warm-start the exported model on {NEW_DATA_DIR}/<class>/ with replay and an evaluation gate'
+    )
+    return parser.parse_args()
+
+def main():
+    """Incremental retraining pipeline"""
+    parse_args()
+    apply_profile('training')
+
+    print("=" * 60)
+    print("Certificate Forgery Detection - Incremental Retraining")
+    print("=" * 60)
+
+    setup_directories()
+    for class_name in CLASS_NAMES:
+        (NEW_DATA_DIR / class_name).mkdir(parents=True, exist_ok=True)
+
+    rng = np.random.default_rng(42)
+
+    input_mode = current_input_mode()
+
+    features = new_features = image_ids = None
+    try:
+        model = load_base_model()
+        multitask = is_multitask(model)
+        if multitask:
+            images, labels, splits, features = load_dataset_cache(with_features=True)
+            new_images, new_labels, new_features = load_dataset(NEW_DATA_DIR, with_features=True)
+        else:
+            images, labels, splits = load_dataset_cache()
+            if input_mode == 'tiled':
+                from tiling import load_tiled_dataset
+                new_images, new_labels, image_ids = load_tiled_dataset(NEW_DATA_DIR, CLASS_NAMES)
+            else:
+                new_images, new_labels = load_dataset(NEW_DATA_DIR)
+        new_splits = split_new_samples(images, labels, splits, new_images, new_labels, image_ids)
+    except ValueError as e:
+        print(f"\n❌ Error: {e}")
+        print(f"\n📝 Add newly labeled images to {NEW_DATA_DIR}/<class>/ and run again")
+        return
+
+    new_train = new_splits == SPLIT_TRAIN
+    new_test = new_splits == SPLIT_TEST
+
+    # Gate on the historical test split plus held-out new samples
+    X_test = np.concatenate([images[splits == SPLIT_TEST], new_images[new_test]])
+    y_test = np.concatenate([labels[splits == SPLIT_TEST], new_labels[new_test]])
+    f_test = None
+    if multitask:
+        f_test = np.concatenate([features[splits == SPLIT_TEST], new_features[new_test]])
+
+    print("\n📏 Baseline (current export):")
+    baseline_acc = evaluate_model(model, X_test, y_test, f_test)['accuracy']
+
+    print("\n🚀 Warm-starting on new samples...")
+    dataset, num_samples = build_replay_dataset(
+        new_images[new_train], new_labels[new_train],
+        images[splits == SPLIT_TRAIN], labels[splits == SPLIT_TRAIN], rng,
+        f_new=new_features[new_train] if multitask else None,
+        f_hist=features[splits == SPLIT_TRAIN] if multitask else None
+    )
+    steps = min(MAX_STEPS, int(np.ceil(num_samples / BATCH_SIZE)))
+    print(f"   Steps: {steps}")
+    model.fit(dataset, epochs=1, steps_per_epoch=steps, verbose=1)
+
+    print("\n📏 Candidate (updated model):")
+    candidate_acc = evaluate_model(model, X_test, y_test, f_test)['accuracy']
+
+    print(f"\n📊 Test accuracy: {baseline_acc:.2%} -> {candidate_acc:.2%}")
+
+    if candidate_acc < baseline_acc - MAX_ACCURACY_DROP:
+        print(f"❌ Update rejected: accuracy dropped more than {MAX_ACCURACY_DROP:.0%}")
+        print(f"   Keeping the current export; new samples left in {NEW_DATA_DIR}")
+        return
+
+    save_model_for_tfjs(model, input_mode)
+    new_kept = new_splits != DUPLICATE
+    save_dataset_cache(
+        np.concatenate([images, new_images[new_kept]]),
+        np.concatenate([labels, new_labels[new_kept]]),
+        np.concatenate([splits, new_splits[new_kept]]),
+        np.concatenate([features, new_features[new_kept]]) if multitask else None
+    )
+    archive_new_samples()
+
+    print("\n" + "=" * 60)
+    print("✅ Incremental update exported!")
+    print("=" * 60)
+
+if __name__ == '__main__':
+    main()
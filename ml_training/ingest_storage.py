@@ -0,0 +1,390 @@
+"""
+Bulk ingestion of labeled certificates from Supabase Storage
+Downloads images from the `certificates` bucket (see UploadCertificate.tsx)
+with a pooled asyncio HTTP client and writes them straight into the
+preprocessed dataset cache, split with the cache's near-duplicate groups; the originals are kept under training_data/<class>/
+so full retrains (manifest, dedupe, splits) include them, and a manifest makes
+interrupted runs resumable
+"""
+
+import io
+import os
+import sys
+import csv
+import json
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+import numpy as np
+from pathlib import Path
+
+from dedupe import (
+    HASH_CHUNK, NEAR_DUPLICATE_DISTANCE, UNASSIGNED, DUPLICATE, BKTree, phash_batch, content_digests,
+    assign_new_splits
+)
+from train_certificate_model import (
+    CLASS_NAMES, NUM_CLASSES, IMG_SIZE, CACHE_DIR, TRAIN_DIR, SPLIT_TEST, cache_parts, append_dataset_cache
+)
+
+# Configuration
+STORAGE_BUCKET = 'certificates'
+LABEL_PREFIX = 'training'       # Labeled objects live under <prefix>/<class>/
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+CONCURRENCY = 16                # Download workers (also the connection pool size)
+MAX_RETRIES = 4
+RETRY_BASE_DELAY = 0.5          # Seconds; doubles per attempt, with jitter
+REQUEST_TIMEOUT = 60
+LIST_PAGE_SIZE = 1000
+FLUSH_EVERY = 256               # Samples buffered per cache shard (and manifest write)
+VAL_FRACTION = 0.15
+TEST_FRACTION = 0.15
+MANIFEST_PATH = CACHE_DIR / 'ingest_manifest.jsonl'
+
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+class IngestStats:
+    """Byte and file counters for the throughput report"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.bytes = 0
+        self.files = 0
+        self.skipped = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.retries = 0
+
+    def report(self):
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        print("\n📊 Ingestion summary:")
+        print(f"   Downloaded: {self.files} files, {self.bytes / 1e6:.1f} MB in {elapsed:.1f}s")
+        print(f"   Throughput: {self.bytes / 1e6 / elapsed:.2f} MB/s, {self.files / elapsed:.1f} files/s")
+        print(f"   Resumed (already in manifest): {self.skipped}")
+        print(f"   Duplicate content skipped: {self.duplicates}")
+        print(f"   Retries: {self.retries}, failed: {self.failed}")
+
+def load_manifest(path=MANIFEST_PATH):
+    """Object paths and content hashes already in the dataset cache"""
+    done, hashes = set(), set()
+    if path.exists():
+        with open(path) as f:
+            for line in f:
+                entry = json.loads(line)
+                done.add(entry['path'])
+                if not entry.get('duplicate'):
+                    hashes.add(entry['sha256'])
+    return done, hashes
+
+class SplitIndex:
+    """pHashes and content digests of the cached samples, for splitting new ones
+
+    Each batch goes through dedupe.assign_new_splits() with only the cached
+    samples it can touch (within NEAR_DUPLICATE_DISTANCE of a new hash, or
+    with the same content), so new near-duplicates inherit their group's
+    split and a flush does not regroup the whole cache.
+    """
+
+    def __init__(self):
+        self.tree = BKTree()
+        self.hashes, self.digests, self.classes, self.splits = [], [], [], []
+        self.by_digest = {}
+
+    @classmethod
+    def from_cache(cls):
+        """Index every kept sample in the dataset cache (full cache and shards)"""
+        index = cls()
+        for part in cache_parts():
+            with np.load(part) as cache:
+                images, classes, splits = cache['images'], cache['labels'], cache['splits']
+            for i in range(0, len(images), HASH_CHUNK):
+                chunk = images[i:i + HASH_CHUNK].astype(np.float32) / 255.0  # As load_dataset_cache()
+                index.add(phash_batch(chunk), content_digests(chunk),
+                          classes[i:i + HASH_CHUNK], splits[i:i + HASH_CHUNK])
+        return index
+
+    def add(self, hashes, digests, classes, splits):
+        for value, digest, class_idx, split in zip(hashes, digests, classes, splits):
+            if split < 0:
+                continue
+            i = len(self.hashes)
+            self.hashes.append(value)
+            self.digests.append(digest)
+            self.classes.append(int(class_idx))
+            self.splits.append(int(split))
+            self.tree.add(value, i)
+            self.by_digest.setdefault(digest, []).append(i)
+
+    def assign(self, images, classes):
+        """Split codes for new samples; exact copies of cached ones come back DUPLICATE"""
+        hashes, digests = phash_batch(images), content_digests(images)
+        near = sorted({
+            i for value, digest in zip(hashes, digests)
+            for i in self.tree.search(value, NEAR_DUPLICATE_DISTANCE) + self.by_digest.get(digest, [])
+        })
+        all_classes = np.array([self.classes[i] for i in near] + list(classes), dtype=np.int64)
+        splits = assign_new_splits(
+            np.concatenate([np.array([self.hashes[i] for i in near], dtype=np.uint64), hashes]),
+            [self.digests[i] for i in near] + digests,
+            np.eye(NUM_CLASSES, dtype=np.float32)[all_classes],
+            np.array([self.splits[i] for i in near] + [UNASSIGNED] * len(images), dtype=np.int8),
+            val_test_size=VAL_FRACTION + TEST_FRACTION,
+            require_holdout=False
+        )[len(near):]
+        self.add(hashes, digests, classes, splits)
+        return splits
+
+    def classes_without_test(self):
+        """Classes with cached samples but none in the test split"""
+        tested = {c for c, split in zip(self.classes, self.splits) if split == SPLIT_TEST}
+        return sorted(set(self.classes) - tested)
+
+def save_original(path, class_idx, sha256, data, data_dir=TRAIN_DIR):
+    """Write the downloaded bytes to data_dir/<class>/, named by content so re-downloads overwrite"""
+    class_dir = Path(data_dir) / CLASS_NAMES[class_idx]
+    class_dir.mkdir(parents=True, exist_ok=True)
+    target = class_dir / f'{sha256[:16]}_{Path(path).name}'
+    tmp_path = target.with_name(target.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, target)
+    return target
+
+def preprocess(data):
+    """Decode to the cached format: IMG_SIZE RGB in [0, 1] plus feature scores"""
+    from PIL import Image
+    from features import extract_targets
+
+    img = Image.open(io.BytesIO(data)).convert('RGB')
+    scores = extract_targets(np.asarray(img))
+    img = img.resize((IMG_SIZE, IMG_SIZE), Image.NEAREST)  # Same as load_img(target_size=...)
+    return np.asarray(img, dtype=np.float32) / 255.0, scores
+
+class StorageClient:
+    """Supabase Storage REST calls over one pooled aiohttp session"""
+
+    def __init__(self, session, base_url, key, bucket, stats):
+        self.session = session
+        self.base_url = base_url.rstrip('/') + '/storage/v1'
+        self.headers = {'apikey': key, 'Authorization': f'Bearer {key}'} if key else {}
+        self.bucket = bucket
+        self.stats = stats
+
+    async def _request(self, method, url, **kwargs):
+        """Response body with retries on connection errors and retryable statuses"""
+        import aiohttp
+
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                async with self.session.request(method, url, headers=self.headers, **kwargs) as response:
+                    if response.status not in RETRY_STATUSES:
+                        response.raise_for_status()
+                        return await response.read()
+                    error = aiohttp.ClientResponseError(
+                        response.request_info, response.history, status=response.status
+                    )
+            except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+                error = e
+
+            if attempt == MAX_RETRIES:
+                raise error
+            self.stats.retries += 1
+            await asyncio.sleep(RETRY_BASE_DELAY * 2 ** attempt * (0.5 + random.random()))
+
+    async def list_files(self, prefix):
+        """Every object directly under prefix (paginated)"""
+        objects, offset = [], 0
+        while True:
+            body = await self._request(
+                'POST', f'{self.base_url}/object/list/{self.bucket}',
+                json={'prefix': prefix, 'limit': LIST_PAGE_SIZE, 'offset': offset,
+                      'sortBy': {'column': 'name', 'order': 'asc'}}
+            )
+            page = json.loads(body)
+            # Folders come back with a null id
+            objects += [f"{prefix}/{item['name']}" for item in page if item.get('id') is not None]
+            if len(page) < LIST_PAGE_SIZE:
+                return objects
+            offset += LIST_PAGE_SIZE
+
+    async def download(self, path):
+        return await self._request('GET', f'{self.base_url}/object/{self.bucket}/{path}')
+
+async def list_labeled(client, prefix, labels_csv=None):
+    """(object path, class index) pairs from a labels CSV or <prefix>/<class>/ folders"""
+    if labels_csv is not None:
+        with open(labels_csv, newline='') as f:
+            return [(row['path'], CLASS_NAMES.index(row['class'])) for row in csv.DictReader(f)]
+
+    listings = await asyncio.gather(*(
+        client.list_files(f'{prefix}/{class_name}') for class_name in CLASS_NAMES
+    ))
+    return [
+        (path, class_idx)
+        for class_idx, paths in enumerate(listings)
+        for path in paths if path.lower().endswith(IMAGE_EXTENSIONS)
+    ]
+
+class CacheWriter:
+    """Buffer decoded samples; flush each batch to a dataset cache shard, then to the manifest
+
+    Flushes run in the default executor, one at a time, so downloads keep
+    going while a batch is split (see SplitIndex) and its shard written.
+    """
+
+    def __init__(self, manifest_path, hashes, index):
+        self.manifest_path = manifest_path
+        self.hashes = hashes
+        self.index = index
+        self.samples = []
+        self.entries = []
+        self.lock = asyncio.Lock()
+
+    async def add(self, path, class_idx, sha256, size, image, scores):
+        entry = {'path': path, 'class': CLASS_NAMES[class_idx], 'sha256': sha256, 'size': size}
+        self.samples.append((image, class_idx, scores, entry))
+        self.entries.append(entry)
+        if len(self.samples) >= FLUSH_EVERY:
+            await self.flush()
+
+    def add_duplicate(self, path, class_idx, sha256, size):
+        """Record a path whose content is already cached so resumes skip it"""
+        self.entries.append({
+            'path': path, 'class': CLASS_NAMES[class_idx], 'sha256': sha256,
+            'size': size, 'duplicate': True
+        })
+
+    async def flush(self):
+        samples, entries = self.samples, self.entries
+        self.samples, self.entries = [], []
+        async with self.lock:
+            await asyncio.get_running_loop().run_in_executor(None, self._write, samples, entries)
+
+    def _write(self, samples, entries):
+        if samples:
+            images, labels, scores, sample_entries = zip(*samples)
+            images, labels = np.stack(images), np.array(labels)
+            splits = self.index.assign(images, labels)
+            for entry, split in zip(sample_entries, splits):
+                if split == DUPLICATE:
+                    entry['duplicate'] = True  # Same pixels as a cached sample
+                else:
+                    entry['split'] = int(split)
+            keep = splits != DUPLICATE
+            if np.any(keep):
+                append_dataset_cache(
+                    images[keep], np.eye(NUM_CLASSES, dtype=np.float32)[labels[keep]],
+                    splits[keep], np.stack(scores)[keep]
+                )
+        # Manifest only after the cache holds the samples, so a crash re-downloads them
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.manifest_path, 'a') as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + '\n')
+
+async def ingest(base_url, key, bucket=STORAGE_BUCKET, prefix=LABEL_PREFIX, labels_csv=None,
+                 concurrency=CONCURRENCY, manifest_path=MANIFEST_PATH):
+    """Download every labeled object not yet in the manifest into the dataset cache"""
+    import aiohttp
+
+    stats = IngestStats()
+    done, hashes = load_manifest(manifest_path)
+    writer = CacheWriter(manifest_path, hashes, SplitIndex.from_cache())
+    loop = asyncio.get_running_loop()
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        client = StorageClient(session, base_url, key, bucket, stats)
+        labeled = await list_labeled(client, prefix, labels_csv)
+        pending = [(path, class_idx) for path, class_idx in labeled if path not in done]
+        stats.skipped = len(labeled) - len(pending)
+        print(f"\n📥 {len(labeled)} labeled objects, {len(pending)} to download")
+
+        async def fetch(path, class_idx):
+            try:
+                data = await client.download(path)
+            except Exception as e:
+                stats.failed += 1
+                print(f"  ⚠️ {path}: {e}")
+                return
+            stats.bytes += len(data)
+            stats.files += 1
+
+            sha256 = hashlib.sha256(data).hexdigest()
+            if sha256 in writer.hashes:
+                stats.duplicates += 1
+                writer.add_duplicate(path, class_idx, sha256, len(data))
+                return
+            try:
+                # Decoding is CPU-bound; keep it off the event loop
+                image, scores = await loop.run_in_executor(None, preprocess, data)
+            except Exception as e:
+                stats.failed += 1
+                print(f"  ⚠️ {path}: cannot decode ({e})")
+                return
+            if sha256 not in writer.hashes:  # Re-check: another task may have won the race
+                writer.hashes.add(sha256)
+                # Saved before the manifest entry, so a full retrain always finds what was ingested
+                await loop.run_in_executor(None, save_original, path, class_idx, sha256, data)
+                await writer.add(path, class_idx, sha256, len(data), image, scores)
+            else:
+                stats.duplicates += 1
+                writer.add_duplicate(path, class_idx, sha256, len(data))
+
+        # A fixed pool of workers takes objects one at a time and keeps each
+        # until it is saved, so at most `concurrency` downloads are in memory
+        remaining = iter(pending)
+
+        async def worker():
+            for path, class_idx in remaining:
+                await fetch(path, class_idx)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    await writer.flush()
+    stats.report()
+    missing = writer.index.classes_without_test()
+    if missing:
+        print(f"⚠️ No test samples yet for: {', '.join(CLASS_NAMES[c] for c in missing)}. "
+              f"Ingest more distinct images of these classes before evaluating")
+    return stats
+
+def parse_args():
+    """Command-line options"""
+    parser = argparse.ArgumentParser(
+        description='Download labeled certificates from Supabase Storage into the dataset cache'
+    )
+    parser.add_argument('--url', default=os.environ.get('SUPABASE_URL'),
+                        help='Project URL, or a local stand-in (default: $SUPABASE_URL)')
+    parser.add_argument('--key', default=os.environ.get('SUPABASE_SERVICE_KEY'),
+                        help='API key with read access to the bucket (default: $SUPABASE_SERVICE_KEY)')
+    parser.add_argument('--bucket', default=STORAGE_BUCKET)
+    parser.add_argument('--prefix', default=LABEL_PREFIX, help='Folder holding <class>/ subfolders')
+    parser.add_argument('--labels', type=Path, help='CSV with path,class columns instead of class folders')
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY)
+    return parser.parse_args()
+
+def main():
+    """Ingestion entry point"""
+    args = parse_args()
+
+    print("=" * 60)
+    print("Certificate Storage Ingestion")
+    print("=" * 60)
+
+    if not args.url:
+        print("\n❌ Error: no storage URL. Pass --url or set SUPABASE_URL")
+        sys.exit(1)
+
+    try:
+        asyncio.run(ingest(
+            args.url, args.key, args.bucket, args.prefix, args.labels, args.concurrency
+        ))
+    except ValueError as e:
+        print(f"\n❌ Error: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+"""
+Persistent dataset manifest
+One Parquet row per training image (path, class, size, mtime, content hash,
+perceptual hash, split), refreshed by an incremental parallel directory scan
+so loaders never glob and splits are reproduced instead of recomputed
+"""
+
+import os
+import time
+import hashlib
+import argparse
+import numpy as np
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from dedupe import UNASSIGNED, DUPLICATE, phash_batch, assign_new_splits
+
+# Configuration
+MANIFEST_NAME = 'manifest.parquet'  # Stored inside the data directory it indexes
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+SCAN_WORKERS = min(32, 4 * (os.cpu_count() or 1))
+STAT_CHUNK = 4096   # Directory entries stat()ed per worker task
+HASH_BLOCK = 1 << 20
+SPLIT_VERSION = 3   # Bump when dedupe's grouping or split rules change; older splits are reassigned
+
+COLUMNS = ['path', 'class', 'size', 'mtime_ns', 'sha256', 'phash', 'split']
+
+def manifest_path(data_dir):
+    return Path(data_dir) / MANIFEST_NAME
+
+def _schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ('path', pa.string()),       # Relative to the data directory
+        ('class', pa.string()),
+        ('size', pa.int64()),
+        ('mtime_ns', pa.int64()),
+        ('sha256', pa.string()),
+        ('phash', pa.uint64()),      # 0 until the image has been decoded once
+        ('split', pa.int8()),        # 0/1/2, UNASSIGNED or DUPLICATE
+    ])
+
+def read_manifest(data_dir, columns=None, filters=None):
+    """Manifest columns as numpy arrays, reading only the requested columns/rows
+
+    filters use pyarrow syntax, e.g. [('split', '=', 0)]. Returns None when
+    there is no manifest yet.
+    """
+    import pyarrow.parquet as pq
+
+    path = manifest_path(data_dir)
+    if not path.exists():
+        return None
+    table = pq.read_table(path, columns=columns, filters=filters)
+    # Copies, so callers can update split/phash in place
+    return {name: np.array(table.column(name).to_numpy()) for name in table.column_names}
+
+def split_version(data_dir):
+    """SPLIT_VERSION the manifest's splits were assigned under (None if unstamped or missing)"""
+    import pyarrow.parquet as pq
+
+    path = manifest_path(data_dir)
+    if not path.exists():
+        return None
+    metadata = pq.read_schema(path).metadata or {}
+    version = metadata.get(b'split_version')
+    return int(version) if version is not None else None
+
+def write_manifest(data_dir, rows):
+    """Atomically replace the manifest with rows (dict of column arrays), stamped with SPLIT_VERSION"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path = manifest_path(data_dir)
+    tmp_path = path.with_name(path.name + '.tmp')
+    schema = _schema().with_metadata({'split_version': str(SPLIT_VERSION)})
+    table = pa.Table.from_pydict({name: rows[name] for name in COLUMNS}, schema=schema)
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+
+def _stat_entries(entries):
+    """(name, size, mtime_ns) for a chunk of DirEntry objects"""
+    results = []
+    for entry in entries:
+        st = entry.stat()
+        results.append((entry.name, st.st_size, st.st_mtime_ns))
+    return results
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def scan(data_dir, class_names, pool):
+    """(relative path, class, size, mtime_ns) for every image under data_dir/<class>/"""
+    futures = []
+    for class_name in class_names:
+        class_dir = Path(data_dir) / class_name
+        if not class_dir.is_dir():
+            continue
+        with os.scandir(class_dir) as it:
+            entries = [e for e in it if e.is_file() and e.name.lower().endswith(IMAGE_EXTENSIONS)]
+        for i in range(0, len(entries), STAT_CHUNK):
+            futures.append((class_name, pool.submit(_stat_entries, entries[i:i + STAT_CHUNK])))
+
+    return [
+        (f'{class_name}/{name}', class_name, size, mtime_ns)
+        for class_name, future in futures
+        for name, size, mtime_ns in future.result()
+    ]
+
+def update_manifest(data_dir, class_names, resplit=False):
+    """Rescan data_dir and refresh the manifest; only new or changed files are hashed
+
+    Files whose size or mtime changed lose their split and pHash so they are
+    re-assigned on the next load, as do duplicates whose original is gone
+    (removed or changed). Every split is cleared when resplit is set or the
+    manifest predates SPLIT_VERSION. Returns the manifest columns.
+    """
+    start = time.perf_counter()
+    old = read_manifest(data_dir) or {name: np.array([]) for name in COLUMNS}
+    previous = {path: i for i, path in enumerate(old['path'])}
+    version = split_version(data_dir)
+    reset = len(previous) > 0 and (resplit or version != SPLIT_VERSION)
+    if reset:
+        reason = 'requested' if resplit else f'split version {version} -> {SPLIT_VERSION}'
+        print(f"⚠️ Reassigning all splits ({reason})")
+        old['split'][:] = UNASSIGNED
+
+    with ThreadPoolExecutor(SCAN_WORKERS) as pool:
+        listing = scan(data_dir, class_names, pool)
+
+        rows = {name: [] for name in COLUMNS}
+        to_hash = []
+        for path, class_name, size, mtime_ns in listing:
+            i = previous.get(path)
+            unchanged = (
+                i is not None and old['class'][i] == class_name
+                and old['size'][i] == size and old['mtime_ns'][i] == mtime_ns
+            )
+            rows['path'].append(path)
+            rows['class'].append(class_name)
+            rows['size'].append(size)
+            rows['mtime_ns'].append(mtime_ns)
+            rows['sha256'].append(old['sha256'][i] if unchanged else None)
+            rows['phash'].append(int(old['phash'][i]) if unchanged else 0)
+            rows['split'].append(int(old['split'][i]) if unchanged else UNASSIGNED)
+            if not unchanged:
+                to_hash.append(len(rows['path']) - 1)
+
+        digests = pool.map(_file_sha256, [Path(data_dir) / rows['path'][i] for i in to_hash])
+        for i, digest in zip(to_hash, digests):
+            rows['sha256'][i] = digest
+
+    # A duplicate is dropped only while a same-class copy with its content is kept
+    originals = {
+        (digest, class_name)
+        for digest, class_name, split in zip(rows['sha256'], rows['class'], rows['split']) if split != DUPLICATE
+    }
+    orphaned = [
+        i for i, split in enumerate(rows['split'])
+        if split == DUPLICATE and (rows['sha256'][i], rows['class'][i]) not in originals
+    ]
+    for i in orphaned:
+        rows['split'][i] = UNASSIGNED
+
+    removed = len(set(previous) - {path for path, *_ in listing})
+    if to_hash or removed or reset or orphaned:
+        write_manifest(data_dir, rows)
+
+    print(f"🗂️ Manifest: {len(listing)} files ({len(to_hash)} new/changed, {removed} removed, "
+          f"{len(orphaned)} duplicates restored) in {time.perf_counter() - start:.2f}s")
+    dtypes = {'size': np.int64, 'mtime_ns': np.int64, 'phash': np.uint64, 'split': np.int8}
+    return {name: np.array(values, dtype=dtypes.get(name, object)) for name, values in rows.items()}
+
+def list_images(data_dir, class_names):
+    """(path, class index) for every image, minus known duplicates
+
+    The incremental scan only stats; the listing itself reads just the
+    path and class columns of the non-duplicate rows.
+    """
+    update_manifest(data_dir, class_names)
+    rows = read_manifest(data_dir, columns=['path', 'class'], filters=[('split', '!=', DUPLICATE)])
+    if rows is None:
+        return []
+    class_index = {name: i for i, name in enumerate(class_names)}
+    return [
+        (Path(data_dir) / path, class_index[class_name])
+        for path, class_name in zip(rows['path'], rows['class'])
+        if class_name in class_index
+    ]
+
+def assign_splits(data_dir, paths, images, labels):
+    """Split codes for loaded images, reusing saved assignments
+
+    Only images without a saved split are pHashed and assigned (see
+    dedupe.assign_new_splits); the result is written back to the manifest.
+    images is the loaded (N, H, W, 3) array, or a function returning the
+    images at given indices for loaders that keep another view (tiles).
+    """
+    rows = read_manifest(data_dir)
+    index = {path: i for i, path in enumerate(rows['path'])}
+    row_idx = np.array([index[Path(p).relative_to(data_dir).as_posix()] for p in paths])
+
+    splits = rows['split'][row_idx].astype(np.int8)
+    hashes = rows['phash'][row_idx].astype(np.uint64)
+    new = np.flatnonzero(splits == UNASSIGNED)
+    if len(new) == 0:
+        print(f"✅ Reusing saved splits for {len(paths)} images")
+        return splits
+
+    print(f"\n🔍 Assigning splits to {len(new)} new images...")
+    hashes[new] = phash_batch(images(new) if callable(images) else images[new])
+    splits = assign_new_splits(hashes, rows['sha256'][row_idx], labels, splits)
+    print(f"   Duplicates dropped: {int(np.sum(splits[new] == DUPLICATE))}")
+
+    rows['split'][row_idx] = splits
+    rows['phash'][row_idx] = hashes
+    write_manifest(data_dir, rows)
+    return splits
+
+def main():
+    """Refresh and summarize a data directory's manifest"""
+    from train_certificate_model import CLASS_NAMES, TRAIN_DIR
+
+    parser = argparse.ArgumentParser(description='Scan a training data directory into its Parquet manifest')
+    parser.add_argument('data_dir', type=Path, nargs='?', default=TRAIN_DIR)
+    parser.add_argument('--resplit', action='store_true',
+                        help='Clear every saved split so the next training run reassigns them')
+    args = parser.parse_args()
+
+    rows = update_manifest(args.data_dir, CLASS_NAMES, args.resplit)
+    print(f"\n📊 {manifest_path(args.data_dir)}")
+    for class_name in CLASS_NAMES:
+        in_class = rows['class'] == class_name
+        counts = [int(np.sum(in_class & (rows['split'] == code))) for code in (0, 1, 2, UNASSIGNED, DUPLICATE)]
+        print(f"   {class_name:<12} train {counts[0]:>6}  val {counts[1]:>6}  test {counts[2]:>6}  "
+              f"new {counts[3]:>6}  duplicate {counts[4]:>6}")
+
+if __name__ == '__main__':
+    main()
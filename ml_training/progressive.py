@@ -0,0 +1,172 @@
+"""
+Progressive-resizing training schedule
+Early epochs train at low resolution with larger batches, then step up to the
+final IMG_SIZE; weights carry over between per-size copies of the model
+"""
+
+import time
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+
+from sampling import ShuffledSequence, create_sampler
+
+# Configuration
+PROGRESSIVE_SCHEDULE = [  # (image size, share of epochs); last entry is the final size
+    (128, 0.3),
+    (160, 0.3),
+    (224, 0.4),
+]
+MAX_BATCH_SCALE = 4  # Upper bound on batch growth at low resolution
+RESIZE_CHUNK = 256
+
+def stage_plan(epochs, batch_size, learning_rate, final_size):
+    """(size, epochs, batch_size, learning_rate) per stage
+
+    Batch size grows with the pixel savings (capped at MAX_BATCH_SCALE) and
+    the learning rate follows with square-root scaling, the usual rule for Adam.
+    """
+    plan = []
+    remaining = epochs
+    for i, (size, share) in enumerate(PROGRESSIVE_SCHEDULE):
+        final = i == len(PROGRESSIVE_SCHEDULE) - 1
+        if final:
+            size = final_size
+        stage_epochs = remaining if final else max(1, round(epochs * share))
+        remaining -= stage_epochs
+
+        scale = min(MAX_BATCH_SCALE, (final_size / size) ** 2)
+        stage_batch = max(batch_size, int(batch_size * scale) // 8 * 8)
+        stage_lr = learning_rate * np.sqrt(stage_batch / batch_size)
+        plan.append((size, stage_epochs, stage_batch, float(stage_lr)))
+    return plan
+
+def resize_images(images, size):
+    """Resize an (N, H, W, 3) array to size x size in chunks"""
+    if images.shape[1] == size and images.shape[2] == size:
+        return images
+    return np.concatenate([
+        tf.image.resize(images[i:i + RESIZE_CHUNK], (size, size), antialias=True).numpy()
+        for i in range(0, len(images), RESIZE_CHUNK)
+    ])
+
+class ResizedSequence(keras.utils.Sequence):
+    """Re-emit another sequence's batches at a different image size"""
+
+    def __init__(self, sequence, size):
+        super().__init__()
+        self.sequence = sequence
+        self.size = size
+
+    def __len__(self):
+        return len(self.sequence)
+
+    def __getitem__(self, i):
+        X_batch, *rest = self.sequence[i]
+        X_batch = tf.image.resize(X_batch, (self.size, self.size), antialias=True).numpy()
+        return (X_batch, *rest)
+
+    def on_epoch_end(self):
+        self.sequence.on_epoch_end()
+
+class ElapsedTime(keras.callbacks.Callback):
+    """Log cumulative wall-clock seconds as 'elapsed' at the end of each epoch"""
+
+    def __init__(self):
+        super().__init__()
+        self.start = None
+
+    def on_train_begin(self, logs=None):
+        # Shared across progressive stages: keep counting from the first one
+        if self.start is None:
+            self.start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        if logs is not None:
+            logs['elapsed'] = time.perf_counter() - self.start
+
+def transfer_weights(source, target):
+    """Copy weights layer by layer into a model built for another input size
+
+    Only a Dense layer fed by Flatten has size-dependent weights; its kernel is
+    resampled over the spatial grid it was flattened from, scaled so the
+    summed activation keeps its magnitude.
+    """
+    for i, (src, dst) in enumerate(zip(source.layers, target.layers)):
+        weights = src.get_weights()
+        if all(w.shape == t.shape for w, t in zip(weights, dst.get_weights())):
+            dst.set_weights(weights)
+            continue
+
+        kernel, bias = weights
+        _, h, w, channels = source.layers[i - 1].input_shape
+        _, new_h, new_w, _ = target.layers[i - 1].input_shape
+        units = kernel.shape[1]
+        grid = kernel.reshape(h, w, channels * units)
+        grid = tf.image.resize(grid, (new_h, new_w)).numpy() * (h * w) / (new_h * new_w)
+        dst.set_weights([grid.reshape(new_h * new_w * channels, units), bias])
+
+def merge_histories(histories):
+    """One History-like object spanning every stage"""
+    keys = set.intersection(*(set(h.history) for h in histories))
+    merged = keras.callbacks.History()
+    merged.history = {key: sum((list(h.history[key]) for h in histories), []) for key in keys}
+    return merged
+
+def report_time_to_best(history, monitor):
+    """Print the best monitor value and the wall-clock time it took to reach it
+
+    Needs ElapsedTime among the fit() callbacks; comparable across
+    progressive and fixed-size runs.
+    """
+    values = history.history[monitor]
+    best = int(np.argmax(values))
+    print(f"\n⏱️ Best {monitor} {values[best]:.4f} reached after {history.history['elapsed'][best]:.0f}s")
+
+def fit_progressive(build_model, X_train, y_train, X_val, val_targets,
+                    callbacks, epochs, batch_size, learning_rate, sampling_mode,
+                    augment=None, hard_mining=False, extra=None, monitor='val_accuracy'):
+    """Train through PROGRESSIVE_SCHEDULE and return (final model, merged history)
+
+    build_model(size, learning_rate) returns a model compiled for size x size
+    inputs. callbacks (early stopping, checkpoints) only run in the final
+    full-size stage.
+    """
+    plan = stage_plan(epochs, batch_size, learning_rate, X_train.shape[1])
+    # One timer spans every stage (reuse the caller's so 'elapsed' is not reset)
+    timer = next((cb for cb in callbacks if isinstance(cb, ElapsedTime)), ElapsedTime())
+    callbacks = [cb for cb in callbacks if cb is not timer]
+    model, histories = None, []
+
+    for i, (size, stage_epochs, stage_batch, stage_lr) in enumerate(plan):
+        final = i == len(plan) - 1
+        print(f"\n📐 Stage {i + 1}/{len(plan)}: {size}x{size}, batch {stage_batch}, "
+              f"lr {stage_lr:.2e}, {stage_epochs} epochs")
+
+        stage_model = build_model(size, stage_lr)
+        if model is not None:
+            transfer_weights(model, stage_model)
+        model = stage_model
+
+        # Hard-example mining predicts on full-size images, so only the final stage mines
+        sequence, fit_kwargs, sampler_callbacks = create_sampler(
+            X_train, y_train, stage_batch, sampling_mode,
+            augment=augment, hard_mining=hard_mining and final, extra=extra
+        )
+        if sequence is None:
+            sequence = ShuffledSequence(X_train, y_train, stage_batch, augment=augment)
+        if not final:
+            sequence = ResizedSequence(sequence, size)
+
+        histories.append(model.fit(
+            sequence,
+            epochs=stage_epochs,
+            validation_data=(resize_images(X_val, size), val_targets),
+            callbacks=[timer] + sampler_callbacks + (callbacks if final else []),
+            verbose=1,
+            **fit_kwargs
+        ))
+
+    history = merge_histories(histories)
+    report_time_to_best(history, monitor)
+    return model, history
@@ -0,0 +1,149 @@
+"""
+Magnitude pruning for the custom CNN
+Zeroes the smallest Conv2D/Dense kernel weights on a polynomial-decay
+sparsity schedule during fine-tuning, then strips and compresses on export.
+The Keras copies here are for measurement; the shipped TF.js export is dense
+and only shrinks through weight quantization (train_model.PRUNED_QUANTIZATION)
+plus gzip on the wire
+"""
+
+import gzip
+import shutil
+import time
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+
+# Configuration
+TARGET_SPARSITY = 0.8        # Final share of zeroed kernel weights per pruned layer
+INITIAL_SPARSITY = 0.0
+PRUNING_POWER = 3            # Polynomial-decay exponent
+PRUNING_FREQUENCY = 50       # Training steps between mask updates
+PRUNING_END_FRACTION = 0.7   # Target is reached after this share of steps; the rest recovers accuracy
+LATENCY_BATCH = 32
+LATENCY_REPEATS = 10
+
+def polynomial_sparsity(step, end_step, initial=INITIAL_SPARSITY, target=TARGET_SPARSITY):
+    """Sparsity at a training step: fast early pruning that levels off at target"""
+    progress = min(max(step / end_step, 0.0), 1.0)
+    return target + (initial - target) * (1 - progress) ** PRUNING_POWER
+
+def prunable_layers(model):
+    """Conv2D and Dense layers, except the small output layer"""
+    layers = [
+        layer for layer in model.layers
+        if isinstance(layer, (keras.layers.Conv2D, keras.layers.Dense))
+    ]
+    return layers[:-1]
+
+def magnitude_mask(kernel, sparsity):
+    """1 for weights kept, 0 for the smallest-magnitude share of the kernel"""
+    k = int(round(sparsity * kernel.size))
+    if k == 0:
+        return np.ones(kernel.shape, dtype=np.float32)
+    magnitudes = np.abs(kernel)
+    threshold = np.partition(magnitudes.reshape(-1), k - 1)[k - 1]
+    return (magnitudes > threshold).astype(np.float32)
+
+def model_sparsity(model):
+    """Share of exactly-zero weights over all prunable kernels"""
+    kernels = [layer.kernel.numpy() for layer in prunable_layers(model)]
+    total = sum(kernel.size for kernel in kernels)
+    return float(sum(np.count_nonzero(kernel == 0) for kernel in kernels) / total)
+
+class MagnitudePruning(keras.callbacks.Callback):
+    """Apply polynomial-decay magnitude masks after every training step
+
+    Masks are recomputed every PRUNING_FREQUENCY steps until end_step and
+    re-applied after each optimizer update so pruned weights stay at zero.
+    """
+
+    def __init__(self, total_steps):
+        super().__init__()
+        self.end_step = max(1, int(total_steps * PRUNING_END_FRACTION))
+
+    def on_train_begin(self, logs=None):
+        self.layers = prunable_layers(self.model)
+        self.masks = [tf.ones_like(layer.kernel) for layer in self.layers]
+        self.step = 0
+
+    def _update_masks(self):
+        sparsity = polynomial_sparsity(self.step, self.end_step)
+        self.masks = [
+            tf.constant(magnitude_mask(layer.kernel.numpy(), sparsity)) for layer in self.layers
+        ]
+
+    def _apply_masks(self):
+        for layer, mask in zip(self.layers, self.masks):
+            layer.kernel.assign(layer.kernel * mask)
+
+    def on_train_batch_end(self, batch, logs=None):
+        self.step += 1
+        if self.step <= self.end_step and (self.step % PRUNING_FREQUENCY == 0 or self.step == self.end_step):
+            self._update_masks()
+        self._apply_masks()
+
+    def on_epoch_end(self, epoch, logs=None):
+        sparsity = model_sparsity(self.model)
+        if logs is not None:
+            logs['sparsity'] = sparsity
+        print(f"\n✂️ Sparsity: {sparsity:.1%} (target {TARGET_SPARSITY:.0%})")
+
+    def on_train_end(self, logs=None):
+        # Training may stop before end_step; always finish at the target
+        self.step = max(self.step, self.end_step)
+        self._update_masks()
+        self._apply_masks()
+
+def export_stripped(model, path):
+    """Save without optimizer state and gzip it; returns (raw bytes, gzip bytes)
+
+    Masks live in the callback, not the model, so stripping only drops the
+    optimizer slots. Zeroed weights are what makes the gzip copy small.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    model.save(path, include_optimizer=False)
+    gz_path = path.with_name(path.name + '.gz')
+    with open(path, 'rb') as src, gzip.open(gz_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    return path.stat().st_size, gz_path.stat().st_size
+
+def shard_sizes(model_dir):
+    """(raw bytes, gzip bytes) of the TF.js weight shards in model_dir"""
+    shards = sorted(model_dir.glob('*.bin'))
+    size = sum(shard.stat().st_size for shard in shards)
+    return size, sum(len(gzip.compress(shard.read_bytes())) for shard in shards)
+
+def cpu_latency(model, images):
+    """Median CPU inference time in ms/image over LATENCY_REPEATS batches"""
+    batch = images[:LATENCY_BATCH]
+    timings = []
+    with tf.device('/CPU:0'):
+        model(batch, training=False)  # Warm-up
+        for _ in range(LATENCY_REPEATS):
+            start = time.perf_counter()
+            model(batch, training=False)
+            timings.append(time.perf_counter() - start)
+    return 1000 * float(np.median(timings)) / len(batch)
+
+def measure_model(model, path, images):
+    """Sparsity, exported sizes and CPU latency of one model"""
+    size, gzip_size = export_stripped(model, path)
+    return {
+        'sparsity': model_sparsity(model),
+        'size_bytes': size,
+        'gzip_bytes': gzip_size,
+        'cpu_ms_per_image': cpu_latency(model, images)
+    }
+
+def print_report(dense, pruned):
+    """Side-by-side dense vs pruned comparison"""
+    print("\n✂️ Pruning report:")
+    print(f"   {'':<22}{'dense':>12}{'pruned':>12}")
+    print(f"   {'sparsity':<22}{dense['sparsity']:>12.1%}{pruned['sparsity']:>12.1%}")
+    print(f"   {'size (MB)':<22}{dense['size_bytes'] / 1e6:>12.2f}{pruned['size_bytes'] / 1e6:>12.2f}")
+    print(f"   {'gzipped size (MB)':<22}{dense['gzip_bytes'] / 1e6:>12.2f}{pruned['gzip_bytes'] / 1e6:>12.2f}")
+    print(f"   {'CPU ms/image':<22}{dense['cpu_ms_per_image']:>12.2f}{pruned['cpu_ms_per_image']:>12.2f}")
+    print(f"   {'test accuracy':<22}{dense['accuracy']:>12.2%}{pruned['accuracy']:>12.2%}")
+    print(f"\n   Compression: {dense['gzip_bytes'] / pruned['gzip_bytes']:.1f}x smaller gzipped")
+    print(f"   Accuracy change: {100 * (pruned['accuracy'] - dense['accuracy']):+.2f} points")
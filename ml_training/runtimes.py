@@ -0,0 +1,329 @@
+"""
+CPU inference runtimes for the certificate model
+Exports a SavedModel with a fixed input signature, ONNX and TFLite, and
+serves them behind one backend interface so each deployment can pick the
+fastest runtime after a parity check on the test split
+"""
+
+import os
+import abc
+import sys
+import json
+import time
+import argparse
+import subprocess
+import tempfile
+import numpy as np
+from pathlib import Path
+
+from autotune import apply_profile, tuned_batch_size
+from train_certificate_model import IMG_SIZE, KERAS_MODEL_PATH, SPLIT_TEST, load_dataset_cache
+
+# Configuration
+EXPORT_DIR = KERAS_MODEL_PATH.parent
+SAVED_MODEL_DIR = EXPORT_DIR / 'saved_model'
+ONNX_PATH = EXPORT_DIR / 'certificate_model.onnx'
+TFLITE_PATH = EXPORT_DIR / 'certificate_model.tflite'
+RUNTIME_CONFIG = EXPORT_DIR / 'runtime.json'
+ONNX_OPSET = 13
+BATCH_SIZE = tuned_batch_size('inference', 32)
+LATENCY_REPEATS = 20
+PARITY_ATOL = 1e-4  # Max absolute probability difference versus TensorFlow
+REFERENCE_BACKEND = 'tensorflow'
+
+def input_spec():
+    """Fixed serving input: float32 RGB in [0, 1], any batch size"""
+    import tensorflow as tf
+
+    return tf.TensorSpec([None, IMG_SIZE, IMG_SIZE, 3], tf.float32, name='image')
+
+def export_saved_model(model, path=SAVED_MODEL_DIR):
+    """SavedModel whose serving_default signature is image -> probabilities[, features]"""
+    import tensorflow as tf
+
+    @tf.function(input_signature=[input_spec()])
+    def serve(image):
+        outputs = model(image, training=False)
+        if isinstance(outputs, (list, tuple)):
+            return {'probabilities': outputs[0], 'features': outputs[1]}
+        return {'probabilities': outputs}
+
+    tf.saved_model.save(model, str(path), signatures={'serving_default': serve})
+    print(f"✅ SavedModel saved to {path}")
+
+def export_onnx(model, path=ONNX_PATH):
+    """ONNX graph with the same fixed input spec (needs tf2onnx)"""
+    try:
+        import tf2onnx
+    except ImportError:
+        print("⚠️ tf2onnx not installed, skipping ONNX export (pip install tf2onnx)")
+        return
+
+    tf2onnx.convert.from_keras(
+        model, input_signature=(input_spec(),), opset=ONNX_OPSET, output_path=str(path)
+    )
+    print(f"✅ ONNX model saved to {path}")
+
+def export_tflite(saved_model_dir=SAVED_MODEL_DIR, path=TFLITE_PATH):
+    """Float32 TFLite flatbuffer converted from the SavedModel"""
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_saved_model(str(saved_model_dir))
+    path.write_bytes(converter.convert())
+    print(f"✅ TFLite model saved to {path}")
+
+def export_runtimes(model):
+    """Write every CPU runtime artifact next to the Keras export"""
+    print("\n💾 Exporting CPU runtime artifacts...")
+    EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+    export_saved_model(model)
+    export_onnx(model)
+    export_tflite()
+
+class Backend(abc.ABC):
+    """Common runtime interface: predict() maps images to class probabilities"""
+
+    name = None
+    artifact = None
+
+    @abc.abstractmethod
+    def predict(self, images):
+        """Class probabilities for one batch of float32 images"""
+
+    def predict_batched(self, images, batch_size=BATCH_SIZE):
+        """Probabilities over images in batch_size chunks"""
+        return np.concatenate([
+            self.predict(images[i:i + batch_size]) for i in range(0, len(images), batch_size)
+        ])
+
+class TensorFlowBackend(Backend):
+    """SavedModel serving signature on TensorFlow"""
+
+    name = 'tensorflow'
+    artifact = SAVED_MODEL_DIR
+
+    def __init__(self, path=SAVED_MODEL_DIR, threads=None):
+        import tensorflow as tf
+
+        if threads is not None:
+            try:
+                tf.config.threading.set_intra_op_parallelism_threads(threads['intra_op_threads'])
+                tf.config.threading.set_inter_op_parallelism_threads(threads['inter_op_threads'])
+            except RuntimeError:
+                # Thread pools are fixed once TensorFlow has run; the environment
+                # set by apply_profile() applied at startup instead
+                print("⚠️ TensorFlow already initialized; keeping its thread settings")
+        self.tf = tf
+        self.serve = tf.saved_model.load(str(path)).signatures['serving_default']
+
+    def predict(self, images):
+        images = self.tf.constant(images, dtype=self.tf.float32)
+        return self.serve(image=images)['probabilities'].numpy()
+
+class OnnxBackend(Backend):
+    """ONNX Runtime on the CPU execution provider"""
+
+    name = 'onnx'
+    artifact = ONNX_PATH
+
+    def __init__(self, path=ONNX_PATH, threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if threads is not None:
+            options.intra_op_num_threads = threads['intra_op_threads']
+            options.inter_op_num_threads = threads['inter_op_threads']
+        self.session = ort.InferenceSession(str(path), options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, images):
+        return self.session.run(None, {self.input_name: images.astype(np.float32)})[0]
+
+class TFLiteBackend(Backend):
+    """TFLite interpreter (XNNPACK is the default CPU delegate for float models)"""
+
+    name = 'tflite'
+    artifact = TFLITE_PATH
+
+    def __init__(self, path=TFLITE_PATH, threads=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+
+        num_threads = threads['intra_op_threads'] if threads is not None else os.cpu_count()
+        interpreter = Interpreter(model_path=str(path), num_threads=num_threads)
+        # The signature runner resizes the batch dimension on demand
+        self.runner = interpreter.get_signature_runner('serving_default')
+
+    def predict(self, images):
+        return self.runner(image=images.astype(np.float32))['probabilities']
+
+BACKENDS = {backend.name: backend for backend in (TensorFlowBackend, OnnxBackend, TFLiteBackend)}
+
+def load_backend(name=None):
+    """Instantiate a backend by name; defaults to the runtime chosen by `compare`
+
+    Thread counts and pinning come from the host's autotune profile, if any.
+    """
+    if name is None:
+        name = REFERENCE_BACKEND
+        if RUNTIME_CONFIG.exists():
+            with open(RUNTIME_CONFIG) as f:
+                name = json.load(f)['backend']
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}'. Choose from: {', '.join(BACKENDS)}")
+    if not BACKENDS[name].artifact.exists():
+        raise ValueError(f"No {name} model at {BACKENDS[name].artifact}. Run: python runtimes.py export")
+    return BACKENDS[name](threads=apply_profile('inference'))
+
+def test_split():
+    """Test images and one-hot labels from the dataset cache"""
+    images, labels, splits = load_dataset_cache()
+    return images[splits == SPLIT_TEST].astype(np.float32), labels[splits == SPLIT_TEST]
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB, or None where it cannot be read"""
+    try:
+        import resource
+    except ImportError:  # Windows: peak working set from psapi
+        return _peak_working_set_mb()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024  # Bytes on macOS, KB elsewhere
+
+def _peak_working_set_mb():
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+            (name, ctypes.c_size_t) for name in (
+                'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage'
+            )
+        ]
+
+    try:
+        counters = ProcessMemoryCounters(cb=ctypes.sizeof(ProcessMemoryCounters))
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize / (1 << 20)
+    except (AttributeError, OSError):
+        pass
+    return None
+
+def bench(name, output_path):
+    """Measure one backend in this (fresh) process and save its test predictions"""
+    X_test, _ = test_split()
+
+    start = time.perf_counter()
+    backend = load_backend(name)
+    load_seconds = time.perf_counter() - start
+
+    probs = backend.predict_batched(X_test)  # Also warms up every batch shape
+    np.save(output_path, probs)
+
+    single = []
+    for i in range(LATENCY_REPEATS):
+        start = time.perf_counter()
+        backend.predict(X_test[i % len(X_test)][None])
+        single.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    backend.predict_batched(X_test)
+    batch_seconds = time.perf_counter() - start
+
+    print(json.dumps({
+        'load_seconds': load_seconds,
+        'single_ms': 1000 * float(np.median(single)),
+        'batch_ms_per_image': 1000 * batch_seconds / len(X_test),
+        'peak_rss_mb': peak_rss_mb()
+    }))
+
+def run_bench(name, output_path):
+    """Run `bench` in a fresh interpreter so load time and memory are isolated"""
+    result = subprocess.run(
+        [sys.executable, __file__, 'bench', name, '--output', str(output_path)],
+        cwd=Path(__file__).resolve().parent, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        message = (result.stderr.strip() or result.stdout.strip() or 'failed').splitlines()[-1]
+        print(f"   ⚠️ {name}: {message}")
+        return None
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def compare():
+    """Parity, latency and memory of every exported runtime on the test split"""
+    print("\n📊 Comparing CPU runtimes on the test split...")
+    _, y_test = test_split()
+    true_classes = np.argmax(y_test, axis=1)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, backend in BACKENDS.items():
+            if not backend.artifact.exists():
+                print(f"   ⚠️ {name}: no artifact at {backend.artifact}")
+                continue
+            output_path = Path(tmp) / f'{name}.npy'
+            stats = run_bench(name, output_path)
+            if stats is not None:
+                stats['probs'] = np.load(output_path)
+                results[name] = stats
+
+    if REFERENCE_BACKEND not in results:
+        raise ValueError(f"The {REFERENCE_BACKEND} backend is required as the parity reference")
+    reference = results[REFERENCE_BACKEND]['probs']
+
+    print(f"\n   {'backend':<12}{'max |Δp|':>10}{'agree':>9}{'accuracy':>10}"
+          f"{'load s':>8}{'1-img ms':>10}{'batch ms/img':>14}{'peak MB':>9}")
+    for name, stats in results.items():
+        probs = stats.pop('probs')
+        stats['max_abs_diff'] = float(np.abs(probs - reference).max())
+        stats['argmax_agreement'] = float(np.mean(np.argmax(probs, axis=1) == np.argmax(reference, axis=1)))
+        stats['accuracy'] = float(np.mean(np.argmax(probs, axis=1) == true_classes))
+        stats['parity'] = stats['max_abs_diff'] <= PARITY_ATOL and stats['argmax_agreement'] == 1.0
+        status = '✅' if stats['parity'] else '❌'
+        peak = 'n/a' if stats['peak_rss_mb'] is None else f"{stats['peak_rss_mb']:.0f}"
+        print(f"{status} {name:<11}{stats['max_abs_diff']:>10.1e}{stats['argmax_agreement']:>9.1%}"
+              f"{stats['accuracy']:>10.2%}{stats['load_seconds']:>8.2f}{stats['single_ms']:>10.2f}"
+              f"{stats['batch_ms_per_image']:>14.2f}{peak:>9}")
+
+    # Fastest batch throughput among runtimes that match the reference
+    passing = {name: stats for name, stats in results.items() if stats['parity']}
+    fastest = min(passing, key=lambda name: passing[name]['batch_ms_per_image'])
+    with open(RUNTIME_CONFIG, 'w') as f:
+        json.dump({'backend': fastest, 'results': results}, f, indent=2)
+    print(f"\n✅ Fastest runtime with parity: {fastest} (saved to {RUNTIME_CONFIG})")
+
+def export():
+    """Export runtime artifacts from the Keras model"""
+    from tensorflow import keras
+
+    if not KERAS_MODEL_PATH.exists():
+        raise ValueError(f"Model not found at {KERAS_MODEL_PATH}. Train the model first")
+    export_runtimes(keras.models.load_model(KERAS_MODEL_PATH))
+
+def main():
+    """Runtime command-line entry point"""
+    parser = argparse.ArgumentParser(description='Export and compare CPU inference runtimes')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('export', help='Write SavedModel, ONNX and TFLite artifacts')
+    subparsers.add_parser('compare', help='Parity, latency and memory on the test split')
+    bench_parser = subparsers.add_parser('bench', help='Measure one backend (used by compare)')
+    bench_parser.add_argument('backend', choices=list(BACKENDS))
+    bench_parser.add_argument('--output', type=Path, required=True, help='Where to save test predictions')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'export':
+            export()
+        elif args.command == 'compare':
+            compare()
+        else:
+            bench(args.backend, args.output)
+    except ValueError as e:
+        print(f"\n❌ Error: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
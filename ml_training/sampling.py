@@ -0,0 +1,139 @@
+"""
+Class-balanced sampling for skewed certificate datasets
+Rebalances rare classes (forged, tampered) per epoch and optionally
+biases sampling towards hard examples using per-sample losses
+"""
+
+import numpy as np
+from tensorflow import keras
+
+# Configuration
+OVERSAMPLE_CAP = 4        # Rare classes are repeated at most this many times per epoch
+HARD_MINING_ALPHA = 1.0   # Exponent on per-sample loss when mining hard examples
+HARD_MINING_INTERVAL = 5  # Epochs between per-sample loss refreshes
+HARD_MINING_FLOOR = 0.05  # Minimum sampling weight so easy samples are not starved
+
+def class_counts(y):
+    """Number of samples per class for one-hot labels"""
+    return np.bincount(np.argmax(y, axis=1), minlength=y.shape[1])
+
+def compute_class_weights(y):
+    """Inverse-frequency class weights for model.fit(class_weight=...)"""
+    counts = class_counts(y)
+    present = counts > 0
+    weights = np.zeros(len(counts))
+    weights[present] = counts.sum() / (present.sum() * counts[present])
+    return {i: float(w) for i, w in enumerate(weights)}
+
+def samples_per_class(y):
+    """Per-class draws per epoch: rare classes oversampled up to OVERSAMPLE_CAP,
+    common classes undersampled down to the same count"""
+    counts = class_counts(y)
+    counts = counts[counts > 0]
+    return int(min(counts.max(), OVERSAMPLE_CAP * counts.min()))
+
+class BalancedSequence(keras.utils.Sequence):
+    """Batches drawn with equal counts per class, reshuffled every epoch"""
+
+    def __init__(self, X, y, batch_size, augment=None, extra=None, seed=42):
+        super().__init__()
+        self.X = X
+        self.y = y
+        self.extra = extra
+        self.batch_size = batch_size
+        self.augment = augment
+        self.rng = np.random.default_rng(seed)
+        self.class_indices = [
+            np.flatnonzero(np.argmax(y, axis=1) == c) for c in range(y.shape[1])
+        ]
+        self.class_indices = [idx for idx in self.class_indices if len(idx) > 0]
+        self.per_class = samples_per_class(y)
+        self.losses = None
+        self.on_epoch_end()
+
+    def update_losses(self, losses):
+        """Set per-sample losses used to bias sampling towards hard examples"""
+        self.losses = np.asarray(losses, dtype=np.float64)
+
+    def _draw(self, idx):
+        """Draw per_class samples from one class, loss-weighted if mining"""
+        replace = len(idx) < self.per_class
+        if self.losses is None:
+            return self.rng.choice(idx, size=self.per_class, replace=replace)
+
+        weights = np.maximum(self.losses[idx] ** HARD_MINING_ALPHA, HARD_MINING_FLOOR)
+        return self.rng.choice(idx, size=self.per_class, replace=replace, p=weights / weights.sum())
+
+    def on_epoch_end(self):
+        """Resample the epoch order"""
+        self.order = np.concatenate([self._draw(idx) for idx in self.class_indices])
+        self.rng.shuffle(self.order)
+
+    def __len__(self):
+        return int(np.ceil(len(self.order) / self.batch_size))
+
+    def __getitem__(self, i):
+        batch = self.order[i * self.batch_size:(i + 1) * self.batch_size]
+        X_batch = self.X[batch]
+        if self.augment is not None:
+            X_batch = np.stack([self.augment.random_transform(x) for x in X_batch])
+        if self.extra is not None:
+            return X_batch, (self.y[batch], self.extra[batch])
+        return X_batch, self.y[batch]
+
+class ShuffledSequence(BalancedSequence):
+    """Every sample once per epoch in random order (no rebalancing)"""
+
+    def on_epoch_end(self):
+        self.order = self.rng.permutation(len(self.X))
+
+class HardExampleMiner(keras.callbacks.Callback):
+    """Refresh per-sample training losses every HARD_MINING_INTERVAL epochs"""
+
+    def __init__(self, sequence, batch_size):
+        super().__init__()
+        self.sequence = sequence
+        self.batch_size = batch_size
+
+    def on_epoch_end(self, epoch, logs=None):
+        if (epoch + 1) % HARD_MINING_INTERVAL != 0:
+            return
+
+        y_pred = self.model.predict(self.sequence.X, batch_size=self.batch_size, verbose=0)
+        if isinstance(y_pred, list):
+            y_pred = y_pred[0]  # Multi-task models: class head comes first
+        losses = keras.losses.categorical_crossentropy(self.sequence.y, y_pred).numpy()
+        self.sequence.update_losses(losses)
+        print(f"\n⛏️ Hard-example mining: mean loss {losses.mean():.4f}, max {losses.max():.4f}")
+
+def create_sampler(X, y, batch_size, mode, augment=None, hard_mining=False, extra=None):
+    """Build fit() inputs for a sampling mode
+
+    Returns (sequence, fit_kwargs, callbacks). mode is 'balanced' for per-class
+    resampling, 'weighted' for loss reweighting, or None for the plain arrays.
+    extra holds a second target (multi-task feature scores); it always goes
+    through a sequence since Keras has no class_weight for multi-output models.
+    """
+    counts = class_counts(y)
+    print("\n⚖️ Class distribution (train):")
+    for c, count in enumerate(counts):
+        print(f"   class {c}: {count}")
+
+    if mode == 'balanced':
+        sequence = BalancedSequence(X, y, batch_size, augment=augment, extra=extra)
+        callbacks = [HardExampleMiner(sequence, batch_size)] if hard_mining else []
+        print(f"   Balanced sampling: {sequence.per_class} per class, "
+              f"{len(sequence.order)} images/epoch (was {len(X)})")
+        return sequence, {}, callbacks
+
+    if extra is not None:
+        if mode == 'weighted':
+            print("   ⚠️ Class weights are not supported with multi-task targets; using plain shuffling")
+        return ShuffledSequence(X, y, batch_size, augment=augment, extra=extra), {}, []
+
+    if mode == 'weighted':
+        class_weight = compute_class_weights(y)
+        print(f"   Class weights: {class_weight}")
+        return None, {'class_weight': class_weight}, []
+
+    return None, {}, []
@@ -0,0 +1,106 @@
+"""
+Local stand-in for the Supabase Storage REST API
+Serves a directory as a bucket (list + download routes used by
+ingest_storage.py), optionally with injected latency and transient errors
+"""
+
+import json
+import time
+import random
+import argparse
+from pathlib import Path
+from urllib.parse import unquote
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Configuration
+DEFAULT_PORT = 54321
+
+class StandinServer(ThreadingHTTPServer):
+    """Threaded server that ignores clients closing pooled connections"""
+
+    def handle_error(self, request, client_address):
+        pass
+
+def make_handler(root, bucket, fail_rate, latency):
+    """Request handler serving root as the given bucket"""
+
+    class StorageHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # Keep-alive, so the client pool is exercised
+
+        def _send(self, status, body, content_type='application/json'):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _injected_failure(self):
+            time.sleep(latency)
+            if random.random() < fail_rate:
+                self._send(503, b'{"error": "injected failure"}')
+                return True
+            return False
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if self.path != f'/storage/v1/object/list/{bucket}':
+                return self._send(404, b'{"error": "not found"}')
+            if self._injected_failure():
+                return
+
+            request = json.loads(body or b'{}')
+            folder = root / request.get('prefix', '')
+            entries = sorted(folder.iterdir()) if folder.is_dir() else []
+            offset, limit = request.get('offset', 0), request.get('limit', 100)
+            items = [
+                {'name': p.name, 'id': None, 'metadata': None} if p.is_dir() else
+                {'name': p.name, 'id': str(hash(p)), 'metadata': {
+                    'size': p.stat().st_size, 'eTag': f'"{int(p.stat().st_mtime)}"'
+                }}
+                for p in entries[offset:offset + limit]
+            ]
+            self._send(200, json.dumps(items).encode())
+
+        def do_GET(self):
+            path = unquote(self.path)
+            for route in (f'/storage/v1/object/public/{bucket}/', f'/storage/v1/object/{bucket}/'):
+                if path.startswith(route):
+                    target = (root / path[len(route):]).resolve()
+                    break
+            else:
+                return self._send(404, b'{"error": "not found"}')
+            if self._injected_failure():
+                return
+            if root not in target.parents or not target.is_file():
+                return self._send(404, b'{"error": "object not found"}')
+            self._send(200, target.read_bytes(), 'application/octet-stream')
+
+        def log_message(self, format, *args):
+            pass
+
+    return StorageHandler
+
+def main():
+    """Serve a local directory as a storage bucket"""
+    parser = argparse.ArgumentParser(description='Local stand-in for Supabase Storage')
+    parser.add_argument('root', type=Path, help='Directory served as the bucket root')
+    parser.add_argument('--bucket', default='certificates')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Share of requests answered with 503')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Added delay per request')
+    args = parser.parse_args()
+
+    root = args.root.resolve()
+    server = StandinServer(
+        ('127.0.0.1', args.port),
+        make_handler(root, args.bucket, args.fail_rate, args.latency_ms / 1000)
+    )
+    print(f"🗄️ Serving {root} as bucket '{args.bucket}' on http://127.0.0.1:{args.port}")
+    print(f"   Try: python ingest_storage.py --url http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
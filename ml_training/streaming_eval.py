@@ -0,0 +1,218 @@
+"""
+Streaming model evaluation
+Runs inference once in batches and accumulates the confusion matrix,
+per-class precision/recall, ROC/PR curves and calibration stats in
+fixed-size arrays, so memory stays constant regardless of test set size
+"""
+
+import numpy as np
+
+# Configuration
+EVAL_BATCH_SIZE = 64
+NUM_SCORE_BINS = 200        # Resolution of ROC/PR curves
+NUM_CALIBRATION_BINS = 15
+THRESHOLD = 0.5             # Matches keras.metrics.Precision/Recall defaults
+
+class StreamingEvaluator:
+    """Accumulates evaluation statistics batch by batch"""
+
+    def __init__(self, num_classes):
+        self.num_classes = num_classes
+        self.confusion = np.zeros((num_classes, num_classes), dtype=np.int64)
+        # Per-class one-vs-rest score histograms for ROC/PR curves
+        self.pos_hist = np.zeros((num_classes, NUM_SCORE_BINS), dtype=np.int64)
+        self.neg_hist = np.zeros((num_classes, NUM_SCORE_BINS), dtype=np.int64)
+        # Top-class confidence reliability bins
+        self.cal_count = np.zeros(NUM_CALIBRATION_BINS, dtype=np.int64)
+        self.cal_confidence = np.zeros(NUM_CALIBRATION_BINS)
+        self.cal_correct = np.zeros(NUM_CALIBRATION_BINS)
+        # Thresholded micro counts (same semantics as the Keras metrics)
+        self.tp = 0
+        self.fp = 0
+        self.fn = 0
+        self.loss_sum = 0.0
+        self.count = 0
+        # Multi-task feature heads: summed absolute error per feature
+        self.feature_abs_error = None
+        self.feature_count = 0
+
+    def update(self, y_true, y_prob):
+        """Add a batch of one-hot (or integer) labels and predicted probabilities"""
+        y_prob = np.asarray(y_prob, dtype=np.float64)
+        y_true = np.asarray(y_true)
+        if y_true.ndim == 1:
+            y_true = np.eye(self.num_classes)[y_true]
+
+        true_classes = np.argmax(y_true, axis=1)
+        pred_classes = np.argmax(y_prob, axis=1)
+        np.add.at(self.confusion, (true_classes, pred_classes), 1)
+
+        bins = np.minimum((y_prob * NUM_SCORE_BINS).astype(int), NUM_SCORE_BINS - 1)
+        positive = y_true > 0.5
+        for c in range(self.num_classes):
+            self.pos_hist[c] += np.bincount(bins[positive[:, c], c], minlength=NUM_SCORE_BINS)
+            self.neg_hist[c] += np.bincount(bins[~positive[:, c], c], minlength=NUM_SCORE_BINS)
+
+        confidence = y_prob.max(axis=1)
+        cal_bins = np.minimum((confidence * NUM_CALIBRATION_BINS).astype(int), NUM_CALIBRATION_BINS - 1)
+        self.cal_count += np.bincount(cal_bins, minlength=NUM_CALIBRATION_BINS)
+        self.cal_confidence += np.bincount(cal_bins, weights=confidence, minlength=NUM_CALIBRATION_BINS)
+        self.cal_correct += np.bincount(
+            cal_bins, weights=(pred_classes == true_classes).astype(float), minlength=NUM_CALIBRATION_BINS
+        )
+
+        predicted = y_prob >= THRESHOLD
+        self.tp += int(np.sum(predicted & positive))
+        self.fp += int(np.sum(predicted & ~positive))
+        self.fn += int(np.sum(~predicted & positive))
+
+        self.loss_sum += float(-np.sum(y_true * np.log(np.clip(y_prob, 1e-7, 1.0))))
+        self.count += len(y_prob)
+
+    def update_features(self, f_true, f_pred):
+        """Add a batch of feature-score targets and predictions"""
+        error = np.abs(np.asarray(f_true, dtype=np.float64) - np.asarray(f_pred, dtype=np.float64)).sum(axis=0)
+        self.feature_abs_error = error if self.feature_abs_error is None else self.feature_abs_error + error
+        self.feature_count += len(f_true)
+
+    def feature_mae(self):
+        """Mean absolute error per feature, or None without feature heads"""
+        if self.feature_abs_error is None:
+            return None
+        return self.feature_abs_error / max(self.feature_count, 1)
+
+    @property
+    def accuracy(self):
+        return np.trace(self.confusion) / max(self.count, 1)
+
+    @property
+    def loss(self):
+        return self.loss_sum / max(self.count, 1)
+
+    @property
+    def precision(self):
+        return self.tp / max(self.tp + self.fp, 1)
+
+    @property
+    def recall(self):
+        return self.tp / max(self.tp + self.fn, 1)
+
+    def per_class(self):
+        """Per-class (precision, recall, f1, support) from the confusion matrix"""
+        tp = np.diag(self.confusion).astype(float)
+        predicted = self.confusion.sum(axis=0)
+        support = self.confusion.sum(axis=1)
+        precision = np.divide(tp, predicted, out=np.zeros_like(tp), where=predicted > 0)
+        recall = np.divide(tp, support, out=np.zeros_like(tp), where=support > 0)
+        denom = precision + recall
+        f1 = np.divide(2 * precision * recall, denom, out=np.zeros_like(tp), where=denom > 0)
+        return precision, recall, f1, support
+
+    def roc_curve(self, c):
+        """(fpr, tpr) for class c, sweeping the threshold from high to low"""
+        tps = np.concatenate([[0], np.cumsum(self.pos_hist[c][::-1])])
+        fps = np.concatenate([[0], np.cumsum(self.neg_hist[c][::-1])])
+        return fps / max(fps[-1], 1), tps / max(tps[-1], 1)
+
+    def pr_curve(self, c):
+        """(recall, precision) for class c"""
+        tps = np.cumsum(self.pos_hist[c][::-1])
+        fps = np.cumsum(self.neg_hist[c][::-1])
+        predicted = tps + fps
+        precision = np.divide(tps, predicted, out=np.ones(len(tps)), where=predicted > 0)
+        return tps / max(tps[-1], 1), precision
+
+    def roc_auc(self, c):
+        fpr, tpr = self.roc_curve(c)
+        return float(np.trapz(tpr, fpr))
+
+    def average_precision(self, c):
+        recall, precision = self.pr_curve(c)
+        return float(np.sum(np.diff(np.concatenate([[0], recall])) * precision))
+
+    def calibration(self):
+        """(mean confidence, accuracy, count) per reliability bin"""
+        count = np.maximum(self.cal_count, 1)
+        return self.cal_confidence / count, self.cal_correct / count, self.cal_count
+
+    def expected_calibration_error(self):
+        confidence, accuracy, count = self.calibration()
+        return float(np.sum(count * np.abs(confidence - accuracy)) / max(self.count, 1))
+
+    def report(self, class_names):
+        """Text report in the layout of sklearn's classification_report"""
+        precision, recall, f1, support = self.per_class()
+        lines = [f"{'':>14}{'precision':>10}{'recall':>10}{'f1-score':>10}{'support':>10}{'roc-auc':>10}{'avg-prec':>10}", ""]
+        for c, name in enumerate(class_names):
+            lines.append(
+                f"{name:>14}{precision[c]:>10.2f}{recall[c]:>10.2f}{f1[c]:>10.2f}{support[c]:>10d}"
+                f"{self.roc_auc(c):>10.3f}{self.average_precision(c):>10.3f}"
+            )
+        lines.append("")
+        lines.append(f"{'accuracy':>14}{'':>20}{self.accuracy:>10.2f}{self.count:>10d}")
+        lines.append(f"{'macro avg':>14}{precision.mean():>10.2f}{recall.mean():>10.2f}{f1.mean():>10.2f}{self.count:>10d}")
+        lines.append(f"{'ECE':>14}{self.expected_calibration_error():>10.4f}")
+        return "\n".join(lines)
+
+def iterate_batches(X, y, batch_size=EVAL_BATCH_SIZE, features=None):
+    """Yield (X, y) or (X, y, features) batches from arrays (or memory-mapped arrays)"""
+    for start in range(0, len(X), batch_size):
+        batch = slice(start, start + batch_size)
+        if features is None:
+            yield X[batch], y[batch]
+        else:
+            yield X[batch], y[batch], features[batch]
+
+def split_outputs(outputs):
+    """(class probabilities, feature scores or None) from a model call"""
+    if isinstance(outputs, (list, tuple)):
+        return np.asarray(outputs[0]), np.asarray(outputs[1])
+    return np.asarray(outputs), None
+
+def evaluate_stream(model, batches, num_classes):
+    """Single batched inference pass over (X, y) or (X, y, features) batches"""
+    evaluator = StreamingEvaluator(num_classes)
+    for batch in batches:
+        y_prob, f_pred = split_outputs(model(batch[0], training=False))
+        evaluator.update(batch[1], y_prob)
+        if f_pred is not None and len(batch) > 2:
+            evaluator.update_features(batch[2], f_pred)
+    return evaluator
+
+def plot_curves(evaluator, class_names, output_dir):
+    """Save ROC, PR and reliability plots"""
+    import matplotlib.pyplot as plt
+
+    fig, axes = plt.subplots(1, 3, figsize=(18, 5))
+
+    for c, name in enumerate(class_names):
+        fpr, tpr = evaluator.roc_curve(c)
+        axes[0].plot(fpr, tpr, label=f'{name} (AUC {evaluator.roc_auc(c):.3f})')
+        recall, precision = evaluator.pr_curve(c)
+        axes[1].plot(recall, precision, label=f'{name} (AP {evaluator.average_precision(c):.3f})')
+
+    axes[0].plot([0, 1], [0, 1], 'k--', linewidth=0.5)
+    axes[0].set_title('ROC Curve')
+    axes[0].set_xlabel('False Positive Rate')
+    axes[0].set_ylabel('True Positive Rate')
+    axes[1].set_title('Precision-Recall Curve')
+    axes[1].set_xlabel('Recall')
+    axes[1].set_ylabel('Precision')
+
+    confidence, accuracy, count = evaluator.calibration()
+    filled = count > 0
+    axes[2].plot([0, 1], [0, 1], 'k--', linewidth=0.5)
+    axes[2].plot(confidence[filled], accuracy[filled], 'o-')
+    axes[2].set_title(f'Reliability (ECE {evaluator.expected_calibration_error():.4f})')
+    axes[2].set_xlabel('Confidence')
+    axes[2].set_ylabel('Accuracy')
+
+    for ax in axes:
+        ax.grid(True)
+    axes[0].legend()
+    axes[1].legend()
+
+    plt.tight_layout()
+    plt.savefig(output_dir / 'evaluation_curves.png')
+    plt.close(fig)
+    print(f"✅ ROC/PR/calibration curves saved to {output_dir / 'evaluation_curves.png'}")
@@ -0,0 +1,218 @@
+"""
+Tiled high-resolution certificate inference
+Splits a full-resolution certificate into overlapping TILE_SIZE crops, skips
+blank tiles, runs the remaining tiles as one batch and aggregates them into
+an image-level verdict plus a coarse tamper heatmap
+"""
+
+import argparse
+import numpy as np
+from pathlib import Path
+
+from autotune import apply_profile
+from manifest import list_images
+
+# Configuration
+TILE_SIZE = 224
+TILE_STRIDE = 168            # 25% overlap between neighbouring tiles
+MAX_IMAGE_SIDE = 1600        # Longer side is capped before tiling
+BLANK_STD_THRESHOLD = 0.03   # Tiles with lower grayscale std are treated as blank margin
+TOP_K_TILES = 3              # Image verdict averages the K most suspicious tiles
+TILES_PER_IMAGE = 8          # Content tiles sampled per image for training
+AUTHENTIC_INDEX = 0
+
+def load_full_image(image_path):
+    """Load an image at (capped) native resolution as float32 in [0, 1]"""
+    from PIL import Image
+
+    img = Image.open(image_path).convert('RGB')
+    scale = min(1.0, MAX_IMAGE_SIDE / max(img.size))
+    # Never go below one tile on the short side
+    scale = max(scale, TILE_SIZE / min(img.size))
+    if scale != 1.0:
+        img = img.resize((round(img.width * scale), round(img.height * scale)))
+    return np.asarray(img, dtype=np.float32) / 255.0
+
+def _axis_positions(length):
+    """Tile offsets along one axis; the last tile is aligned to the edge"""
+    positions = list(range(0, max(length - TILE_SIZE, 0) + 1, TILE_STRIDE))
+    if positions[-1] + TILE_SIZE < length:
+        positions.append(length - TILE_SIZE)
+    return positions
+
+def extract_tiles(image):
+    """Content tiles of an (H, W, 3) image
+
+    Returns (tiles, content_mask, grid_shape); content_mask is over the full
+    row-major tile grid and tiles holds only the non-blank entries.
+    """
+    ys = _axis_positions(image.shape[0])
+    xs = _axis_positions(image.shape[1])
+    tiles = np.stack([
+        image[y:y + TILE_SIZE, x:x + TILE_SIZE] for y in ys for x in xs
+    ])
+
+    gray_std = tiles.mean(axis=3).reshape(len(tiles), -1).std(axis=1)
+    content_mask = gray_std > BLANK_STD_THRESHOLD
+    if not content_mask.any():
+        content_mask[np.argmax(gray_std)] = True
+
+    return tiles[content_mask], content_mask, (len(ys), len(xs))
+
+def aggregate_tiles(tile_probs):
+    """Image-level probabilities: mean of the TOP_K_TILES least authentic tiles"""
+    order = np.argsort(tile_probs[:, AUTHENTIC_INDEX])
+    return tile_probs[order[:TOP_K_TILES]].mean(axis=0)
+
+def tamper_heatmap(tile_probs, content_mask, grid_shape):
+    """Per-tile (1 - authentic) on the tile grid; blank tiles are NaN"""
+    heatmap = np.full(content_mask.shape, np.nan)
+    heatmap[content_mask] = 1.0 - tile_probs[:, AUTHENTIC_INDEX]
+    return heatmap.reshape(grid_shape)
+
+def predict_tiled(model, image):
+    """Run every content tile through the model in one batch
+
+    Returns (image_probs, heatmap, num_tiles_run, num_tiles_total).
+    """
+    from streaming_eval import split_outputs
+
+    tiles, content_mask, grid_shape = extract_tiles(image)
+    tile_probs, _ = split_outputs(model(tiles, training=False))
+    return (
+        aggregate_tiles(tile_probs),
+        tamper_heatmap(tile_probs, content_mask, grid_shape),
+        len(tiles),
+        content_mask.size
+    )
+
+def load_tiled_dataset(data_dir, class_names, seed=42, with_splits=False):
+    """Sample up to TILES_PER_IMAGE content tiles per image for patch training
+
+    Tiles inherit their image's label. Returns (tiles, one-hot labels,
+    image_ids) so splits can keep every tile of an image together; with
+    with_splits=True also each tile's split code, the source image's split
+    in the manifest (see manifest.assign_splits), DUPLICATE for dropped
+    duplicates.
+    """
+    print(f"\n📂 Loading tiled dataset from {data_dir}...")
+    rng = np.random.default_rng(seed)
+
+    tiles, labels, image_ids = [], [], []
+    image_paths, image_classes = [], []
+    image_id = 0
+    listing = list_images(data_dir, class_names)
+    for class_idx, class_name in enumerate(class_names):
+        image_files = sorted(path for path, idx in listing if idx == class_idx)
+
+        for img_path in image_files:
+            try:
+                image_tiles, _, _ = extract_tiles(load_full_image(img_path))
+            except Exception as e:
+                print(f"  ⚠️ Error loading {img_path}: {e}")
+                continue
+
+            if len(image_tiles) > TILES_PER_IMAGE:
+                image_tiles = image_tiles[rng.choice(len(image_tiles), TILES_PER_IMAGE, replace=False)]
+            tiles.append(image_tiles)
+            labels += [class_idx] * len(image_tiles)
+            image_ids += [image_id] * len(image_tiles)
+            image_paths.append(img_path)
+            image_classes.append(class_idx)
+            image_id += 1
+
+        print(f"  {class_name}: {len(image_files)} images")
+
+    if len(tiles) == 0:
+        raise ValueError(f"No images found! Please add images to {data_dir}/ folders")
+
+    tiles = np.concatenate(tiles)
+    image_ids = np.array(image_ids)
+    print(f"\n✅ Loaded {len(tiles)} tiles from {image_id} images")
+    result = (tiles, np.eye(len(class_names), dtype=np.float32)[labels], image_ids)
+    if with_splits:
+        from manifest import assign_splits
+        from train_certificate_model import load_image
+
+        # New images are pHashed from the same resized view as load_dataset(), so
+        # both input modes share one manifest and near-duplicate grouping
+        image_splits = assign_splits(
+            data_dir, image_paths,
+            lambda idx: np.stack([load_image(image_paths[i]) for i in idx]),
+            np.eye(len(class_names), dtype=np.float32)[image_classes]
+        )
+        result += (image_splits[image_ids],)
+    return result
+
+def evaluate_images(model, tiles, labels, image_ids, class_names):
+    """Image-level accuracy: each test image's tiles aggregated as in predict_tiled()
+
+    Per-tile metrics (evaluate_model) count every tile; the exported model
+    is judged per certificate. Returns image accuracy and confusion matrix.
+    """
+    from cascade import predict_batched
+
+    tile_probs = predict_batched(model, tiles)
+    cm = np.zeros((len(class_names), len(class_names)), dtype=np.int64)
+    for image_id in np.unique(image_ids):
+        members = image_ids == image_id
+        probs = aggregate_tiles(tile_probs[members])
+        cm[np.argmax(labels[members][0]), np.argmax(probs)] += 1
+
+    accuracy = np.trace(cm) / max(cm.sum(), 1)
+    print(f"\n📊 Image-level accuracy ({cm.sum()} certificates, top-{TOP_K_TILES} tiles): {accuracy:.2%}")
+    for i, class_name in enumerate(class_names):
+        total = cm[i].sum()
+        print(f"   {class_name}: {cm[i, i] / total if total else 0:.2%} ({cm[i, i]}/{total})")
+    return {'image_accuracy': float(accuracy), 'image_confusion_matrix': cm.tolist()}
+
+def save_heatmap(image, heatmap, output_path):
+    """Overlay the tile heatmap on the certificate"""
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(10, 8))
+    plt.imshow(image)
+    plt.imshow(
+        np.ma.masked_invalid(heatmap), cmap='Reds', alpha=0.45, vmin=0, vmax=1,
+        extent=(0, image.shape[1], image.shape[0], 0), interpolation='nearest'
+    )
+    plt.colorbar(label='Tamper score')
+    plt.axis('off')
+    plt.tight_layout()
+    plt.savefig(output_path)
+    plt.close()
+
+def main():
+    """Tiled verification of one or more certificate images"""
+    from train_certificate_model import CLASS_NAMES, KERAS_MODEL_PATH, LOGS_DIR
+
+    parser = argparse.ArgumentParser(description='Tiled high-resolution certificate verification')
+    parser.add_argument('images', nargs='+', type=Path, help='Certificate images to verify')
+    parser.add_argument('--model', type=Path, default=KERAS_MODEL_PATH, help='Keras model trained on tiles')
+    parser.add_argument('--heatmaps', action='store_true', help=f'Save tamper heatmaps to {LOGS_DIR}/')
+    args = parser.parse_args()
+    apply_profile('inference')
+
+    from tensorflow import keras
+
+    model = keras.models.load_model(args.model)
+
+    for image_path in args.images:
+        image = load_full_image(image_path)
+        probs, heatmap, run, total = predict_tiled(model, image)
+        verdict = CLASS_NAMES[int(np.argmax(probs))]
+
+        print(f"\n🖼️ {image_path.name} ({image.shape[1]}x{image.shape[0]})")
+        print(f"   Tiles: {run}/{total} with content")
+        print(f"   Verdict: {verdict} ({probs.max():.2%})")
+        for name, p in zip(CLASS_NAMES, probs):
+            print(f"   {name}: {p:.4f}")
+
+        if args.heatmaps:
+            LOGS_DIR.mkdir(parents=True, exist_ok=True)
+            output_path = LOGS_DIR / f'heatmap_{image_path.stem}.png'
+            save_heatmap(image, heatmap, output_path)
+            print(f"   ✅ Heatmap saved to {output_path}")
+
+if __name__ == '__main__':
+    main()
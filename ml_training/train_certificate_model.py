@@ -4,29 +4,42 @@ Train a deep learning model to detect forged certificates
 """
 
 import os
+import sys
+import time
+import argparse
+import subprocess
 import numpy as np
-import tensorflow as tf
-from tensorflow import keras
-from tensorflow.keras import layers
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report, confusion_matrix
-import matplotlib.pyplot as plt
 from pathlib import Path
 import json
 from datetime import datetime
 
+from manifest import list_images, assign_splits
+from autotune import apply_profile
+
+# TensorFlow, Keras and matplotlib are imported inside the stages that use
+# them so --help and data errors return without loading them
+
 # Configuration
 IMG_SIZE = 224
 BATCH_SIZE = 32
 EPOCHS = 50
 LEARNING_RATE = 0.0001
 NUM_CLASSES = 4
+SAMPLING_MODE = None         # Default for --sampling: 'balanced', 'weighted' or None
+HARD_EXAMPLE_MINING = False  # Bias balanced sampling towards high-loss samples
+FEATURE_LOSS_WEIGHT = 0.5    # Weight of the feature-score heads in multi-task training
 
 # Paths
 TRAIN_DIR = Path('training_data')
 MODEL_OUTPUT = Path('../public/models/certificate-detector')
 LOGS_DIR = Path('logs')
+CACHE_DIR = Path('cache')
+DATASET_CACHE = CACHE_DIR / 'dataset.npz'
+CACHE_SHARDS = CACHE_DIR / 'dataset_shards'  # One .npz per append_dataset_cache() call
+KERAS_MODEL_PATH = Path('exported') / 'certificate_model.h5'
+
+# Split assignment stored alongside cached samples
+SPLIT_TRAIN, SPLIT_VAL, SPLIT_TEST = 0, 1, 2
 
 # Class names
 CLASS_NAMES = ['authentic', 'forged', 'tampered', 'screenshot']
@@ -42,31 +55,54 @@ def setup_directories():
     
     print("✅ Directories created")
 
-def load_dataset():
-    """Load and preprocess dataset"""
-    print("\n📂 Loading dataset...")
+def load_dataset(data_dir=TRAIN_DIR, with_features=False, with_splits=False):
+    """Load and preprocess dataset
+
+    Files are listed from the data directory's manifest (see manifest.py).
+    With with_features=True also returns the feature-head targets of each
+    full-resolution image (features.extract_targets); with
+    with_splits=True also returns each image's persisted split code
+    (DUPLICATE for dropped duplicates).
+    """
+    print(f"\n📂 Loading dataset from {data_dir}...")
+    
+    listing = list_images(data_dir, CLASS_NAMES)
+    class_files = [[path for path, idx in listing if idx == class_idx] for class_idx in range(NUM_CLASSES)]
+    for class_name, image_files in zip(CLASS_NAMES, class_files):
+        print(f"  {class_name}: {len(image_files)} images")
+    
+    if not listing:
+        raise ValueError("No images found! Please add images to training_data/ folders")
+    
+    from tensorflow import keras
+    from features import extract_targets
     
     images = []
     labels = []
+    feature_scores = []
+    loaded_paths = []
     
-    for class_idx, class_name in enumerate(CLASS_NAMES):
-        class_dir = TRAIN_DIR / class_name
-        image_files = list(class_dir.glob('*.jpg')) + list(class_dir.glob('*.png'))
-        
-        print(f"  {class_name}: {len(image_files)} images")
-        
+    for class_idx, image_files in enumerate(class_files):
         for img_path in image_files:
             try:
                 # Load and preprocess image
-                img = keras.preprocessing.image.load_img(
-                    img_path, 
-                    target_size=(IMG_SIZE, IMG_SIZE)
-                )
+                if with_features:
+                    img = keras.preprocessing.image.load_img(img_path)
+                    scores = extract_targets(np.asarray(img))
+                    img = img.resize((IMG_SIZE, IMG_SIZE), 0)  # Nearest, as load_img
+                else:
+                    img = keras.preprocessing.image.load_img(
+                        img_path, 
+                        target_size=(IMG_SIZE, IMG_SIZE)
+                    )
                 img_array = keras.preprocessing.image.img_to_array(img)
                 img_array = img_array / 255.0  # Normalize
                 
                 images.append(img_array)
                 labels.append(class_idx)
+                loaded_paths.append(img_path)
+                if with_features:
+                    feature_scores.append(scores)
             except Exception as e:
                 print(f"  ⚠️ Error loading {img_path}: {e}")
     
@@ -75,15 +111,115 @@ def load_dataset():
     
     # Convert to numpy arrays
     images = np.array(images)
-    labels = keras.utils.to_categorical(labels, NUM_CLASSES)
+    labels = np.eye(NUM_CLASSES, dtype=np.float32)[labels]
     
     print(f"\n✅ Loaded {len(images)} images")
     print(f"   Shape: {images.shape}")
     
-    return images, labels
+    result = (images, labels)
+    if with_features:
+        result += (np.array(feature_scores, dtype=np.float32),)
+    if with_splits:
+        result += (assign_splits(data_dir, loaded_paths, images, labels),)
+    return result
+
+def cache_parts():
+    """Dataset cache files in load order: the full cache, then appended shards"""
+    parts = [DATASET_CACHE] if DATASET_CACHE.exists() else []
+    if CACHE_SHARDS.is_dir():
+        parts += sorted(CACHE_SHARDS.glob('*.npz'))
+    return parts
+
+def save_dataset_cache(images, labels, splits, feature_scores=None):
+    """Cache preprocessed images (as uint8) with their split assignment
+    
+    Replaces the whole cache, appended shards included: callers pass every
+    sample (full trainings reload ingested originals from training_data/).
+    """
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    arrays = {}
+    if feature_scores is not None:
+        arrays['features'] = np.asarray(feature_scores, dtype=np.float32)
+    tmp_path = DATASET_CACHE.with_name(DATASET_CACHE.stem + '.tmp.npz')
+    np.savez(
+        tmp_path,
+        images=np.round(images * 255.0).astype(np.uint8),
+        labels=np.argmax(labels, axis=1).astype(np.int8),
+        splits=np.asarray(splits, dtype=np.int8),
+        **arrays
+    )
+    os.replace(tmp_path, DATASET_CACHE)
+    for shard in cache_parts()[1:]:
+        shard.unlink()
+    print(f"✅ Dataset cache saved to {DATASET_CACHE} ({len(images)} samples)")
+
+def append_dataset_cache(images, labels, splits, feature_scores=None):
+    """Append samples as a new cache shard, so each append only writes its own samples
+    
+    Feature scores are kept only when the existing cache has them (or there is
+    no cache yet).
+    """
+    arrays = {
+        'images': np.round(np.asarray(images) * 255.0).astype(np.uint8),
+        'labels': np.argmax(labels, axis=1).astype(np.int8),
+        'splits': np.asarray(splits, dtype=np.int8)
+    }
+    if feature_scores is not None:
+        arrays['features'] = np.asarray(feature_scores, dtype=np.float32)
+    
+    parts = cache_parts()
+    if parts:
+        with np.load(parts[0]) as cache:
+            if 'features' not in cache:
+                arrays.pop('features', None)
+            elif 'features' not in arrays:
+                raise ValueError(f"{parts[0]} has feature scores; appended samples need them too")
+    
+    CACHE_SHARDS.mkdir(parents=True, exist_ok=True)
+    shard = CACHE_SHARDS / f'{time.time_ns():020d}.npz'
+    tmp_path = shard.with_name(shard.stem + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, shard)
+    print(f"✅ Dataset cache shard {shard.name}: {len(arrays['images'])} samples ({len(parts) + 1} cache files)")
+
+def load_dataset_cache(with_features=False):
+    """Load the cached dataset written by save_dataset_cache() and append_dataset_cache()"""
+    parts = cache_parts()
+    if not parts:
+        raise ValueError(f"No dataset cache at {DATASET_CACHE}. Run a full training first")
+    
+    if with_features:
+        from features import NUM_TARGETS
+    
+    images, labels, splits, feature_scores = [], [], [], []
+    for part in parts:
+        with np.load(part) as cache:
+            images.append(cache['images'])
+            labels.append(cache['labels'])
+            splits.append(cache['splits'])
+            if with_features:
+                if 'features' not in cache:
+                    raise ValueError(f"{part} has no feature scores. Run a --multitask training first")
+                if cache['features'].shape[1] != NUM_TARGETS:
+                    raise ValueError(f"{part} has outdated feature scores. Run a --multitask training again")
+                feature_scores.append(cache['features'])
+    
+    images = np.concatenate(images).astype(np.float32) / 255.0
+    labels = np.eye(NUM_CLASSES, dtype=np.float32)[np.concatenate(labels)]
+    splits = np.concatenate(splits)
+    if with_features:
+        feature_scores = np.concatenate(feature_scores)
+    
+    print(f"✅ Loaded {len(images)} cached samples from {len(parts)} file(s) in {CACHE_DIR}")
+    if with_features:
+        return images, labels, splits, feature_scores
+    return images, labels, splits
 
 def create_data_augmentation():
     """Create data augmentation pipeline"""
+    from tensorflow.keras.preprocessing.image import ImageDataGenerator
+    
     return ImageDataGenerator(
         rotation_range=10,
         width_shift_range=0.1,
@@ -94,14 +230,17 @@ def create_data_augmentation():
         fill_mode='nearest'
     )
 
-def create_model(use_transfer_learning=True):
+def create_model(use_transfer_learning=True, img_size=IMG_SIZE):
     """Create the model architecture"""
+    from tensorflow import keras
+    from tensorflow.keras import layers
+    
     print("\n🏗️ Building model...")
     
     if use_transfer_learning:
         # Use MobileNetV2 as base
         base_model = keras.applications.MobileNetV2(
-            input_shape=(IMG_SIZE, IMG_SIZE, 3),
+            input_shape=(img_size, img_size, 3),
             include_top=False,
             weights='imagenet'
         )
@@ -124,7 +263,7 @@ def create_model(use_transfer_learning=True):
     else:
         # Build from scratch
         model = keras.Sequential([
-            layers.Input(shape=(IMG_SIZE, IMG_SIZE, 3)),
+            layers.Input(shape=(img_size, img_size, 3)),
             
             # Block 1
             layers.Conv2D(32, 3, activation='relu', padding='same'),
@@ -159,24 +298,109 @@ def create_model(use_transfer_learning=True):
     
     return model
 
+def create_multitask_model(img_size=IMG_SIZE):
+    """MobileNetV2 backbone shared by the class head and feature-score heads"""
+    from tensorflow import keras
+    from tensorflow.keras import layers
+    from features import NUM_TARGETS
+    
+    print("\n🏗️ Building multi-task model...")
+    
+    base_model = keras.applications.MobileNetV2(
+        input_shape=(img_size, img_size, 3),
+        include_top=False,
+        weights='imagenet'
+    )
+    base_model.trainable = False
+    
+    inputs = keras.Input(shape=(img_size, img_size, 3))
+    x = base_model(inputs)
+    x = layers.GlobalAveragePooling2D()(x)
+    x = layers.BatchNormalization()(x)
+    x = layers.Dense(256, activation='relu')(x)
+    shared = layers.Dropout(0.5)(x)
+    
+    # Forgery class head (same as the single-task head)
+    c = layers.Dense(128, activation='relu')(shared)
+    c = layers.Dropout(0.3)(c)
+    class_output = layers.Dense(NUM_CLASSES, activation='softmax', name='class')(c)
+    
+    # features.TARGET_NAMES, each normalized to [0, 1]
+    f = layers.Dense(64, activation='relu')(shared)
+    feature_output = layers.Dense(NUM_TARGETS, activation='sigmoid', name='features')(f)
+    
+    model = keras.Model(inputs, [class_output, feature_output])
+    
+    print("✅ Using MobileNetV2 with class and feature-score heads")
+    
+    return model
+
+def is_multitask(model):
+    """True for models with the extra feature-score output"""
+    return len(model.outputs) > 1
+
+def metric_prefix(model):
+    """Keras prefixes metrics with the output name on multi-output models"""
+    return 'class_' if is_multitask(model) else ''
+
+def model_targets(model, y, feature_scores):
+    """fit() targets for single- or multi-task models"""
+    return (y, feature_scores) if is_multitask(model) else y
+
+def augmented_flow(datagen, model, X, y, feature_scores):
+    """datagen.flow() batches with model_targets() targets, plus the fit() kwargs it needs"""
+    if not is_multitask(model):
+        return datagen.flow(X, y, batch_size=BATCH_SIZE), {}
+    
+    # flow() takes a single target array: carry the feature scores as extra columns
+    num_classes = y.shape[1]
+    flow = datagen.flow(X, np.concatenate([y, feature_scores], axis=1), batch_size=BATCH_SIZE)
+    
+    def batches():
+        for x_batch, targets in flow:
+            yield x_batch, model_targets(model, targets[:, :num_classes], targets[:, num_classes:])
+    
+    return batches(), {'steps_per_epoch': len(flow)}
+
+def compile_options(model, learning_rate):
+    """Optimizer, losses and metrics for compile()"""
+    from tensorflow import keras
+    
+    class_metrics = ['accuracy', keras.metrics.Precision(), keras.metrics.Recall()]
+    if not is_multitask(model):
+        return dict(
+            optimizer=keras.optimizers.Adam(learning_rate=learning_rate),
+            loss='categorical_crossentropy',
+            metrics=class_metrics
+        )
+    
+    return dict(
+        optimizer=keras.optimizers.Adam(learning_rate=learning_rate),
+        loss={'class': 'categorical_crossentropy', 'features': 'mse'},
+        loss_weights={'class': 1.0, 'features': FEATURE_LOSS_WEIGHT},
+        metrics={'class': class_metrics, 'features': ['mae']}
+    )
+
 def compile_model(model):
     """Compile the model"""
-    model.compile(
-        optimizer=keras.optimizers.Adam(learning_rate=LEARNING_RATE),
-        loss='categorical_crossentropy',
-        metrics=['accuracy', keras.metrics.Precision(), keras.metrics.Recall()]
-    )
+    model.compile(**compile_options(model, LEARNING_RATE))
     
     print("\n📊 Model Summary:")
     model.summary()
     
     return model
 
-def create_callbacks():
+def create_callbacks(prefix=''):
     """Create training callbacks"""
+    from tensorflow import keras
+    from progressive import ElapsedTime
+    
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     
     callbacks = [
+        # Wall-clock time per epoch (logged before CSVLogger writes the row)
+        ElapsedTime(),
+        
         # Early stopping
         keras.callbacks.EarlyStopping(
             monitor='val_loss',
@@ -197,7 +421,7 @@ def create_callbacks():
         # Model checkpoint
         keras.callbacks.ModelCheckpoint(
             str(LOGS_DIR / f'best_model_{timestamp}.h5'),
-            monitor='val_accuracy',
+            monitor=f'val_{prefix}accuracy',
             save_best_only=True,
             verbose=1
         ),
@@ -216,43 +440,97 @@ def create_callbacks():
     
     return callbacks
 
-def train_model(model, X_train, y_train, X_val, y_val, use_augmentation=True):
-    """Train the model"""
+def train_model(model, X_train, y_train, X_val, y_val, use_augmentation=True,
+                f_train=None, f_val=None, sampling=SAMPLING_MODE):
+    """Train the model (f_train/f_val are feature-score targets for multi-task models)"""
+    from sampling import create_sampler
+    from progressive import report_time_to_best
+    
     print("\n🚀 Starting training...")
     print(f"   Training samples: {len(X_train)}")
     print(f"   Validation samples: {len(X_val)}")
     print(f"   Epochs: {EPOCHS}")
     print(f"   Batch size: {BATCH_SIZE}")
     
-    callbacks = create_callbacks()
+    callbacks = create_callbacks(metric_prefix(model))
+    datagen = create_data_augmentation() if use_augmentation else None
+    
+    sequence, fit_kwargs, sampler_callbacks = create_sampler(
+        X_train, y_train, BATCH_SIZE, sampling,
+        augment=datagen, hard_mining=HARD_EXAMPLE_MINING,
+        extra=f_train if is_multitask(model) else None
+    )
+    callbacks += sampler_callbacks
     
-    if use_augmentation:
+    if sequence is not None:
+        # Train on sequence batches (augmented inside the sequence)
+        history = model.fit(
+            sequence,
+            epochs=EPOCHS,
+            validation_data=(X_val, model_targets(model, y_val, f_val)),
+            callbacks=callbacks,
+            verbose=1
+        )
+    elif use_augmentation:
         # Train with data augmentation
-        datagen = create_data_augmentation()
         datagen.fit(X_train)
+        flow, flow_kwargs = augmented_flow(datagen, model, X_train, y_train, f_train)
         
         history = model.fit(
-            datagen.flow(X_train, y_train, batch_size=BATCH_SIZE),
+            flow,
             epochs=EPOCHS,
-            validation_data=(X_val, y_val),
+            validation_data=(X_val, model_targets(model, y_val, f_val)),
             callbacks=callbacks,
-            verbose=1
+            verbose=1,
+            **fit_kwargs,
+            **flow_kwargs
         )
     else:
         # Train without augmentation
         history = model.fit(
-            X_train, y_train,
+            X_train, model_targets(model, y_train, f_train),
             batch_size=BATCH_SIZE,
             epochs=EPOCHS,
-            validation_data=(X_val, y_val),
+            validation_data=(X_val, model_targets(model, y_val, f_val)),
             callbacks=callbacks,
-            verbose=1
+            verbose=1,
+            **fit_kwargs
         )
     
+    report_time_to_best(history, f'val_{metric_prefix(model)}accuracy')
+    
     return history
 
-def fine_tune_model(model, X_train, y_train, X_val, y_val):
+def train_progressive(build_model, X_train, y_train, X_val, y_val, f_train=None, f_val=None,
+                      sampling=SAMPLING_MODE):
+    """Train with progressive resizing; build_model(img_size=...) returns an uncompiled model
+    
+    Returns (model, history); the returned model is built at IMG_SIZE.
+    """
+    from progressive import fit_progressive
+    
+    print("\n🚀 Starting progressive-resizing training...")
+    print(f"   Training samples: {len(X_train)}")
+    print(f"   Validation samples: {len(X_val)}")
+    print(f"   Epochs: {EPOCHS}")
+    
+    def build(size, learning_rate):
+        model = build_model(img_size=size)
+        model.compile(**compile_options(model, learning_rate))
+        return model
+    
+    prefix = 'class_' if f_train is not None else ''
+    return fit_progressive(
+        build, X_train, y_train, X_val, y_val if f_val is None else (y_val, f_val),
+        create_callbacks(prefix), EPOCHS, BATCH_SIZE, LEARNING_RATE, sampling,
+        augment=create_data_augmentation(), hard_mining=HARD_EXAMPLE_MINING,
+        extra=f_train, monitor=f'val_{prefix}accuracy'
+    )
+
+def fine_tune_model(model, X_train, y_train, X_val, y_val, f_train=None, f_val=None):
     """Fine-tune the model by unfreezing some layers"""
+    from tensorflow.keras import layers
+    
     print("\n🔧 Fine-tuning model...")
     
     # Unfreeze the last 20 layers
@@ -261,43 +539,38 @@ def fine_tune_model(model, X_train, y_train, X_val, y_val):
             layer.trainable = True
     
     # Recompile with lower learning rate
-    model.compile(
-        optimizer=keras.optimizers.Adam(learning_rate=LEARNING_RATE / 10),
-        loss='categorical_crossentropy',
-        metrics=['accuracy', keras.metrics.Precision(), keras.metrics.Recall()]
-    )
+    model.compile(**compile_options(model, LEARNING_RATE / 10))
     
     # Train for fewer epochs
     history = model.fit(
-        X_train, y_train,
+        X_train, model_targets(model, y_train, f_train),
         batch_size=BATCH_SIZE,
         epochs=20,
-        validation_data=(X_val, y_val),
-        callbacks=create_callbacks(),
+        validation_data=(X_val, model_targets(model, y_val, f_val)),
+        callbacks=create_callbacks(metric_prefix(model)),
         verbose=1
     )
     
     return history
 
-def evaluate_model(model, X_test, y_test):
-    """Evaluate model performance"""
+def evaluate_model(model, X_test, y_test, f_test=None):
+    """Evaluate model performance in a single batched pass"""
+    import matplotlib.pyplot as plt
+    from streaming_eval import evaluate_stream, iterate_batches, plot_curves
+    
     print("\n📈 Evaluating model...")
     
-    # Get predictions
-    y_pred = model.predict(X_test)
-    y_pred_classes = np.argmax(y_pred, axis=1)
-    y_true_classes = np.argmax(y_test, axis=1)
+    # Stream predictions batch by batch
+    evaluator = evaluate_stream(
+        model, iterate_batches(X_test, y_test, features=f_test), NUM_CLASSES
+    )
     
     # Classification report
     print("\n📊 Classification Report:")
-    print(classification_report(
-        y_true_classes, 
-        y_pred_classes, 
-        target_names=CLASS_NAMES
-    ))
+    print(evaluator.report(CLASS_NAMES))
     
     # Confusion matrix
-    cm = confusion_matrix(y_true_classes, y_pred_classes)
+    cm = evaluator.confusion
     print("\n🔢 Confusion Matrix:")
     print(cm)
     
@@ -313,8 +586,11 @@ def evaluate_model(model, X_test, y_test):
     plt.xlabel('Predicted Label')
     plt.tight_layout()
     plt.savefig(LOGS_DIR / 'confusion_matrix.png')
+    plt.close()
     print(f"✅ Confusion matrix saved to {LOGS_DIR / 'confusion_matrix.png'}")
     
+    plot_curves(evaluator, CLASS_NAMES, LOGS_DIR)
+    
     # Calculate accuracy per class
     print("\n📊 Per-Class Accuracy:")
     for i, class_name in enumerate(CLASS_NAMES):
@@ -323,15 +599,35 @@ def evaluate_model(model, X_test, y_test):
         accuracy = class_correct / class_total if class_total > 0 else 0
         print(f"   {class_name}: {accuracy:.2%} ({class_correct}/{class_total})")
     
-    return y_pred, y_pred_classes
+    results = {
+        'loss': float(evaluator.loss),
+        'accuracy': float(evaluator.accuracy),
+        'precision': float(evaluator.precision),
+        'recall': float(evaluator.recall),
+        'ece': evaluator.expected_calibration_error(),
+        'confusion_matrix': cm.tolist()
+    }
+    
+    feature_mae = evaluator.feature_mae()
+    if feature_mae is not None:
+        from features import TARGET_NAMES
+        
+        print("\n📊 Feature Head MAE:")
+        for name, mae in zip(TARGET_NAMES, feature_mae):
+            print(f"   {name}: {mae:.4f}")
+        results['feature_mae'] = dict(zip(TARGET_NAMES, feature_mae.tolist()))
+    
+    return results
 
-def plot_training_history(history):
-    """Plot training history"""
+def plot_training_history(history, prefix=''):
+    """Plot training history (prefix selects the class head of multi-task models)"""
+    import matplotlib.pyplot as plt
+    
     fig, axes = plt.subplots(2, 2, figsize=(15, 10))
     
     # Accuracy
-    axes[0, 0].plot(history.history['accuracy'], label='Train')
-    axes[0, 0].plot(history.history['val_accuracy'], label='Validation')
+    axes[0, 0].plot(history.history[f'{prefix}accuracy'], label='Train')
+    axes[0, 0].plot(history.history[f'val_{prefix}accuracy'], label='Validation')
     axes[0, 0].set_title('Model Accuracy')
     axes[0, 0].set_xlabel('Epoch')
     axes[0, 0].set_ylabel('Accuracy')
@@ -348,8 +644,8 @@ def plot_training_history(history):
     axes[0, 1].grid(True)
     
     # Precision
-    axes[1, 0].plot(history.history['precision'], label='Train')
-    axes[1, 0].plot(history.history['val_precision'], label='Validation')
+    axes[1, 0].plot(history.history[f'{prefix}precision'], label='Train')
+    axes[1, 0].plot(history.history[f'val_{prefix}precision'], label='Validation')
     axes[1, 0].set_title('Model Precision')
     axes[1, 0].set_xlabel('Epoch')
     axes[1, 0].set_ylabel('Precision')
@@ -357,8 +653,8 @@ def plot_training_history(history):
     axes[1, 0].grid(True)
     
     # Recall
-    axes[1, 1].plot(history.history['recall'], label='Train')
-    axes[1, 1].plot(history.history['val_recall'], label='Validation')
+    axes[1, 1].plot(history.history[f'{prefix}recall'], label='Train')
+    axes[1, 1].plot(history.history[f'val_{prefix}recall'], label='Validation')
     axes[1, 1].set_title('Model Recall')
     axes[1, 1].set_xlabel('Epoch')
     axes[1, 1].set_ylabel('Recall')
@@ -369,54 +665,142 @@ def plot_training_history(history):
     plt.savefig(LOGS_DIR / 'training_history.png')
     print(f"✅ Training history saved to {LOGS_DIR / 'training_history.png'}")
 
-def save_model_for_tfjs(model):
+def current_input_mode():
+    """Input mode ('resize' or 'tiled') recorded for the current export"""
+    metadata_path = MODEL_OUTPUT / 'metadata.json'
+    if not metadata_path.exists():
+        return 'resize'
+    with open(metadata_path) as f:
+        return json.load(f).get('input_mode', 'resize')
+
+def require_resize_model(tool):
+    """Refuse tiled exports (and the tile cache trained with them) in tools built for resized inputs"""
+    if current_input_mode() == 'tiled':
+        raise ValueError(f"The current export is tiled; tiled models already aggregate tiles, so {tool} does not apply")
+
+def load_image(img_path):
+    """One image preprocessed like load_dataset(): RGB, nearest-resized to IMG_SIZE, in [0, 1]"""
+    from PIL import Image
+    
+    img = Image.open(img_path).convert('RGB').resize((IMG_SIZE, IMG_SIZE), Image.NEAREST)  # As load_img
+    return np.asarray(img, dtype=np.float32) / 255.0
+
+def save_model_for_tfjs(model, input_mode='resize'):
     """Save model in TensorFlow.js format"""
     print("\n💾 Saving model for TensorFlow.js...")
     
+    # Keep a Keras copy so later runs can warm-start from this export (first, so a failed
+    # conversion below does not lose the trained model)
+    KERAS_MODEL_PATH.parent.mkdir(parents=True, exist_ok=True)
+    model.save(KERAS_MODEL_PATH)
+    print(f"✅ Keras model saved to {KERAS_MODEL_PATH}")
+    
     try:
         import tensorflowjs as tfjs
-        
-        # Save in TensorFlow.js format
-        tfjs.converters.save_keras_model(model, str(MODEL_OUTPUT))
-        
-        print(f"✅ Model saved to {MODEL_OUTPUT}")
-        print(f"   Files created:")
-        print(f"   - model.json")
-        print(f"   - group1-shard1of1.bin")
-        
-        # Save metadata
-        metadata = {
-            'model_version': '1.0.0',
-            'trained_date': datetime.now().isoformat(),
-            'num_classes': NUM_CLASSES,
-            'class_names': CLASS_NAMES,
-            'input_shape': [IMG_SIZE, IMG_SIZE, 3],
-            'framework': 'TensorFlow/Keras',
-            'architecture': 'MobileNetV2 + Custom Head'
-        }
-        
-        with open(MODEL_OUTPUT / 'metadata.json', 'w') as f:
-            json.dump(metadata, f, indent=2)
-        
-        print(f"✅ Metadata saved to {MODEL_OUTPUT / 'metadata.json'}")
-        
     except ImportError:
         print("⚠️ tensorflowjs not installed. Installing...")
-        os.system('pip install tensorflowjs')
-        save_model_for_tfjs(model)
+        subprocess.run([sys.executable, '-m', 'pip', 'install', 'tensorflowjs'])
+        try:
+            import tensorflowjs as tfjs
+        except ImportError:
+            raise ImportError(
+                f"tensorflowjs could not be installed. Run: pip install tensorflowjs, then export "
+                f"{KERAS_MODEL_PATH} again"
+            ) from None
+    
+    # Save in TensorFlow.js format
+    tfjs.converters.save_keras_model(model, str(MODEL_OUTPUT))
+    
+    print(f"✅ Model saved to {MODEL_OUTPUT}")
+    print(f"   Files created:")
+    print(f"   - model.json")
+    print(f"   - group1-shard1of1.bin")
+    
+    # Save metadata
+    metadata = {
+        'model_version': '1.0.0',
+        'trained_date': datetime.now().isoformat(),
+        'num_classes': NUM_CLASSES,
+        'class_names': CLASS_NAMES,
+        'input_shape': [IMG_SIZE, IMG_SIZE, 3],
+        'framework': 'TensorFlow/Keras',
+        'architecture': 'MobileNetV2 + Custom Head',
+        'input_mode': input_mode
+    }
+    
+    if is_multitask(model):
+        from features import TARGET_NAMES
+        metadata['architecture'] = 'MobileNetV2 + Class and Feature Heads'
+        metadata['outputs'] = ['class', 'features']
+        metadata['feature_names'] = TARGET_NAMES
+    
+    if input_mode == 'tiled':
+        from tiling import TILE_SIZE, TILE_STRIDE, BLANK_STD_THRESHOLD, TOP_K_TILES
+        metadata['tiling'] = {
+            'tile_size': TILE_SIZE,
+            'tile_stride': TILE_STRIDE,
+            'blank_std_threshold': BLANK_STD_THRESHOLD,
+            'top_k_tiles': TOP_K_TILES
+        }
+    
+    with open(MODEL_OUTPUT / 'metadata.json', 'w') as f:
+        json.dump(metadata, f, indent=2)
+    
+    print(f"✅ Metadata saved to {MODEL_OUTPUT / 'metadata.json'}")
+    
+    # SavedModel (fixed input signature), ONNX and TFLite for server-side runtimes
+    from runtimes import export_runtimes
+    export_runtimes(model)
+
+def parse_args():
+    """Command-line options"""
+    parser = argparse.ArgumentParser(
+        description='Train the MobileNetV2 certificate forgery detector on training_data/'
+    )
+    parser.add_argument(
+        '--tiled', action='store_true',
+        help='Train on overlapping full-resolution tiles instead of resized images'
+    )
+    parser.add_argument(
+        '--multitask', action='store_true',
+        help='Also train feature-score heads (edge strength, text quality, compression artifact rate)'
+    )
+    parser.add_argument(
+        '--progressive', action='store_true',
+        help='Progressive resizing: start at low resolution with larger batches and step up to full size'
+    )
+    parser.add_argument(
+        '--sampling', choices=('balanced', 'weighted'), default=SAMPLING_MODE,
+        help='Rebalance classes by per-class resampling or by loss weights (default: plain shuffling)'
+    )
+    return parser.parse_args()
 
 def main():
     """Main training pipeline"""
+    args = parse_args()
+    apply_profile('training')
+    
     print("=" * 60)
     print("Certificate Forgery Detection - Model Training")
     print("=" * 60)
     
+    if args.tiled and args.multitask:
+        print("\n❌ Error: --multitask feature scores are per image; it cannot be combined with --tiled")
+        return
+    
     # Setup
     setup_directories()
     
     # Load dataset
+    feature_scores = None
     try:
-        images, labels = load_dataset()
+        if args.tiled:
+            from tiling import load_tiled_dataset
+            images, labels, image_ids, image_splits = load_tiled_dataset(TRAIN_DIR, CLASS_NAMES, with_splits=True)
+        elif args.multitask:
+            images, labels, feature_scores, image_splits = load_dataset(with_features=True, with_splits=True)
+        else:
+            images, labels, image_splits = load_dataset(with_splits=True)
     except ValueError as e:
         print(f"\n❌ Error: {e}")
         print("\n📝 Instructions:")
@@ -426,12 +810,26 @@ def main():
         print("   4. Run this script again")
         return
     
-    # Split dataset
-    X_train, X_temp, y_train, y_temp = train_test_split(
-        images, labels, test_size=0.3, random_state=42, stratify=labels
+    # Splits persisted in the manifest: duplicates dropped, near-duplicates never cross
+    # (tiles take their source image's split)
+    keep_idx = np.flatnonzero(image_splits >= 0)
+    train_idx, val_idx, test_idx = (
+        np.flatnonzero(image_splits == code) for code in (SPLIT_TRAIN, SPLIT_VAL, SPLIT_TEST)
     )
-    X_val, X_test, y_val, y_test = train_test_split(
-        X_temp, y_temp, test_size=0.5, random_state=42, stratify=y_temp
+    X_train, y_train = images[train_idx], labels[train_idx]
+    X_val, y_val = images[val_idx], labels[val_idx]
+    X_test, y_test = images[test_idx], labels[test_idx]
+    f_train = f_val = f_test = None
+    if feature_scores is not None:
+        f_train, f_val, f_test = feature_scores[train_idx], feature_scores[val_idx], feature_scores[test_idx]
+    
+    # Cache the split so incremental runs can replay and gate on it
+    splits = np.full(len(images), SPLIT_TRAIN)
+    splits[val_idx] = SPLIT_VAL
+    splits[test_idx] = SPLIT_TEST
+    save_dataset_cache(
+        images[keep_idx], labels[keep_idx], splits[keep_idx],
+        feature_scores[keep_idx] if feature_scores is not None else None
     )
     
     print(f"\n📊 Dataset split:")
@@ -439,26 +837,35 @@ def main():
     print(f"   Validation: {len(X_val)} samples")
     print(f"   Test: {len(X_test)} samples")
     
-    # Create model
-    model = create_model(use_transfer_learning=True)
-    model = compile_model(model)
-    
-    # Train model
-    history = train_model(model, X_train, y_train, X_val, y_val, use_augmentation=True)
+    # Create and train model
+    build_model = create_multitask_model if args.multitask else create_model
+    if args.progressive:
+        model, history = train_progressive(
+            build_model, X_train, y_train, X_val, y_val, f_train, f_val, sampling=args.sampling
+        )
+    else:
+        model = compile_model(build_model())
+        history = train_model(
+            model, X_train, y_train, X_val, y_val, use_augmentation=True,
+            f_train=f_train, f_val=f_val, sampling=args.sampling
+        )
     
     # Fine-tune (optional)
     print("\n❓ Fine-tune model? (y/n): ", end='')
     if input().lower() == 'y':
-        history_ft = fine_tune_model(model, X_train, y_train, X_val, y_val)
+        history_ft = fine_tune_model(model, X_train, y_train, X_val, y_val, f_train, f_val)
     
     # Evaluate
-    evaluate_model(model, X_test, y_test)
+    evaluate_model(model, X_test, y_test, f_test)
+    if args.tiled:
+        from tiling import evaluate_images
+        evaluate_images(model, X_test, y_test, image_ids[test_idx], CLASS_NAMES)
     
     # Plot history
-    plot_training_history(history)
+    plot_training_history(history, metric_prefix(model))
     
     # Save model
-    save_model_for_tfjs(model)
+    save_model_for_tfjs(model, 'tiled' if args.tiled else 'resize')
     
     print("\n" + "=" * 60)
     print("✅ Training Complete!")
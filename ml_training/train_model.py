@@ -3,17 +3,19 @@ Certificate Forgery Detection Model Training
 Trains a CNN model to detect authentic vs forged certificates
 """
 
-import os
+import sys
 import json
+import argparse
+import subprocess
 import numpy as np
 from pathlib import Path
-from PIL import Image
-import tensorflow as tf
-from tensorflow import keras
-from tensorflow.keras import layers
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report, confusion_matrix
-import matplotlib.pyplot as plt
+
+from dedupe import SPLIT_CODES
+from manifest import list_images, assign_splits
+from autotune import apply_profile
+
+# PIL, TensorFlow and matplotlib are imported inside the stages that use
+# them so --help and data errors return without loading them
 
 # Configuration
 IMG_SIZE = 224
@@ -21,11 +23,16 @@ BATCH_SIZE = 32
 EPOCHS = 50
 NUM_CLASSES = 4  # authentic, forged, tampered, screenshot
 LEARNING_RATE = 0.001
+SAMPLING_MODE = None         # Default for --sampling: 'balanced', 'weighted' or None
+HARD_EXAMPLE_MINING = False  # Bias balanced sampling towards high-loss samples
+PRUNING_EPOCHS = 10          # Fine-tuning epochs with --prune
+PRUNED_QUANTIZATION = 'uint8'  # TF.js weight dtype for pruned exports ('uint8', 'float16' or None)
 
 # Paths
 TRAIN_DIR = Path('training_data')
 MODEL_OUTPUT = Path('../public/models/certificate-detector')
 CHECKPOINT_DIR = Path('checkpoints')
+KERAS_EXPORT_PATH = CHECKPOINT_DIR / 'final_model.h5'  # Keras copy of the exported (possibly pruned) model
 
 # Class labels
 CLASS_NAMES = ['authentic', 'forged', 'tampered', 'screenshot']
@@ -43,6 +50,8 @@ def create_directories():
 
 def load_and_preprocess_image(image_path, label):
     """Load and preprocess a single image"""
+    from PIL import Image
+    
     try:
         img = Image.open(image_path)
         img = img.convert('RGB')
@@ -53,24 +62,25 @@ def load_and_preprocess_image(image_path, label):
         print(f"Error loading {image_path}: {e}")
         return None, None
 
-def load_dataset():
+def load_dataset(tiled=False):
     """Load and prepare the dataset"""
+    if tiled:
+        return load_tiled_dataset()
+    
     print("Loading dataset...")
     
     images = []
     labels = []
+    loaded_paths = []
     
+    # Listed from the persistent manifest instead of globbing (see manifest.py)
+    listing = list_images(TRAIN_DIR, CLASS_NAMES)
     for class_idx, class_name in enumerate(CLASS_NAMES):
-        class_dir = TRAIN_DIR / class_name
-        
-        if not class_dir.exists():
-            print(f"⚠️  Warning: {class_dir} does not exist")
+        image_files = [path for path, idx in listing if idx == class_idx]
+        if not image_files:
+            print(f"⚠️  Warning: no images in {TRAIN_DIR / class_name}")
             continue
         
-        image_files = list(class_dir.glob('*.jpg')) + \
-                     list(class_dir.glob('*.jpeg')) + \
-                     list(class_dir.glob('*.png'))
-        
         print(f"Loading {len(image_files)} images from {class_name}...")
         
         for img_path in image_files:
@@ -78,24 +88,24 @@ def load_dataset():
             if img_array is not None:
                 images.append(img_array)
                 labels.append(label)
+                loaded_paths.append(img_path)
     
     if len(images) == 0:
         raise ValueError("No images found! Please add training data to training_data/ directory")
     
     # Convert to numpy arrays
     images = np.array(images)
-    labels = keras.utils.to_categorical(labels, NUM_CLASSES)
+    labels = np.eye(NUM_CLASSES, dtype=np.float32)[labels]
     
     print(f"✅ Loaded {len(images)} images")
     print(f"   Shape: {images.shape}")
     
-    # Split into train/validation/test
-    X_train, X_temp, y_train, y_temp = train_test_split(
-        images, labels, test_size=0.3, random_state=42, stratify=labels
-    )
-    X_val, X_test, y_val, y_test = train_test_split(
-        X_temp, y_temp, test_size=0.5, random_state=42, stratify=y_temp
-    )
+    # Reuse the manifest's splits; new images are deduplicated and split by near-duplicate group
+    splits = assign_splits(TRAIN_DIR, loaded_paths, images, labels)
+    train_idx, val_idx, test_idx = (np.flatnonzero(splits == code) for code in SPLIT_CODES)
+    X_train, y_train = images[train_idx], labels[train_idx]
+    X_val, y_val = images[val_idx], labels[val_idx]
+    X_test, y_test = images[test_idx], labels[test_idx]
     
     print(f"   Training: {len(X_train)}")
     print(f"   Validation: {len(X_val)}")
@@ -103,13 +113,37 @@ def load_dataset():
     
     return (X_train, y_train), (X_val, y_val), (X_test, y_test)
 
-def create_model():
+def load_tiled_dataset():
+    """Load full-resolution tiles, each taking its certificate's split from the manifest
+    
+    Also returns the test tiles' image ids for image-level evaluation.
+    """
+    from tiling import load_tiled_dataset as load_tiles
+    
+    tiles, labels, image_ids, splits = load_tiles(TRAIN_DIR, CLASS_NAMES, with_splits=True)
+    train_idx, val_idx, test_idx = (np.flatnonzero(splits == code) for code in SPLIT_CODES)
+    
+    print(f"   Training: {len(train_idx)} tiles")
+    print(f"   Validation: {len(val_idx)} tiles")
+    print(f"   Test: {len(test_idx)} tiles")
+    
+    return (
+        (tiles[train_idx], labels[train_idx]),
+        (tiles[val_idx], labels[val_idx]),
+        (tiles[test_idx], labels[test_idx]),
+        image_ids[test_idx]
+    )
+
+def create_model(img_size=IMG_SIZE, learning_rate=LEARNING_RATE):
     """Create CNN model architecture"""
+    from tensorflow import keras
+    from tensorflow.keras import layers
+    
     print("Creating model...")
     
     model = keras.Sequential([
         # Input layer
-        layers.Input(shape=(IMG_SIZE, IMG_SIZE, 3)),
+        layers.Input(shape=(img_size, img_size, 3)),
         
         # Data augmentation (built into model)
         layers.RandomFlip("horizontal"),
@@ -153,7 +187,7 @@ def create_model():
     
     # Compile model
     model.compile(
-        optimizer=keras.optimizers.Adam(learning_rate=LEARNING_RATE),
+        optimizer=keras.optimizers.Adam(learning_rate=learning_rate),
         loss='categorical_crossentropy',
         metrics=['accuracy', keras.metrics.Precision(), keras.metrics.Recall()]
     )
@@ -165,7 +199,13 @@ def create_model():
 
 def create_callbacks():
     """Create training callbacks"""
+    from tensorflow import keras
+    from progressive import ElapsedTime
+    
     callbacks = [
+        # Wall-clock time per epoch (time-to-accuracy comparisons)
+        ElapsedTime(),
+        
         # Early stopping
         keras.callbacks.EarlyStopping(
             monitor='val_loss',
@@ -202,6 +242,8 @@ def create_callbacks():
 
 def plot_training_history(history):
     """Plot training history"""
+    import matplotlib.pyplot as plt
+    
     fig, axes = plt.subplots(2, 2, figsize=(15, 10))
     
     # Accuracy
@@ -245,24 +287,21 @@ def plot_training_history(history):
     print(f"✅ Training history saved to {MODEL_OUTPUT / 'training_history.png'}")
 
 def evaluate_model(model, X_test, y_test):
-    """Evaluate model on test set"""
+    """Evaluate model on test set in a single batched pass"""
+    import matplotlib.pyplot as plt
+    from streaming_eval import evaluate_stream, iterate_batches, plot_curves
+    
     print("\nEvaluating model on test set...")
     
-    # Predictions
-    y_pred = model.predict(X_test)
-    y_pred_classes = np.argmax(y_pred, axis=1)
-    y_true_classes = np.argmax(y_test, axis=1)
+    # Predictions (streamed, metrics accumulated per batch)
+    evaluator = evaluate_stream(model, iterate_batches(X_test, y_test), NUM_CLASSES)
     
     # Classification report
     print("\nClassification Report:")
-    print(classification_report(
-        y_true_classes,
-        y_pred_classes,
-        target_names=CLASS_NAMES
-    ))
+    print(evaluator.report(CLASS_NAMES))
     
     # Confusion matrix
-    cm = confusion_matrix(y_true_classes, y_pred_classes)
+    cm = evaluator.confusion
     print("\nConfusion Matrix:")
     print(cm)
     
@@ -287,43 +326,110 @@ def evaluate_model(model, X_test, y_test):
     plt.xlabel('Predicted label')
     plt.tight_layout()
     plt.savefig(MODEL_OUTPUT / 'confusion_matrix.png')
+    plt.close()
     print(f"✅ Confusion matrix saved to {MODEL_OUTPUT / 'confusion_matrix.png'}")
     
-    # Calculate accuracy
-    test_loss, test_acc, test_precision, test_recall = model.evaluate(X_test, y_test, verbose=0)
-    print(f"\n✅ Test Accuracy: {test_acc:.4f}")
-    print(f"✅ Test Precision: {test_precision:.4f}")
-    print(f"✅ Test Recall: {test_recall:.4f}")
+    plot_curves(evaluator, CLASS_NAMES, MODEL_OUTPUT)
+    
+    # Metrics come from the same pass (no second model.evaluate)
+    print(f"\n✅ Test Accuracy: {evaluator.accuracy:.4f}")
+    print(f"✅ Test Precision: {evaluator.precision:.4f}")
+    print(f"✅ Test Recall: {evaluator.recall:.4f}")
+    print(f"✅ Expected Calibration Error: {evaluator.expected_calibration_error():.4f}")
     
     return {
-        'accuracy': float(test_acc),
-        'precision': float(test_precision),
-        'recall': float(test_recall),
+        'loss': float(evaluator.loss),
+        'accuracy': float(evaluator.accuracy),
+        'precision': float(evaluator.precision),
+        'recall': float(evaluator.recall),
+        'ece': evaluator.expected_calibration_error(),
         'confusion_matrix': cm.tolist()
     }
 
-def convert_to_tfjs(model):
-    """Convert model to TensorFlow.js format"""
+def prune_model(model, X_train, y_train, X_val, y_val, X_test, y_test, dense_results,
+                sampling=SAMPLING_MODE):
+    """Fine-tune the trained model with magnitude pruning and compare with the dense one
+    
+    Returns the pruned model's test results with a 'pruning' report attached.
+    """
+    from tensorflow import keras
+    from pruning import MagnitudePruning, measure_model, print_report
+    from sampling import create_sampler
+    
+    print("\n" + "=" * 60)
+    print("Pruning fine-tune...")
+    print("=" * 60)
+    
+    dense = measure_model(model, CHECKPOINT_DIR / 'dense_model.h5', X_test)
+    dense['accuracy'] = dense_results['accuracy']
+    
+    model.compile(
+        optimizer=keras.optimizers.Adam(learning_rate=LEARNING_RATE / 10),
+        loss='categorical_crossentropy',
+        metrics=['accuracy', keras.metrics.Precision(), keras.metrics.Recall()]
+    )
+    
+    sequence, fit_kwargs, callbacks = create_sampler(X_train, y_train, BATCH_SIZE, sampling)
+    steps_per_epoch = len(sequence) if sequence is not None else int(np.ceil(len(X_train) / BATCH_SIZE))
+    callbacks.append(MagnitudePruning(PRUNING_EPOCHS * steps_per_epoch))
+    
+    if sequence is not None:
+        model.fit(sequence, epochs=PRUNING_EPOCHS, validation_data=(X_val, y_val),
+                  callbacks=callbacks, verbose=1)
+    else:
+        model.fit(X_train, y_train, batch_size=BATCH_SIZE, epochs=PRUNING_EPOCHS,
+                  validation_data=(X_val, y_val), callbacks=callbacks, verbose=1, **fit_kwargs)
+    
+    test_results = evaluate_model(model, X_test, y_test)
+    pruned = measure_model(model, CHECKPOINT_DIR / 'pruned_model.h5', X_test)
+    pruned['accuracy'] = test_results['accuracy']
+    
+    print_report(dense, pruned)
+    test_results['pruning'] = {'dense': dense, 'pruned': pruned}
+    return test_results
+
+def convert_to_tfjs(model, quantization=None):
+    """Convert model to TensorFlow.js format
+    
+    With quantization ('uint8' or 'float16') every weight is stored at that
+    width. Returns the raw and gzipped size of the weight shards.
+    """
     print("\nConverting model to TensorFlow.js format...")
     
+    # Keras copy first, so a failed conversion below does not lose the trained model
+    model.save(KERAS_EXPORT_PATH)
+    print(f"✅ Keras model saved to {KERAS_EXPORT_PATH}")
+    
     try:
         import tensorflowjs as tfjs
-        
-        # Save as TensorFlow.js model
-        tfjs.converters.save_keras_model(model, str(MODEL_OUTPUT))
-        print(f"✅ Model converted and saved to {MODEL_OUTPUT}")
-        
-        # List generated files
-        print("\nGenerated files:")
-        for file in MODEL_OUTPUT.glob('*'):
-            print(f"   - {file.name}")
-        
     except ImportError:
         print("⚠️  tensorflowjs not installed. Installing...")
-        os.system('pip install tensorflowjs')
-        convert_to_tfjs(model)
+        subprocess.run([sys.executable, '-m', 'pip', 'install', 'tensorflowjs'])
+        try:
+            import tensorflowjs as tfjs
+        except ImportError:
+            raise ImportError(
+                f"tensorflowjs could not be installed. Run: pip install tensorflowjs, then convert "
+                f"{KERAS_EXPORT_PATH} with tensorflowjs_converter"
+            ) from None
+    
+    # Save as TensorFlow.js model
+    options = {'quantization_dtype_map': {quantization: '*'}} if quantization else {}
+    tfjs.converters.save_keras_model(model, str(MODEL_OUTPUT), **options)
+    print(f"✅ Model converted and saved to {MODEL_OUTPUT}" + (f" ({quantization} weights)" if quantization else ''))
+    
+    # List generated files
+    print("\nGenerated files:")
+    for file in MODEL_OUTPUT.glob('*'):
+        print(f"   - {file.name}")
+    
+    from pruning import shard_sizes
+    
+    size, gzip_size = shard_sizes(MODEL_OUTPUT)
+    print(f"   Weights: {size / 1e6:.2f} MB ({gzip_size / 1e6:.2f} MB gzipped, as served)")
+    return {'quantization': quantization, 'size_bytes': size, 'gzip_bytes': gzip_size}
 
-def save_metadata(history, test_results):
+def save_metadata(history, test_results, input_mode='resize'):
     """Save model metadata"""
     metadata = {
         'model_version': '1.0.0',
@@ -331,6 +437,7 @@ def save_metadata(history, test_results):
         'image_size': IMG_SIZE,
         'num_classes': NUM_CLASSES,
         'class_names': CLASS_NAMES,
+        'input_mode': input_mode,
         'epochs_trained': len(history.history['accuracy']),
         'final_train_accuracy': float(history.history['accuracy'][-1]),
         'final_val_accuracy': float(history.history['val_accuracy'][-1]),
@@ -348,8 +455,35 @@ def save_metadata(history, test_results):
     
     print(f"✅ Metadata saved to {MODEL_OUTPUT / 'metadata.json'}")
 
+def parse_args():
+    """Command-line options"""
+    parser = argparse.ArgumentParser(
+        description='Train the custom CNN certificate forgery detector on training_data/'
+    )
+    parser.add_argument(
+        '--tiled', action='store_true',
+        help='Train on overlapping full-resolution tiles instead of resized images'
+    )
+    parser.add_argument(
+        '--progressive', action='store_true',
+        help='Progressive resizing: start at low resolution with larger batches and step up to full size'
+    )
+    parser.add_argument(
+        '--prune', action='store_true',
+        help=f'Fine-tune with magnitude pruning for {PRUNING_EPOCHS} epochs and export it with '
+             f'{PRUNED_QUANTIZATION} weights'
+    )
+    parser.add_argument(
+        '--sampling', choices=('balanced', 'weighted'), default=SAMPLING_MODE,
+        help='Rebalance classes by per-class resampling or by loss weights (default: plain shuffling)'
+    )
+    return parser.parse_args()
+
 def train():
     """Main training function"""
+    args = parse_args()
+    apply_profile('training')
+    
     print("=" * 60)
     print("Certificate Forgery Detection Model Training")
     print("=" * 60)
@@ -359,7 +493,10 @@ def train():
     
     # Load dataset
     try:
-        (X_train, y_train), (X_val, y_val), (X_test, y_test) = load_dataset()
+        if args.tiled:
+            (X_train, y_train), (X_val, y_val), (X_test, y_test), test_image_ids = load_tiled_dataset()
+        else:
+            (X_train, y_train), (X_val, y_val), (X_test, y_test) = load_dataset()
     except ValueError as e:
         print(f"\n❌ Error: {e}")
         print("\nTo train the model, you need to add training data:")
@@ -368,37 +505,82 @@ def train():
         print(f"   3. Minimum 100 images per category (more is better)")
         return
     
-    # Create model
-    model = create_model()
+    from sampling import create_sampler
+    from progressive import fit_progressive, report_time_to_best
     
     # Create callbacks
     callbacks = create_callbacks()
     
-    # Train model
-    print("\n" + "=" * 60)
-    print("Starting training...")
-    print("=" * 60)
-    
-    history = model.fit(
-        X_train, y_train,
-        batch_size=BATCH_SIZE,
-        epochs=EPOCHS,
-        validation_data=(X_val, y_val),
-        callbacks=callbacks,
-        verbose=1
-    )
+    if args.progressive:
+        print("\n" + "=" * 60)
+        print("Starting progressive-resizing training...")
+        print("=" * 60)
+        
+        # One model per resolution; the final stage is built at IMG_SIZE
+        model, history = fit_progressive(
+            create_model, X_train, y_train, X_val, y_val, callbacks,
+            EPOCHS, BATCH_SIZE, LEARNING_RATE, args.sampling,
+            hard_mining=HARD_EXAMPLE_MINING
+        )
+    else:
+        # Create model
+        model = create_model()
+        
+        # Rebalance classes (augmentation is built into the model)
+        sequence, fit_kwargs, sampler_callbacks = create_sampler(
+            X_train, y_train, BATCH_SIZE, args.sampling, hard_mining=HARD_EXAMPLE_MINING
+        )
+        callbacks += sampler_callbacks
+        
+        # Train model
+        print("\n" + "=" * 60)
+        print("Starting training...")
+        print("=" * 60)
+        
+        if sequence is not None:
+            history = model.fit(
+                sequence,
+                epochs=EPOCHS,
+                validation_data=(X_val, y_val),
+                callbacks=callbacks,
+                verbose=1
+            )
+        else:
+            history = model.fit(
+                X_train, y_train,
+                batch_size=BATCH_SIZE,
+                epochs=EPOCHS,
+                validation_data=(X_val, y_val),
+                callbacks=callbacks,
+                verbose=1,
+                **fit_kwargs
+            )
+        
+        report_time_to_best(history, 'val_accuracy')
     
     # Plot training history
     plot_training_history(history)
     
     # Evaluate on test set
     test_results = evaluate_model(model, X_test, y_test)
+    if args.tiled:
+        from tiling import evaluate_images
+        test_results.update(evaluate_images(model, X_test, y_test, test_image_ids, CLASS_NAMES))
+    
+    # Optional pruning fine-tune; the sparse model is what gets exported
+    if args.prune:
+        test_results = prune_model(
+            model, X_train, y_train, X_val, y_val, X_test, y_test, test_results, args.sampling
+        )
     
-    # Convert to TensorFlow.js
-    convert_to_tfjs(model)
+    # Convert to TensorFlow.js; pruned weights ship quantized, which is what
+    # turns the zeroed weights into a smaller download
+    tfjs_sizes = convert_to_tfjs(model, PRUNED_QUANTIZATION if args.prune else None)
+    if args.prune:
+        test_results['pruning']['tfjs'] = tfjs_sizes
     
     # Save metadata
-    save_metadata(history, test_results)
+    save_metadata(history, test_results, 'tiled' if args.tiled else 'resize')
     
     print("\n" + "=" * 60)
     print("✅ Training Complete!")
@@ -0,0 +1,271 @@
+"""
+Confidence-gated test-time augmentation
+Images whose first-pass confidence falls in an uncertainty band calibrated
+on the validation split get K augmented views (flip, small crop, JPEG
+re-quality) in one batched forward pass, averaged with the first pass
+"""
+
+import io
+import json
+import time
+import argparse
+import numpy as np
+from pathlib import Path
+
+from autotune import apply_profile
+from cascade import StageStats, predict_batched
+from train_certificate_model import (
+    CLASS_NAMES, KERAS_MODEL_PATH, MODEL_OUTPUT, SPLIT_VAL, SPLIT_TEST, load_dataset_cache,
+    load_image, require_resize_model
+)
+
+# Configuration
+TTA_CONFIG = Path('exported') / 'tta.json'
+TTA_VIEWS = ['hflip', 'crop', 'jpeg']  # Averaged with the un-augmented first pass
+CROP_FRACTION = 0.9            # Centre crop kept before resizing back to full size
+JPEG_QUALITY = 70              # Re-encoding quality of the 'jpeg' view
+MAX_ACCURACY_DROP = 0.002      # Allowed validation accuracy loss versus TTA on every image
+BAND_QUANTILES = 41            # Candidate band edges per side (confidence quantiles)
+
+def _resize(image, size):
+    from PIL import Image
+
+    return np.asarray(
+        Image.fromarray(image).resize(size, Image.BILINEAR), dtype=np.float32
+    ) / 255.0
+
+def augment_view(image, view):
+    """One augmented copy of an (H, W, 3) image in [0, 1]"""
+    if view == 'hflip':
+        return image[:, ::-1]
+    pixels = (np.clip(image, 0, 1) * 255).round().astype(np.uint8)
+    h, w = pixels.shape[:2]
+    if view == 'crop':
+        ch, cw = round(h * CROP_FRACTION), round(w * CROP_FRACTION)
+        top, left = (h - ch) // 2, (w - cw) // 2
+        return _resize(pixels[top:top + ch, left:left + cw], (w, h))
+    if view == 'jpeg':
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, format='JPEG', quality=JPEG_QUALITY)
+        buffer.seek(0)
+        return np.asarray(Image.open(buffer).convert('RGB'), dtype=np.float32) / 255.0
+    raise ValueError(f"Unknown TTA view '{view}' (expected one of hflip, crop, jpeg)")
+
+def augmented_batch(images, views=TTA_VIEWS):
+    """(N * K, H, W, 3) batch: every view of image 0, then of image 1, ..."""
+    return np.stack([augment_view(image, view) for image in images for view in views]).astype(np.float32)
+
+def tta_probs(model, images, first_probs, views=TTA_VIEWS):
+    """First-pass probabilities averaged with those of the augmented views"""
+    if len(images) == 0:
+        return first_probs
+    view_probs = predict_batched(model, augmented_batch(images, views))
+    view_probs = view_probs.reshape(len(images), len(views), -1)
+    return (first_probs + view_probs.sum(axis=1)) / (len(views) + 1)
+
+def in_band(confidence, band):
+    low, high = band
+    return (confidence >= low) & (confidence < high)
+
+class TTAPredictor:
+    """Single forward pass, plus batched TTA for images inside the band"""
+
+    def __init__(self, model, band, views=TTA_VIEWS):
+        self.model = model
+        self.band = band
+        self.views = views
+        self.stages = [StageStats('single'), StageStats('tta')]
+
+    def predict(self, images):
+        """Probabilities and whether TTA ran, per image"""
+        single, tta = self.stages
+
+        start = time.perf_counter()
+        probs = predict_batched(self.model, images)
+        triggered = in_band(probs.max(axis=1), self.band)
+        single.seconds += time.perf_counter() - start
+        single.seen += len(images)
+        single.exits += int((~triggered).sum())
+
+        uncertain = np.flatnonzero(triggered)
+        if len(uncertain):
+            start = time.perf_counter()
+            probs[uncertain] = tta_probs(self.model, images[uncertain], probs[uncertain], self.views)
+            tta.seconds += time.perf_counter() - start
+            tta.seen += len(uncertain)
+            tta.exits += len(uncertain)
+
+        return probs, triggered
+
+    def report(self):
+        print(f"\n⏱️ TTA stages (band {self.band[0]:.3f}-{self.band[1]:.3f}, {len(self.views)} views):")
+        for stage in self.stages:
+            print(stage.report())
+
+def calibrate_band(first_probs, all_tta_probs, y_true):
+    """Band with the lowest trigger rate whose accuracy stays within MAX_ACCURACY_DROP of TTA everywhere"""
+    true_classes = np.argmax(y_true, axis=1)
+    first_correct = np.argmax(first_probs, axis=1) == true_classes
+    tta_correct = np.argmax(all_tta_probs, axis=1) == true_classes
+    tta_acc = tta_correct.mean()
+
+    confidence = first_probs.max(axis=1)
+    edges = np.unique(np.concatenate([
+        np.quantile(confidence, np.linspace(0, 1, BAND_QUANTILES)), [0.0, np.nextafter(1.0, 2.0)]
+    ]))
+    best = None
+    for i, low in enumerate(edges):
+        for high in edges[i:]:
+            triggered = in_band(confidence, (low, high))
+            accuracy = np.where(triggered, tta_correct, first_correct).mean()
+            if accuracy >= tta_acc - MAX_ACCURACY_DROP:
+                rate = triggered.mean()
+                if best is None or rate < best[2] or (rate == best[2] and high - low < best[1] - best[0]):
+                    best = (float(low), float(high), float(rate), float(accuracy))
+    # The full band [0, 1] always qualifies
+    return best + (float(first_correct.mean()), float(tta_acc))
+
+def load_model():
+    require_resize_model('TTA')
+    if not KERAS_MODEL_PATH.exists():
+        raise ValueError(f"Model not found at {KERAS_MODEL_PATH}. Run: python train_certificate_model.py")
+
+    from tensorflow import keras
+
+    return keras.models.load_model(KERAS_MODEL_PATH)
+
+def load_predictor():
+    """Model plus the calibrated band from TTA_CONFIG"""
+    require_resize_model('TTA')
+    if not TTA_CONFIG.exists():
+        raise ValueError(f"No calibration at {TTA_CONFIG}. Run: python tta.py calibrate")
+    with open(TTA_CONFIG) as f:
+        config = json.load(f)
+    return TTAPredictor(load_model(), tuple(config['band']), config['views'])
+
+def publish_band(config):
+    """Add the band to the browser model's metadata.json so mlModel.ts can gate TTA"""
+    metadata_path = MODEL_OUTPUT / 'metadata.json'
+    if not metadata_path.exists():
+        print(f"⚠️ {metadata_path} not found; export the model, then calibrate again for browser TTA")
+        return
+    with open(metadata_path) as f:
+        metadata = json.load(f)
+    if metadata.get('input_mode') == 'tiled':
+        print("⚠️ Tiled models already aggregate tiles; browser TTA stays off")
+        return
+    metadata['tta'] = {key: config[key] for key in ('band', 'views', 'crop_fraction', 'jpeg_quality')}
+    with open(metadata_path, 'w') as f:
+        json.dump(metadata, f, indent=2)
+    print(f"✅ Band published to {metadata_path}")
+
+def calibrate():
+    """Tune the uncertainty band on the validation split"""
+    print("\n🎯 Calibrating TTA band on validation split...")
+    require_resize_model('TTA')
+    images, labels, splits = load_dataset_cache()
+    X_val, y_val = images[splits == SPLIT_VAL], labels[splits == SPLIT_VAL]
+    if len(X_val) == 0:
+        raise ValueError("The cached dataset has no validation split. Run: python train_certificate_model.py")
+
+    model = load_model()
+    first_probs = predict_batched(model, X_val)
+    low, high, trigger_rate, accuracy, single_acc, tta_acc = calibrate_band(
+        first_probs, tta_probs(model, X_val, first_probs), y_val
+    )
+
+    config = {
+        'band': [low, high],
+        'views': TTA_VIEWS,
+        'crop_fraction': CROP_FRACTION,
+        'jpeg_quality': JPEG_QUALITY,
+        'validation_samples': int(len(X_val)),
+        'validation_trigger_rate': trigger_rate,
+        'validation_accuracy': accuracy,
+        'single_pass_validation_accuracy': single_acc,
+        'full_tta_validation_accuracy': tta_acc,
+        'max_accuracy_drop': MAX_ACCURACY_DROP,
+        'calibrated_date': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+    TTA_CONFIG.parent.mkdir(parents=True, exist_ok=True)
+    with open(TTA_CONFIG, 'w') as f:
+        json.dump(config, f, indent=2)
+
+    print(f"✅ Band: confidence {low:.4f}-{high:.4f}")
+    print(f"   Trigger rate: {trigger_rate:.1%}")
+    print(f"   Accuracy: {accuracy:.2%} (single pass: {single_acc:.2%}, TTA everywhere: {tta_acc:.2%})")
+    print(f"✅ Calibration saved to {TTA_CONFIG}")
+    publish_band(config)
+
+def evaluate():
+    """Compare gated TTA with a single pass and with TTA on every image on the test split"""
+    print("\n📈 Evaluating gated TTA on test split...")
+    require_resize_model('TTA')
+    images, labels, splits = load_dataset_cache()
+    X_test, y_test = images[splits == SPLIT_TEST], labels[splits == SPLIT_TEST]
+
+    predictor = load_predictor()
+    probs, _ = predictor.predict(X_test)
+
+    start = time.perf_counter()
+    first_probs = predict_batched(predictor.model, X_test)
+    single_ms = 1000 * (time.perf_counter() - start) / max(len(X_test), 1)
+    start = time.perf_counter()
+    all_probs = tta_probs(predictor.model, X_test, first_probs, predictor.views)
+    full_ms = single_ms + 1000 * (time.perf_counter() - start) / max(len(X_test), 1)
+
+    true_classes = np.argmax(y_test, axis=1)
+    gated_ms = 1000 * sum(stage.seconds for stage in predictor.stages) / max(len(X_test), 1)
+
+    def accuracy(p):
+        return np.mean(np.argmax(p, axis=1) == true_classes)
+
+    print(f"\n📊 Accuracy: gated {accuracy(probs):.2%}, single pass {accuracy(first_probs):.2%}, "
+          f"TTA everywhere {accuracy(all_probs):.2%}")
+    print(f"   Latency: gated {gated_ms:.2f} ms/image, single pass {single_ms:.2f} ms/image, "
+          f"TTA everywhere {full_ms:.2f} ms/image")
+    predictor.report()
+
+def verify(image_paths):
+    """Run gated TTA on individual certificate images, preprocessed as in training"""
+    predictor = load_predictor()
+    loaded = []
+    for path in image_paths:
+        try:
+            loaded.append((path, load_image(path)))
+        except Exception as e:
+            print(f"⚠️ Error loading {path}: {e}")
+    if not loaded:
+        return
+
+    probs, triggered = predictor.predict(np.stack([img for _, img in loaded]).astype(np.float32))
+    for (path, _), p, tta in zip(loaded, probs, triggered):
+        verdict = CLASS_NAMES[int(np.argmax(p))]
+        print(f"🖼️ {path.name}: {verdict} ({p.max():.2%}){' after TTA' if tta else ''}")
+    predictor.report()
+
+def main():
+    """TTA command-line entry point"""
+    parser = argparse.ArgumentParser(description='Confidence-gated test-time augmentation')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('calibrate', help='Tune the uncertainty band on the validation split')
+    subparsers.add_parser('evaluate', help='Accuracy and latency against single pass and full TTA on the test split')
+    verify_parser = subparsers.add_parser('verify', help='Verify certificate images')
+    verify_parser.add_argument('images', nargs='+', type=Path)
+    args = parser.parse_args()
+    apply_profile('inference')
+
+    try:
+        if args.command == 'calibrate':
+            calibrate()
+        elif args.command == 'evaluate':
+            evaluate()
+        else:
+            verify(args.images)
+    except ValueError as e:
+        print(f"\n❌ Error: {e}")
+
+if __name__ == '__main__':
+    main()
@@ -19,8 +19,45 @@ export interface MLModelResult {
     layoutScore: number;
     compressionArtifacts: number;
   };
+  /** Per-tile tamper score (1 - authentic) for tiled models; null = blank tile */
+  tamperHeatmap?: (number | null)[][];
+  /** True when a borderline first pass was averaged with augmented views */
+  testTimeAugmented?: boolean;
 }
 
+interface TilingConfig {
+  tile_size: number;
+  tile_stride: number;
+  blank_std_threshold: number;
+  top_k_tiles: number;
+}
+
+interface TTAConfig {
+  /** First-pass confidence range [low, high) that triggers TTA (from ml_training/tta.py) */
+  band: [number, number];
+  views: ('hflip' | 'crop' | 'jpeg')[];
+  crop_fraction: number;
+  jpeg_quality: number;
+}
+
+interface ModelMetadata {
+  input_mode?: 'resize' | 'tiled';
+  tiling?: TilingConfig;
+  tta?: TTAConfig;
+  /** ['class', 'features'] for multi-task models */
+  outputs?: string[];
+  /** Feature-head outputs, each in [0, 1] (TARGET_NAMES in ml_training/features.py) */
+  feature_names?: string[];
+}
+
+// Longer image side is capped before tiling (matches ml_training/tiling.py)
+const MAX_IMAGE_SIDE = 1600;
+
+// Feature-head scaling (matches ml_training/features.py)
+const EDGE_MAX = 4 * Math.SQRT2;
+const ARTIFACT_BLOCK = 8;
+const ARTIFACT_SATURATION = 1000;
+
 /**
  * Check if TensorFlow.js is available
  */
@@ -66,26 +103,54 @@ export async function verifyWithMLModel(imageFile: File): Promise<MLModelResult>
       );
     }
 
-    // Preprocess image
-    const tensor = await preprocessImage(imageFile, tf);
-    
-    // Run prediction
-    const predictions = model.predict(tensor) as any;
-    const predictionData = await predictions.data();
+    const metadata = await loadModelMetadata();
+    let predictionData: number[];
+    let featureData: number[] | undefined;
+    let tamperHeatmap: (number | null)[][] | undefined;
+    let testTimeAugmented = false;
+
+    if (metadata.input_mode === 'tiled' && metadata.tiling) {
+      // Full-resolution tiles in one batch
+      const tiled = await predictTiled(model, imageFile, tf, metadata.tiling);
+      predictionData = tiled.probabilities;
+      tamperHeatmap = tiled.heatmap;
+    } else {
+      // Preprocess image
+      const tensor = await preprocessImage(imageFile, tf);
+      
+      // Run prediction (multi-task models return [class, features])
+      const outputs = model.predict(tensor) as any;
+      const [predictions, featureScores] = Array.isArray(outputs) ? outputs : [outputs];
+      predictionData = Array.from(await predictions.data() as Float32Array);
+      if (featureScores) {
+        featureData = Array.from(await featureScores.data() as Float32Array);
+      }
+      
+      // Borderline first pass: average in augmented views from one batched pass
+      const band = metadata.tta?.band;
+      const firstConfidence = Math.max(...predictionData);
+      if (metadata.tta && band && firstConfidence >= band[0] && firstConfidence < band[1]) {
+        predictionData = await predictWithTTA(model, tensor, predictionData, tf, metadata.tta);
+        testTimeAugmented = true;
+      }
+      
+      // Cleanup
+      tensor.dispose();
+      predictions.dispose();
+      featureScores?.dispose();
+    }
     
-    // Extract features
-    const features = await extractFeatures(imageFile);
+    // Feature scores come from the model's feature head when it has one
+    const features = featureData && metadata.feature_names?.includes('edgeStrength')
+      ? featuresFromScores(featureData, metadata.feature_names, await imageDimensions(imageFile))
+      : await extractFeatures(imageFile);
     
     // Parse results
-    const [authentic, forged, tampered, screenshot] = Array.from(predictionData);
+    const [authentic, forged, tampered, screenshot] = predictionData;
     
     const isForgery = authentic < 0.5;
     const confidence = Math.max(...predictionData);
     
-    // Cleanup
-    tensor.dispose();
-    predictions.dispose();
-    
     return {
       isForgery,
       confidence,
@@ -96,6 +161,8 @@ export async function verifyWithMLModel(imageFile: File): Promise<MLModelResult>
         screenshot,
       },
       features,
+      tamperHeatmap,
+      testTimeAugmented,
     };
   } catch (error) {
     console.error('ML model prediction error:', error);
@@ -150,6 +217,217 @@ async function preprocessImage(imageFile: File, tf: any): Promise<any> {
   });
 }
 
+/**
+ * Average first-pass probabilities with augmented views (flip, centre crop,
+ * JPEG re-encode) run as one batch; matches ml_training/tta.py
+ */
+async function predictWithTTA(
+  model: any,
+  tensor: any,
+  firstPass: number[],
+  tf: any,
+  config: TTAConfig
+): Promise<number[]> {
+  const [, height, width] = tensor.shape;
+  const margin = (1 - config.crop_fraction) / 2;
+  const views: any[] = [];
+  for (const view of config.views) {
+    if (view === 'hflip') {
+      views.push(tf.reverse(tensor, 2));
+    } else if (view === 'crop') {
+      views.push(tf.image.cropAndResize(
+        tensor, [[margin, margin, 1 - margin, 1 - margin]], [0], [height, width]
+      ));
+    } else if (view === 'jpeg') {
+      views.push(await jpegView(tensor, config.jpeg_quality, tf));
+    }
+  }
+  if (views.length === 0) {
+    return firstPass;
+  }
+
+  const batch = tf.concat(views);
+  views.forEach((view) => view.dispose());
+  const outputs = model.predict(batch) as any;
+  const [predictions, featureScores] = Array.isArray(outputs) ? outputs : [outputs];
+  const viewProbs = (await predictions.array()) as number[][];
+  batch.dispose();
+  predictions.dispose();
+  featureScores?.dispose();
+
+  return firstPass.map(
+    (p, c) => (p + viewProbs.reduce((sum, probs) => sum + probs[c], 0)) / (viewProbs.length + 1)
+  );
+}
+
+/**
+ * Re-encode a [1, H, W, 3] tensor as JPEG at the given quality and decode it again
+ */
+async function jpegView(tensor: any, quality: number, tf: any): Promise<any> {
+  const [, height, width] = tensor.shape;
+  const canvas = document.createElement('canvas');
+  canvas.width = width;
+  canvas.height = height;
+  const pixels = tensor.squeeze([0]);
+  await tf.browser.toPixels(pixels, canvas);
+  pixels.dispose();
+
+  const blob = await new Promise<Blob | null>((resolve) => canvas.toBlob(resolve, 'image/jpeg', quality / 100));
+  if (!blob) {
+    throw new Error('Failed to re-encode image as JPEG');
+  }
+  const bitmap = await createImageBitmap(blob);
+  const view = tf.tidy(() => tf.browser.fromPixels(bitmap).toFloat().div(255.0).expandDims(0));
+  bitmap.close();
+  return view;
+}
+
+/**
+ * Load model metadata (input mode, tiling and TTA parameters)
+ */
+async function loadModelMetadata(): Promise<ModelMetadata> {
+  try {
+    const response = await fetch('/models/certificate-detector/metadata.json');
+    return response.ok ? await response.json() : {};
+  } catch {
+    return {};
+  }
+}
+
+/**
+ * Tile offsets along one axis; the last tile is aligned to the edge
+ */
+function tileOffsets(length: number, tileSize: number, stride: number): number[] {
+  const offsets: number[] = [];
+  for (let offset = 0; offset <= Math.max(length - tileSize, 0); offset += stride) {
+    offsets.push(offset);
+  }
+  if (offsets[offsets.length - 1] + tileSize < length) {
+    offsets.push(length - tileSize);
+  }
+  return offsets;
+}
+
+/**
+ * Grayscale standard deviation of a tile (0-1 scale), used to skip blank margins
+ */
+function tileStd(data: Uint8ClampedArray): number {
+  let sum = 0;
+  let sumSq = 0;
+  const count = data.length / 4;
+  for (let i = 0; i < data.length; i += 4) {
+    const gray = (data[i] + data[i + 1] + data[i + 2]) / 3 / 255;
+    sum += gray;
+    sumSq += gray * gray;
+  }
+  const mean = sum / count;
+  return Math.sqrt(Math.max(0, sumSq / count - mean * mean));
+}
+
+/**
+ * Run all non-blank full-resolution tiles as one batch and aggregate them
+ * into image-level probabilities (mean of the least authentic tiles)
+ */
+async function predictTiled(
+  model: any,
+  imageFile: File,
+  tf: any,
+  tiling: TilingConfig
+): Promise<{ probabilities: number[]; heatmap: (number | null)[][] }> {
+  const img = await new Promise<HTMLImageElement>((resolve, reject) => {
+    const image = new Image();
+    const url = URL.createObjectURL(imageFile);
+    image.onload = () => {
+      URL.revokeObjectURL(url);
+      resolve(image);
+    };
+    image.onerror = () => {
+      URL.revokeObjectURL(url);
+      reject(new Error('Failed to load image'));
+    };
+    image.src = url;
+  });
+
+  const { tile_size: size, tile_stride: stride } = tiling;
+  let scale = Math.min(1, MAX_IMAGE_SIDE / Math.max(img.width, img.height));
+  scale = Math.max(scale, size / Math.min(img.width, img.height));
+
+  const canvas = document.createElement('canvas');
+  canvas.width = Math.round(img.width * scale);
+  canvas.height = Math.round(img.height * scale);
+  const ctx = canvas.getContext('2d');
+  if (!ctx) {
+    throw new Error('Failed to get canvas context');
+  }
+  ctx.drawImage(img, 0, 0, canvas.width, canvas.height);
+
+  const ys = tileOffsets(canvas.height, size, stride);
+  const xs = tileOffsets(canvas.width, size, stride);
+  const tiles: { row: number; col: number; y: number; x: number; std: number }[] = [];
+  ys.forEach((y, row) => xs.forEach((x, col) => {
+    const std = tileStd(ctx.getImageData(x, y, size, size).data);
+    tiles.push({ row, col, y, x, std });
+  }));
+
+  let content = tiles.filter((tile) => tile.std > tiling.blank_std_threshold);
+  if (content.length === 0) {
+    content = [tiles.reduce((a, b) => (b.std > a.std ? b : a))];
+  }
+
+  const batch = tf.tidy(() => {
+    const full = tf.browser.fromPixels(canvas).toFloat().div(255.0);
+    return tf.stack(content.map((tile) => full.slice([tile.y, tile.x, 0], [size, size, 3])));
+  });
+  const predictions = model.predict(batch) as any;
+  const tileProbs = (await predictions.array()) as number[][];
+  batch.dispose();
+  predictions.dispose();
+
+  const heatmap: (number | null)[][] = ys.map(() => xs.map(() => null));
+  content.forEach((tile, i) => {
+    heatmap[tile.row][tile.col] = 1 - tileProbs[i][0];
+  });
+
+  const suspicious = [...tileProbs]
+    .sort((a, b) => a[0] - b[0])
+    .slice(0, tiling.top_k_tiles);
+  const probabilities = suspicious[0].map(
+    (_, c) => suspicious.reduce((sum, probs) => sum + probs[c], 0) / suspicious.length
+  );
+
+  return { probabilities, heatmap };
+}
+
+/**
+ * Map multi-task feature-head outputs to named features
+ * layoutScore and the compressionArtifacts scale only depend on the image
+ * dimensions, so they come from the image rather than the model
+ */
+function featuresFromScores(
+  scores: number[],
+  names: string[],
+  { width, height }: { width: number; height: number }
+): MLModelResult['features'] {
+  const byName = Object.fromEntries(names.map((name, i) => [name, scores[i]]));
+  const artifactPairs = Math.max(0, Math.floor((width * height - 1) / ARTIFACT_BLOCK));
+  return {
+    edgeConsistency: byName.edgeStrength * EDGE_MAX,
+    textQuality: byName.textQuality,
+    layoutScore: calculateLayoutScore(width, height),
+    compressionArtifacts: Math.min(1, byName.artifactRate * artifactPairs / ARTIFACT_SATURATION),
+  };
+}
+
+/**
+ * Natural width and height of an image file
+ */
+async function imageDimensions(imageFile: File): Promise<{ width: number; height: number }> {
+  const bitmap = await createImageBitmap(imageFile);
+  const dimensions = { width: bitmap.width, height: bitmap.height };
+  bitmap.close();
+  return dimensions;
+}
+
 /**
  * Extract features from image for analysis
  */
@@ -0,0 +1,4 @@
+-- Index for incremental readers of verification_logs (analytics/rollups.py),
+-- which page through new rows by (created_at, id) after a watermark
+CREATE INDEX IF NOT EXISTS idx_verification_logs_created_at
+  ON public.verification_logs(created_at, id);